@@ -0,0 +1,92 @@
+from typing import NamedTuple
+from .calculations import calculate_loan_payment, calculate_scheduled_payments
+
+
+class RateSegment(NamedTuple):
+    """
+    Run of months of an adjustable-rate loan at one interest rate and monthly payment, with the running totals and
+    remaining principal at the end of it.
+    """
+    start_month: int
+    months: int
+    annual_rate: float
+    monthly_payment: float
+    total_payments: float
+    total_interest: float
+    remaining_principal: float
+
+
+def apply_rate_caps(rate_schedule: list[tuple[int, float]], initial_cap: float | None = None,
+                    periodic_cap: float | None = None, lifetime_cap: float | None = None,
+                    min_rate: float | None = None) -> list[tuple[int, float]]:
+    """
+    Limit the rate changes of an adjustable-rate loan to its caps. Caps are in percentage points and None means
+    uncapped.
+
+    :param list rate_schedule: tuples containing the month each rate takes effect and the annual interest rate as a
+        percentage, in order of month
+    :param initial_cap: most the rate may move at the first change, defaulting to the periodic cap
+    :param periodic_cap: most the rate may move at each change
+    :param lifetime_cap: most the rate may rise above the first rate over the life of the loan
+    :param min_rate: lowest rate the loan may charge after the first rate
+    :return: the rate schedule with each rate limited to the caps
+    """
+    if not rate_schedule:
+        return []
+
+    first_rate = rate_schedule[0][1]
+    capped = [rate_schedule[0]]
+    for i, (month, rate) in enumerate(rate_schedule[1:]):
+        previous_rate = capped[-1][1]
+        cap = initial_cap if i == 0 and initial_cap is not None else periodic_cap
+        if cap is not None:
+            rate = min(max(rate, previous_rate - cap), previous_rate + cap)
+        if lifetime_cap is not None:
+            rate = min(rate, first_rate + lifetime_cap)
+        if min_rate is not None:
+            rate = max(rate, min_rate)
+        capped.append((month, rate))
+    return capped
+
+
+def calculate_adjustable_rate_loan(remaining_principal: float, rate_schedule: list[tuple[int, float]],
+                                   term_months: int, monthly_payment: float | None = None,
+                                   reamortize: bool = True) -> list[RateSegment]:
+    """
+    Calculate the payments on a loan whose rate changes on a schedule, such as an adjustable-rate mortgage or a loan
+    with a promotional rate. Each run of months at one rate is calculated in closed form with
+    `calculate_scheduled_payments`, so the cost grows with the number of rate changes rather than the number of months.
+
+    :param float remaining_principal: remaining principal amount
+    :param list rate_schedule: tuples containing the month each rate takes effect and the annual interest rate as a
+        percentage, in order of month. The first rate must take effect at month 0, and a rate taking effect at month m
+        applies from the (m + 1)-th payment on
+    :param int term_months: number of months the loan is amortized over
+    :param monthly_payment: monthly payment before the first rate change, or None for the payment that pays off the
+        loan over the term at the first rate
+    :param bool reamortize: whether the payment is recalculated at every rate change to pay off the loan over the rest
+        of the term, instead of staying the same for the whole term
+    :return: the segments of the loan between rate changes, ending at the payoff month or the end of the term
+    :raises ValueError: if the rate schedule does not start at month 0 or is out of order
+    """
+    if not rate_schedule or rate_schedule[0][0] != 0:
+        raise ValueError('the rate schedule must start at month 0')
+    if any(month <= previous for (previous, _), (month, _) in zip(rate_schedule, rate_schedule[1:])):
+        raise ValueError('the rate schedule must be in order of month')
+
+    segments = []
+    total_payments = total_interest = 0.0
+    remaining = remaining_principal
+    ends = [month for month, _ in rate_schedule[1:]] + [term_months]
+    for (start, annual_rate), end in zip(rate_schedule, ends):
+        end = min(end, term_months)
+        if start >= end or (segments and remaining <= 0):
+            break
+
+        if monthly_payment is None or (reamortize and segments):
+            monthly_payment = calculate_loan_payment(remaining, annual_rate, (term_months - start) / 12)[0]
+        total_payments, total_interest, remaining = calculate_scheduled_payments(
+            remaining, annual_rate, monthly_payment, total_payments, total_interest, end - start)
+        segments.append(RateSegment(start, end - start, annual_rate, monthly_payment, total_payments, total_interest,
+                                    remaining))
+    return segments
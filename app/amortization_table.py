@@ -0,0 +1,164 @@
+from bisect import bisect_left
+import numpy as np
+from .batch_calculations import calculate_scheduled_payments_batch
+
+
+class AmortizationTable:
+    """
+    Month by month schedule of a loan stored as cumulative totals, so the totals over any range of months and the
+    balance at any month are looked up without replaying the schedule.
+
+    Row k of each column holds the value after k monthly payments, so row 0 is the loan before any payment. The table
+    stops at the payoff month if the loan is paid off within the payment period.
+    """
+    __slots__ = ('_columns', 'payoff_month')
+
+    # rows of the columns array
+    _PAYMENTS, _INTEREST, _BALANCE = range(3)
+
+    def __init__(self, columns: np.ndarray):
+        """
+        :param np.ndarray columns: 3 x (months + 1) array of cumulative payments, cumulative interest, and balance
+        """
+        self._columns = columns
+        paid_off = np.flatnonzero(columns[self._BALANCE] <= 0)
+        self.payoff_month = int(paid_off[0]) if len(paid_off) else None
+
+    @classmethod
+    def build(cls, remaining_principal: float, annual_rate: float, monthly_payment: float,
+              payment_period_months: int) -> 'AmortizationTable':
+        """
+        Build the table of a loan over a payment period.
+
+        :param float remaining_principal: remaining principal amount
+        :param float annual_rate: annual interest rate as a percentage
+        :param float monthly_payment: monthly payment amount
+        :param int payment_period_months: duration of payment period in months
+        :return: the amortization table
+        """
+        # every month's totals at once, by treating each month as the end of its own payment period
+        months = np.arange(payment_period_months + 1)
+        total_payments, total_interest, remaining = calculate_scheduled_payments_batch(
+            remaining_principal, annual_rate, monthly_payment, 0, 0, months)
+
+        paid_off = np.flatnonzero(remaining <= 0)
+        rows = paid_off[0] + 1 if len(paid_off) else len(months)
+
+        columns = np.empty((3, rows))
+        columns[cls._PAYMENTS] = total_payments[:rows]
+        columns[cls._INTEREST] = total_interest[:rows]
+        columns[cls._BALANCE] = remaining[:rows]
+        return cls(columns)
+
+    @classmethod
+    def build_plan(cls, remaining_principal: float, annual_rate: float,
+                   segments: tuple[tuple[float, int], ...]) -> 'AmortizationTable':
+        """
+        Build the table of a payment plan, whose payment periods follow each other with their own monthly payments.
+
+        :param float remaining_principal: remaining principal amount at the start of the plan
+        :param float annual_rate: annual interest rate as a percentage
+        :param tuple segments: tuples containing the monthly payment amount and duration in months of each payment
+            period
+        :return: the amortization table of the whole plan, with month 1 the first month of the first payment period
+        """
+        parts = [np.array([[0.0], [0.0], [remaining_principal]])]
+        for monthly_payment, months in segments:
+            last = parts[-1][:, -1]
+            if last[cls._BALANCE] <= 0:
+                break
+            # each period's table starts from the balance the last one left, with its totals counted from there
+            part = cls.build(last[cls._BALANCE], annual_rate, monthly_payment, months)._columns[:, 1:]
+            part[cls._PAYMENTS] += last[cls._PAYMENTS]
+            part[cls._INTEREST] += last[cls._INTEREST]
+            parts.append(part)
+        return cls(np.concatenate(parts, axis=1))
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> 'AmortizationTable':
+        """
+        Load a table saved with `save`.
+
+        :param str path: path of the saved table
+        :param bool mmap: whether to memory-map the file read-only instead of reading it into memory
+        :return: the amortization table
+        """
+        return cls(np.load(path, mmap_mode='r' if mmap else None))
+
+    def save(self, path: str) -> None:
+        """
+        Save the table as a .npy file that can be memory-mapped by `load`.
+
+        :param str path: path to save the table to
+        """
+        np.save(path, self._columns)
+
+    def __len__(self) -> int:
+        """
+        :return: number of months in the table
+        """
+        return self._columns.shape[1] - 1
+
+    def __sizeof__(self) -> int:
+        return object.__sizeof__(self) + self._columns.nbytes
+
+    def __reduce__(self):
+        return self.__class__, (np.ascontiguousarray(self._columns),)
+
+    def _row(self, month: int) -> int:
+        """
+        :param int month: number of months paid
+        :return: row of the columns holding the month, which is the payoff month for any month after it
+        """
+        if month < 0 or (month > len(self) and self.payoff_month is None):
+            raise IndexError(f'month {month} is not in a table of {len(self)} months')
+        return min(month, len(self))
+
+    def _between(self, column: int, first_month: int, last_month: int) -> float:
+        if first_month < 1 or last_month < first_month - 1:
+            raise IndexError(f'months {first_month} to {last_month} are not a range of months')
+        values = self._columns[column]
+        return float(values[self._row(last_month)] - values[self._row(first_month - 1)])
+
+    def payments_between(self, first_month: int, last_month: int) -> float:
+        """
+        :param int first_month: first month of the range, starting at 1
+        :param int last_month: last month of the range, inclusive
+        :return: total payments made over the range of months
+        """
+        return self._between(self._PAYMENTS, first_month, last_month)
+
+    def interest_between(self, first_month: int, last_month: int) -> float:
+        """
+        :param int first_month: first month of the range, starting at 1
+        :param int last_month: last month of the range, inclusive
+        :return: total interest paid over the range of months
+        """
+        return self._between(self._INTEREST, first_month, last_month)
+
+    def principal_between(self, first_month: int, last_month: int) -> float:
+        """
+        :param int first_month: first month of the range, starting at 1
+        :param int last_month: last month of the range, inclusive
+        :return: total principal paid over the range of months
+        """
+        return -self._between(self._BALANCE, first_month, last_month)
+
+    def balance_at(self, month: int) -> float:
+        """
+        :param int month: number of months paid, or 0 for the balance before any payment
+        :return: balance left after the month's payment, which stays 0 after the payoff month
+        """
+        return float(self._columns[self._BALANCE, self._row(month)])
+
+    def month_balance_below(self, amount: float) -> int | None:
+        """
+        Find the first month the balance falls to or below an amount. Assumes the payments cover the interest, so the
+        balance only goes down.
+
+        :param float amount: balance to look for
+        :return: the month, or None if the balance stays above the amount for the whole table
+        """
+        # the balance is decreasing, so search its negation which is increasing
+        month = bisect_left(self._columns[self._BALANCE], -amount, key=lambda balance: -balance)
+        return month if month <= len(self) else None
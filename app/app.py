@@ -1,69 +1,270 @@
-from flask import Flask, render_template, request, session, jsonify, redirect
-from .calculations import calculate_loan_payment, calculate_savings_future_value, calculate_loan_period, calculate_scheduled_payments
+from flask import Flask, Response, g, render_template, request, session, jsonify, redirect
+from . import __version__
+from .calculations import (ENGINE_VERSION, calculate_loan_payment, calculate_loan_period,
+                           calculate_savings_future_value, calculate_scheduled_payments)
+from .calculations import amortization_schedule, calculate_payment_plan
+from .batch_calculations import calculate_loan_period_batch, calculate_scheduled_payments_batch
+from .cache import (DirectoryStore, ResultCache, SQLiteStore, canonical_compounding_period, canonical_money,
+                    canonical_rate)
+from .payment_plans import PaymentPlan, decode_plan, encode_plan
+from .amortization_table import AmortizationTable
+from .adjustable_rate import apply_rate_caps, calculate_adjustable_rate_loan
+from .portfolio import project_portfolio
+from .sensitivity import loan_payment_grid, savings_future_value_grid
+from .metrics import SIZE_BUCKETS, Metrics, sample_stacks
+from .jobs import JobQueue, QueueFullError, report_progress
+from .columnar import COLUMNAR_MIMETYPE, decode_columns, encode_columns
+from .sessions import ServerSideSessionInterface
+from .cents import calculate_scheduled_payments_cents, calculate_scheduled_payments_cents_batch, to_cents
+from .solvers import (calculate_required_payment_batch, calculate_implied_rate_batch,
+                      calculate_savings_contribution_batch)
+from .monte_carlo import BLOCK_PATHS, DEFAULT_PERCENTILES, RateModel, simulate_savings, simulate_scheduled_payments
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from hashlib import sha256
+from itertools import islice
+from urllib.parse import urlencode
+import atexit
+import io
+import json
+import multiprocessing
+import numpy as np
 import os
+import shutil
+import tempfile
+import time
+from uuid import uuid4
 
 app = Flask(__name__, template_folder=os.path.join(os.path.dirname(__file__), 'templates'),
             static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 
 app.secret_key = 'your-secret-key-here'
+
+# cache of calculation results shared by the routes, keyed on the function and its canonical inputs
+result_cache = ResultCache(maxsize=int(os.environ.get('RESULT_CACHE_SIZE', 4096)),
+                           ttl=float(os.environ.get('RESULT_CACHE_TTL', 3600)))
+
+# payment plans kept on the server by plan ID, with the checkpoints of their payment periods, encoded as JSON. They are
+# kept in memory, or in files in PAYMENT_PLAN_DIR so that every worker process of the server shares them
+if os.environ.get('PAYMENT_PLAN_DIR'):
+    plan_store = DirectoryStore(os.environ['PAYMENT_PLAN_DIR'], ttl=float(os.environ.get('PAYMENT_PLAN_TTL', 86400)))
+else:
+    plan_store = ResultCache(maxsize=int(os.environ.get('PAYMENT_PLAN_STORE_SIZE', 1024)),
+                             ttl=float(os.environ.get('PAYMENT_PLAN_TTL', 86400)))
+
+# sessions are kept on the server, with only their ID in the cookie. They are kept in memory, or in the SQLite database
+# SESSION_DB or files in SESSION_DIR so that every worker process of the server shares them
+SESSION_TTL = float(os.environ.get('SESSION_TTL', 86400))
+if os.environ.get('SESSION_DB'):
+    session_store = SQLiteStore(os.environ['SESSION_DB'], ttl=SESSION_TTL)
+elif os.environ.get('SESSION_DIR'):
+    session_store = DirectoryStore(os.environ['SESSION_DIR'], ttl=SESSION_TTL)
+else:
+    session_store = ResultCache(maxsize=int(os.environ.get('SESSION_STORE_SIZE', 10000)), ttl=SESSION_TTL)
+app.session_interface = ServerSideSessionInterface(session_store)
+
+
+# latency histograms of the routes and calculations, request and batch sizes, and request counts, reported on /metrics,
+# added up across the worker processes of a server that share METRICS_DIR
+metrics = Metrics(os.environ.get('METRICS_DIR') or None)
+metrics.describe('http_request_duration_seconds', 'Time taken to handle a request, by route and method.')
+metrics.describe('http_requests_total', 'Requests handled, by route, method, and status code.')
+metrics.describe('http_request_size_bytes', 'Size of request bodies, by route.')
+metrics.describe('calculation_duration_seconds', 'Time taken by each calculation function when it is run.')
+metrics.describe('batch_rows', 'Number of scenarios in a batch request, by route.')
+
+
+@app.before_request
+def _start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def _record_request_metrics(response):
+    """
+    Count a finished request in the request metrics, under its route pattern so that every URL a route matches shares
+    one series.
+    """
+    if 'request_start' in g:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        metrics.observe('http_request_duration_seconds', time.perf_counter() - g.request_start, route=route,
+                        method=request.method)
+        metrics.increment('http_requests_total', route=route, method=request.method, status=str(response.status_code))
+        if request.content_length:
+            metrics.observe('http_request_size_bytes', request.content_length, SIZE_BUCKETS, route=route)
+    return response
+
+
+def _kernel(func, *args, **kwargs):
+    """
+    Call a calculation function, counting how long it took in the calculation latency histogram.
+
+    :param func: calculation function
+    :param args: positional arguments of the function
+    :param kwargs: keyword arguments of the function
+    :return: the function's result
+    """
+    return metrics.time('calculation_duration_seconds', partial(func, *args, **kwargs), function=func.__name__)
+
+
+def _cached(func, *args):
+    """
+    Call a calculation function through the result cache.
+
+    :param func: calculation function
+    :param args: canonical arguments of the function
+    :return: the function's result
+    """
+    return result_cache.get_or_compute((func.__name__, *args), lambda: _kernel(func, *args))
+
+
+# seconds browsers and proxies may reuse the response to a GET calculation before checking it is still current
+CALCULATION_MAX_AGE = int(os.environ.get('CALCULATION_MAX_AGE', 86400))
+
+# longest payment period in months the whole-cents calculations, schedules, and simulations accept, since they take
+# time in proportion to it. The floating point calculations take constant time and accept any payment period.
+MAX_PAYMENT_PERIOD_MONTHS = int(os.environ.get('MAX_PAYMENT_PERIOD_MONTHS', 1200))
+
+
+def _check_months(months: int) -> None:
+    """
+    :param int months: duration of a payment period in months
+    :raises ValueError: if the payment period is longer than `MAX_PAYMENT_PERIOD_MONTHS`
+    """
+    if months > MAX_PAYMENT_PERIOD_MONTHS:
+        raise ValueError(f'payment periods may be at most {MAX_PAYMENT_PERIOD_MONTHS} months')
+
+
+def _limit_months(columns: dict, name: str, errors: list) -> list:
+    """
+    Fail the scenarios of a batch whose payment period is longer than `MAX_PAYMENT_PERIOD_MONTHS`, and set their
+    periods to 0 so no calculation steps through them.
+
+    :param dict columns: columns of the batch, changed in place
+    :param str name: name of the column of payment periods in months
+    :param list errors: error message or None for each scenario
+    :return: the combined error messages
+    """
+    too_long = columns[name] > MAX_PAYMENT_PERIOD_MONTHS
+    if not too_long.any():
+        return errors
+    columns[name] = np.where(too_long, 0, columns[name])
+    message = f'payment periods may be at most {MAX_PAYMENT_PERIOD_MONTHS} months'
+    return [error or (message if failed else None) for error, failed in zip(errors, too_long.tolist())]
+
+
+def _query_value(value) -> str:
+    """
+    :param value: canonical input of a calculation
+    :return: the input as it appears in a canonical query string, with whole numbers written without a decimal point
+    """
+    text = repr(value) if isinstance(value, float) else str(value)
+    return text[:-2] if text.endswith('.0') else text
+
+
+def _cacheable(inputs: dict, respond):
+    """
+    Respond to a GET calculation in a way browsers and proxies can cache. The calculation is a pure function of its
+    inputs, so:
+
+    - a request whose query string is not the canonical one for its inputs is permanently redirected to it, so every
+      request for the same calculation shares one URL and one cache entry
+    - the response has a strong ETag derived from the canonical inputs and the versions of the app and the calculations,
+      and may be reused for `CALCULATION_MAX_AGE` seconds
+    - a request whose If-None-Match matches the ETag gets 304 Not Modified without anything being calculated
+
+    :param dict inputs: names of the query parameters mapped to their canonical values, in canonical order, leaving out
+        optional inputs that are None
+    :param respond: function returning the response to the calculation
+    :return: the response
+    """
+    query = urlencode([(name, _query_value(value)) for name, value in inputs.items() if value is not None])
+    cache_control = f'public, max-age={CALCULATION_MAX_AGE}'
+    if request.query_string.decode() != query:
+        return redirect(f'{request.path}?{query}', 301), {'Cache-Control': cache_control}
+
+    etag = sha256(f'{__version__}:{ENGINE_VERSION}:{request.path}?{query}'.encode()).hexdigest()[:32]
+    if request.if_none_match.contains_weak(etag):
+        return Response(status=304, headers={'ETag': f'"{etag}"', 'Cache-Control': cache_control})
+
+    response = app.make_response(respond())
+    if response.status_code == 200:
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = cache_control
+    return response
+
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
 
-@app.route('/loan', methods=['POST'])
-def loan() -> str:
+@app.route('/loan', methods=['GET', 'POST'])
+def loan():
     """
-    Renders the Loan calculator
+    Renders the Loan calculator. A GET request takes the inputs as query parameters and can be cached, but does not
+    store the loan for the payment schedule calculator
     :return: updated html with loan calculator
     """
+    form = request.form if request.method == 'POST' else request.args
+    principal = canonical_money(float(form['principal']))
+    rate = canonical_rate(float(form['rate']))
+    years = int(form['years'])
 
-    principal = float(request.form['principal'])
-    rate = float(request.form['rate'])
-    years = int(request.form['years'])
+    def respond() -> str:
+        monthly_payment, total_paid, total_interest = _cached(calculate_loan_payment, principal, rate, years)
 
-    monthly_payment, total_paid, total_interest = calculate_loan_payment(principal, rate, years)
+        # Store loan details in session for payment schedule calculator
+        if request.method == 'POST':
+            session['loan_data'] = {
+                'principal': principal,
+                'rate': rate,
+                'years': years,
+                'monthly_payment': monthly_payment,
+                'total_paid': total_paid,
+                'total_interest': total_interest
+            }
 
-    # Store loan details in session for payment schedule calculator
-    session['loan_data'] = {
-        'principal': principal,
-        'rate': rate,
-        'years': years,
-        'monthly_payment': monthly_payment,
-        'total_paid': total_paid,
-        'total_interest': total_interest
-    }
+        # flag to enable the scheduled payments calculator
+        should_enable_payment_plan = request.method == 'POST'
 
-    # flag to enable the scheduled payments calculator
-    should_enable_payment_plan = True
+        return render_template('result.html', result={
+            "type": "Loan",
+            "monthly_payment": f"${monthly_payment:.2f}",
+            "total_paid": f"${total_paid:.2f}",
+            "total_interest": f"${total_interest:.2f}"
+        }, enable_payment_plan=should_enable_payment_plan)
 
-    return render_template('result.html', result={
-        "type": "Loan",
-        "monthly_payment": f"${monthly_payment:.2f}",
-        "total_paid": f"${total_paid:.2f}",
-        "total_interest": f"${total_interest:.2f}"
-    }, enable_payment_plan=should_enable_payment_plan)
+    if request.method == 'GET':
+        return _cacheable({'principal': principal, 'rate': rate, 'years': years}, respond)
+    return respond()
 
 
-@app.route('/savings', methods=['POST'])
-def savings() -> str:
+@app.route('/savings', methods=['GET', 'POST'])
+def savings():
     """
-    Renders savings calculator
+    Renders savings calculator. A GET request takes the inputs as query parameters and can be cached
     :return: updated html with savings calculator
     """
+    form = request.form if request.method == 'POST' else request.args
+    initial = canonical_money(float(form['initial']))
+    monthly = canonical_money(float(form['monthly']))
+    rate = canonical_rate(float(form['rate']))
+    years = int(form['years'])
+    compounding_period = canonical_compounding_period(form['compounding_period'])
 
-    initial = float(request.form['initial'])
-    monthly = float(request.form['monthly'])
-    rate = float(request.form['rate'])
-    years = int(request.form['years'])
-    compounding_period = request.form['compounding_period']
+    def respond() -> str:
+        future_value = _cached(calculate_savings_future_value, initial, monthly, rate, years, compounding_period)
 
-    future_value = calculate_savings_future_value(initial, monthly, rate, years, compounding_period)
+        return render_template('result.html', result={
+            "type": "Savings",
+            "future_value": f"${future_value:.2f}"
+        })
 
-    return render_template('result.html', result={
-        "type": "Savings",
-        "future_value": f"${future_value:.2f}"
-    })
+    if request.method == 'GET':
+        return _cacheable({'initial': initial, 'monthly': monthly, 'rate': rate, 'years': years,
+                           'compounding_period': compounding_period}, respond)
+    return respond()
 
 
 @app.route('/payment-schedule')
@@ -77,47 +278,1121 @@ def payment_schedule():
     return render_template('schedule_calculator.html', loan_data=session['loan_data'])
 
 
-@app.route('/calculate-loan-period', methods=['POST'])
+@app.route('/calculate-loan-period', methods=['GET', 'POST'])
 def calculate_loan_period_route():
     """
-    API endpoint to calculate loan period
+    API endpoint to calculate loan period. A GET request takes the inputs as query parameters and can be cached
     """
-    data = request.get_json()
-    remaining_principal = float(data['remaining_principal'])
-    annual_rate = float(data['annual_rate'])
-    monthly_payment = float(data['monthly_payment'])
+    data = request.get_json() if request.method == 'POST' else request.args
+    remaining_principal = canonical_money(float(data['remaining_principal']))
+    annual_rate = canonical_rate(float(data['annual_rate']))
+    monthly_payment = canonical_money(float(data['monthly_payment']))
 
-    years, months = calculate_loan_period(remaining_principal, annual_rate, monthly_payment)
+    def respond():
+        years, months = _cached(calculate_loan_period, remaining_principal, annual_rate, monthly_payment)
 
-    return jsonify({
-        'years': years,
-        'months': months
-    })
+        return jsonify({
+            'years': years,
+            'months': months
+        })
+
+    if request.method == 'GET':
+        return _cacheable({'remaining_principal': remaining_principal, 'annual_rate': annual_rate,
+                           'monthly_payment': monthly_payment}, respond)
+    return respond()
 
 
-@app.route('/calculate-scheduled-payments', methods=['POST'])
+@app.route('/calculate-scheduled-payments', methods=['GET', 'POST'])
 def calculate_scheduled_payments_route():
     """
-    API endpoint to calculate scheduled payments
+    API endpoint to calculate scheduled payments. The `rounding` query parameter (`half_up` or `half_even`) switches to
+    working in whole cents, with each month's interest rounded to the cent the way a lender's statement does. A GET
+    request takes the inputs as query parameters and can be cached.
     """
-    data = request.get_json()
-    remaining_principal = float(data['remaining_principal'])
-    annual_rate = float(data['annual_rate'])
-    monthly_payment = float(data['monthly_payment'])
-    previous_total_payments = float(data['previous_total_payments'])
-    previous_interest_paid = float(data['previous_interest_paid'])
+    data = request.get_json() if request.method == 'POST' else request.args
+    remaining_principal = canonical_money(float(data['remaining_principal']))
+    annual_rate = canonical_rate(float(data['annual_rate']))
+    monthly_payment = canonical_money(float(data['monthly_payment']))
+    previous_total_payments = canonical_money(float(data['previous_total_payments']))
+    previous_interest_paid = canonical_money(float(data['previous_interest_paid']))
     payment_period_months = int(data['payment_period_months'])
+    rounding = request.args.get('rounding')
+    if rounding is not None:
+        try:
+            _check_months(payment_period_months)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+    args = (remaining_principal, annual_rate, monthly_payment, previous_total_payments, previous_interest_paid,
+            payment_period_months)
+
+    def respond():
+        try:
+            if rounding is None:
+                total_payments, total_interest, remaining = _cached(calculate_scheduled_payments, *args)
+            else:
+                total_payments, total_interest, remaining = _cached(calculate_scheduled_payments_cents, *args,
+                                                                    rounding)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        return jsonify({
+            'total_payments': total_payments,
+            'total_interest': total_interest,
+            'remaining_principal': remaining
+        })
+
+    if request.method == 'GET':
+        return _cacheable({'remaining_principal': remaining_principal, 'annual_rate': annual_rate,
+                           'monthly_payment': monthly_payment, 'previous_total_payments': previous_total_payments,
+                           'previous_interest_paid': previous_interest_paid,
+                           'payment_period_months': payment_period_months, 'rounding': rounding}, respond)
+    return respond()
+
+
+@app.route('/calculate-payment-plan', methods=['POST'])
+def calculate_payment_plan_route():
+    """
+    API endpoint to calculate scheduled payments for every payment period of a payment plan in one request
+    """
+    try:
+        terms, segments = _parse_payment_plan(request.get_json())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        'segments': _payment_plan_results(calculate_payment_plan(
+            terms['remaining_principal'], terms['annual_rate'], segments,
+            terms['previous_total_payments'], terms['previous_interest_paid']))
+    })
+
+
+@app.route('/payment-plans', methods=['POST'])
+def create_payment_plan_route():
+    """
+    API endpoint to calculate a payment plan and keep its checkpoints on the server, so later changes to the plan only
+    recalculate the payment periods from the first one that changed
+    """
+    try:
+        terms, segments = _parse_payment_plan(request.get_json())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    plan_id = uuid4().hex
+    plan = PaymentPlan(segments=segments, **terms)
+    plan_store.put(plan_id, encode_plan(plan))
+
+    return jsonify({
+        'plan_id': plan_id,
+        'recalculated_from': 0,
+        'segments': _payment_plan_results(plan.checkpoints)
+    }), 201
+
+
+@app.route('/payment-plans/<plan_id>', methods=['GET', 'PUT'])
+def payment_plan_route(plan_id: str):
+    """
+    API endpoint to fetch a payment plan, or to change its payment periods. Payment periods before the first one that
+    changed are served from their checkpoints. Changing the loan terms recalculates the whole plan.
+    """
+    body = plan_store.get(plan_id)
+    if body is None:
+        return jsonify({'error': f'unknown or expired payment plan {plan_id}'}), 404
+    plan = decode_plan(body)
+
+    recalculated_from = len(plan.segments)
+    if request.method == 'PUT':
+        data = request.get_json()
+        if not isinstance(data, dict):
+            return jsonify({'error': 'expected an object'}), 400
+        try:
+            terms, segments = _parse_payment_plan({**_payment_plan_terms(plan), **data})
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        if terms == _payment_plan_terms(plan):
+            plan, recalculated_from = plan.with_segments(segments)
+        else:
+            plan, recalculated_from = PaymentPlan(segments=segments, **terms), 0
+        plan_store.put(plan_id, encode_plan(plan))
+
+    return jsonify({
+        'plan_id': plan_id,
+        'recalculated_from': recalculated_from,
+        'segments': _payment_plan_results(plan.checkpoints)
+    })
 
-    total_payments, total_interest, remaining = calculate_scheduled_payments(
-        remaining_principal, annual_rate, monthly_payment,
-        previous_total_payments, previous_interest_paid, payment_period_months
-    )
 
+@app.route('/payment-plans/<plan_id>/months')
+def payment_plan_months_route(plan_id: str):
+    """
+    API endpoint to total the payments, interest, and principal of a payment plan over a range of months, counted from
+    the start of the plan across its payment periods. The plan's amortization table is built once and kept in the
+    result cache, so each range is two lookups.
+    """
+    body = plan_store.get(plan_id)
+    if body is None:
+        return jsonify({'error': f'unknown or expired payment plan {plan_id}'}), 404
+    plan = decode_plan(body)
+
+    try:
+        first_month = int(request.args.get('first_month', 1))
+        last_month = int(request.args['last_month'])
+    except KeyError as e:
+        return jsonify({'error': f'missing parameter {e}'}), 400
+    except ValueError as e:
+        return jsonify({'error': f'invalid value: {e}'}), 400
+    try:
+        _check_months(sum(months for _, months in plan.segments))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    table = _cached(AmortizationTable.build_plan, plan.remaining_principal, plan.annual_rate, plan.segments)
+    try:
+        return jsonify({
+            'first_month': first_month,
+            'last_month': last_month,
+            'total_payments': table.payments_between(first_month, last_month),
+            'total_interest': table.interest_between(first_month, last_month),
+            'principal_paid': table.principal_between(first_month, last_month),
+            'remaining_principal': table.balance_at(last_month)
+        })
+    except IndexError as e:
+        return jsonify({'error': str(e)}), 400
+
+
+def _parse_payment_plan(data) -> tuple[dict, list]:
+    """
+    Parse the loan terms and payment periods of a payment plan request.
+
+    :param data: decoded JSON request body
+    :return: tuple containing the loan terms as keyword arguments of `PaymentPlan`, and the payment periods
+    :raises ValueError: if a field is missing or invalid
+    """
+    try:
+        terms = {
+            'remaining_principal': float(data['remaining_principal']),
+            'annual_rate': float(data['annual_rate']),
+            'previous_total_payments': float(data.get('previous_total_payments', 0)),
+            'previous_interest_paid': float(data.get('previous_interest_paid', 0))
+        }
+        segments = [(float(segment['monthly_payment']), int(segment['months'])) for segment in data['segments']]
+    except KeyError as e:
+        raise ValueError(f'missing field {e}')
+    except (AttributeError, TypeError, ValueError) as e:
+        raise ValueError(f'invalid value: {e}')
+    return terms, segments
+
+
+def _payment_plan_terms(plan: PaymentPlan) -> dict:
+    """
+    :param PaymentPlan plan: payment plan
+    :return: the loan terms of the plan as keyword arguments of `PaymentPlan`
+    """
+    return {
+        'remaining_principal': plan.remaining_principal,
+        'annual_rate': plan.annual_rate,
+        'previous_total_payments': plan.previous_total_payments,
+        'previous_interest_paid': plan.previous_interest_paid
+    }
+
+
+def _payment_plan_results(checkpoints) -> list:
+    """
+    :param checkpoints: tuples containing the total payments, total interest, and remaining principal at the end of
+        each payment period
+    :return: JSON serializable results of each payment period
+    """
+    return [{
+        'total_payments': total_payments,
+        'total_interest': total_interest,
+        'remaining_principal': remaining
+    } for total_payments, total_interest, remaining in checkpoints]
+
+
+@app.route('/calculate-adjustable-rate-loan', methods=['POST'])
+def calculate_adjustable_rate_loan_route():
+    """
+    API endpoint to calculate the payments on a loan whose rate changes on a schedule, limited by optional rate caps
+    """
+    data = request.get_json()
+    try:
+        remaining_principal = canonical_money(float(data['remaining_principal']))
+        term_months = int(data['term_months'])
+        monthly_payment = data.get('monthly_payment')
+        monthly_payment = None if monthly_payment is None else canonical_money(float(monthly_payment))
+        reamortize = data.get('reamortize', True)
+        if not isinstance(reamortize, bool):
+            raise ValueError('reamortize must be true or false')
+        caps = data.get('caps', {})
+        rate_schedule = apply_rate_caps(
+            [(int(change['month']), canonical_rate(float(change['annual_rate'])))
+             for change in data['rate_schedule']],
+            **{cap: None if caps.get(cap) is None else float(caps[cap])
+               for cap in ('initial_cap', 'periodic_cap', 'lifetime_cap', 'min_rate')})
+        segments = _cached(calculate_adjustable_rate_loan, remaining_principal, tuple(rate_schedule), term_months,
+                           monthly_payment, reamortize)
+    except KeyError as e:
+        return jsonify({'error': f'missing field {e}'}), 400
+    except (AttributeError, TypeError, ValueError) as e:
+        return jsonify({'error': f'invalid value: {e}'}), 400
+
+    last = segments[-1] if segments else None
     return jsonify({
+        'total_payments': last.total_payments if last else 0.0,
+        'total_interest': last.total_interest if last else 0.0,
+        'remaining_principal': last.remaining_principal if last else remaining_principal,
+        'segments': [segment._asdict() for segment in segments]
+    })
+
+
+@app.route('/cache-stats')
+def cache_stats_route():
+    """
+    API endpoint reporting the hit rate, evictions, and memory footprint of the result cache of the worker process
+    answering, since each worker has its own
+    """
+    return jsonify({**result_cache.stats(), 'worker': os.getpid()})
+
+
+@app.route('/metrics')
+def metrics_route():
+    """
+    Endpoint reporting the request and calculation metrics, and the result cache and job queue statistics, in the
+    Prometheus text exposition format. With METRICS_DIR set, the request and calculation metrics are those of every
+    worker process added up, and the statistics, which are this worker's own, are labelled with its process ID
+    """
+    cache = result_cache.stats()
+    gauges = {f'result_cache_{name}': cache[name] for name in ('hits', 'misses', 'hit_rate', 'entries', 'memory_bytes')}
+    gauges.update({f'jobs_{status}': count for status, count in job_queue.stats().items()})
+    return Response(metrics.render(gauges), mimetype='text/plain; version=0.0.4')
+
+
+# whether /debug/profile may be used, and the longest window it may profile for
+PROFILER_ENABLED = os.environ.get('PROFILER_ENABLED', '').lower() in ('1', 'true', 'yes')
+MAX_PROFILE_SECONDS = float(os.environ.get('MAX_PROFILE_SECONDS', 60))
+
+
+@app.route('/debug/profile')
+def profile_route():
+    """
+    Endpoint profiling the other threads of this process for a window of time given by the `seconds` query parameter,
+    sampling their stacks `rate` times a second. Responds with the samples in the folded stack format read by flame
+    graph tools. Only available if the PROFILER_ENABLED environment variable is set.
+    """
+    if not PROFILER_ENABLED:
+        return jsonify({'error': 'the profiler is not enabled'}), 404
+    try:
+        seconds = float(request.args.get('seconds', 10))
+        rate = float(request.args.get('rate', 50))
+    except ValueError:
+        return jsonify({'error': 'seconds and rate must be numbers'}), 400
+    if not 0 < seconds <= MAX_PROFILE_SECONDS or not 0 < rate <= 1000:
+        return jsonify({'error': f'seconds must be at most {MAX_PROFILE_SECONDS} and rate at most 1000'}), 400
+
+    return Response(sample_stacks(seconds, 1 / rate), mimetype='text/plain')
+
+
+def _request_data():
+    """
+    :return: the decoded JSON request body, or the columns of a body in the columnar binary format
+    :raises ValueError: if a columnar body is malformed
+    """
+    if request.mimetype == COLUMNAR_MIMETYPE:
+        return decode_columns(request.get_data())
+    return request.get_json()
+
+
+def _parse_columns(data: dict, fields: dict) -> tuple[dict, list]:
+    """
+    Version of `_parse_scenarios` for the columns of a columnar binary body, which converts each column in one go
+    without going through the values one by one.
+
+    :param dict data: column names mapped to numpy arrays
+    :param dict fields: field names mapped to the type their values are converted with
+    :return: tuple containing the fields mapped to numpy arrays, and an error message or None for each row
+    :raises ValueError: if a column has the wrong type
+    """
+    columns = {}
+    for name, convert in fields.items():
+        column = data[name]
+        if (convert is str) != (column.dtype.kind == 'S'):
+            raise ValueError(f'column {name} must be {"bytes" if convert is str else "numbers"}')
+        columns[name] = column.astype({int: np.int64, float: np.float64, str: np.str_}[convert])
+
+    rows = len(data[next(iter(fields))])
+    errors = [None] * rows
+    finite = np.logical_and.reduce([np.isfinite(columns[name]) for name in fields if fields[name] is not str])
+    for i in np.flatnonzero(~finite).tolist():
+        errors[i] = 'invalid value: not a finite number'
+    return columns, errors
+
+
+def _parse_scenarios(data, fields: dict) -> tuple[dict, list]:
+    """
+    Parse a batch of scenarios into columns. The batch is either a list of scenario objects, or a columnar object
+    mapping each field to a list of values. Rows with a missing or invalid field are filled with zeros and reported
+    in the returned errors instead of failing the whole batch.
+
+    :param data: decoded JSON request body
+    :param dict fields: field names mapped to the type their values are converted with
+    :return: tuple containing the fields mapped to numpy arrays, and an error message or None for each row
+    :raises ValueError: if the batch itself is malformed
+    """
+    # integers are range checked as they are converted, so one out of range fails its row and not the whole batch
+    converters = {name: _int64 if convert is int else convert for name, convert in fields.items()}
+    if isinstance(data, list):
+        rows = len(data)
+        errors = [None] * rows
+        try:
+            # convert a column at a time, and only go row by row to find the invalid rows if there are any
+            columns = {name: [convert(scenario[name]) for scenario in data] for name, convert in converters.items()}
+        except (KeyError, TypeError, ValueError, OverflowError):
+            columns = {name: [0] * rows for name in fields}
+            for i, scenario in enumerate(data):
+                if not isinstance(scenario, dict):
+                    errors[i] = 'scenario must be an object'
+                    continue
+                try:
+                    values = {name: convert(scenario[name]) for name, convert in converters.items()}
+                except (KeyError, TypeError, ValueError, OverflowError) as e:
+                    errors[i] = _scenario_error(e)
+                    continue
+                for name, value in values.items():
+                    columns[name][i] = value
+
+    elif isinstance(data, dict):
+        missing = [name for name in fields if name not in data]
+        if missing:
+            raise ValueError(f'missing columns {missing}')
+
+        # columns of a columnar binary body are already arrays of one type, so they are used as they are
+        if all(isinstance(data[name], np.ndarray) for name in fields):
+            return _parse_columns(data, fields)
+
+        if not all(isinstance(data[name], list) for name in fields):
+            raise ValueError('columns must be lists')
+        columns = {name: list(data[name]) for name in fields}
+
+        rows = len(columns[next(iter(fields))])
+        if any(len(column) != rows for column in columns.values()):
+            raise ValueError('columns must all have the same length')
+
+        errors = [None] * rows
+        for name, convert in converters.items():
+            column = columns[name]
+            try:
+                columns[name] = [convert(value) for value in column]
+            except (TypeError, ValueError, OverflowError):
+                for i in range(rows):
+                    try:
+                        column[i] = convert(column[i])
+                    except (TypeError, ValueError, OverflowError) as e:
+                        errors[i] = errors[i] or _scenario_error(e)
+                        column[i] = 0
+
+    else:
+        raise ValueError('expected a list of scenarios or an object of columns')
+
+    columns = {name: np.asarray(column, dtype={int: np.int64, float: np.float64, str: np.str_}[fields[name]])
+               for name, column in columns.items()}
+
+    finite = np.logical_and.reduce([np.isfinite(columns[name]) for name in fields if fields[name] is not str])
+    for i in np.flatnonzero(~finite).tolist():
+        errors[i] = errors[i] or 'invalid value: not a finite number'
+
+    return columns, errors
+
+
+def _int64(value) -> int:
+    """
+    :param value: integer field of a scenario
+    :return: the value as an int
+    :raises ValueError: if the value does not fit in a 64-bit integer
+    """
+    value = int(value)
+    if not -2 ** 63 <= value < 2 ** 63:
+        raise ValueError(f'{value} is out of range')
+    return value
+
+
+def _scenario_error(error: Exception) -> str:
+    """
+    Describe why a scenario in a batch could not be parsed.
+
+    :param Exception error: exception raised while parsing the scenario
+    :return: error message for the scenario
+    """
+    if isinstance(error, KeyError):
+        return f'missing field {error}'
+    return f'invalid value: {error}'
+
+
+def _batch_response(data, results: dict, errors: list):
+    """
+    Build the response to a batch request in the same layout as the request, with results in the same order as the
+    scenarios. Scenarios that failed have an error message in place of their results.
+
+    Responses are in the columnar binary format instead if the Accept header prefers it, or if the request was and the
+    Accept header has no preference. Failed scenarios then have NaN float results, and an `error` column numbering
+    their error message from 1 in the JSON list of messages in the `X-Error-Messages` header, or 0 for no error.
+
+    :param data: decoded JSON request body
+    :param dict results: result names mapped to numpy arrays with one value per scenario
+    :param list errors: error message or None for each scenario
+    :return: JSON or columnar binary response
+    """
+    metrics.observe('batch_rows', len(errors), SIZE_BUCKETS, route=request.url_rule.rule)
+
+    offers = ['application/json', COLUMNAR_MIMETYPE]
+    if request.mimetype == COLUMNAR_MIMETYPE:
+        offers.reverse()
+    if request.accept_mimetypes.best_match(offers, default=offers[0]) == COLUMNAR_MIMETYPE:
+        # counting the scenarios without errors is much quicker than finding the failed ones, so they are only looked
+        # for if there are any
+        failed = [] if errors.count(None) == len(errors) else [i for i, error in enumerate(errors) if error is not None]
+        messages = sorted({errors[i] for i in failed})
+        codes = {message: i for i, message in enumerate(messages, 1)}
+        error_codes = np.zeros(len(errors), dtype=np.int32)
+        error_codes[failed] = [codes[errors[i]] for i in failed]
+
+        columns = dict(results)
+        if failed:
+            for name, values in results.items():
+                if values.dtype.kind == 'f':
+                    columns[name] = values.copy()
+                    columns[name][failed] = np.nan
+        return Response(encode_columns({**columns, 'error': error_codes}), mimetype=COLUMNAR_MIMETYPE,
+                        headers={'X-Error-Messages': json.dumps(messages)})
+
+    columns = {name: values.tolist() for name, values in results.items()}
+
+    if isinstance(data, dict):
+        failed = [i for i, error in enumerate(errors) if error is not None]
+        for column in columns.values():
+            for i in failed:
+                column[i] = None
+        columns['error'] = errors
+        return jsonify(columns)
+
+    names = list(columns)
+    return jsonify([{'error': error} if error is not None else dict(zip(names, values))
+                    for error, *values in zip(errors, *columns.values())])
+
+
+@app.route('/batch/calculate-loan-period', methods=['POST'])
+def batch_calculate_loan_period_route():
+    """
+    API endpoint to calculate loan periods for a batch of scenarios
+    """
+    try:
+        data = _request_data()
+        columns, errors = _parse_scenarios(data, {
+            'remaining_principal': float,
+            'annual_rate': float,
+            'monthly_payment': float
+        })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    years, months = _kernel(calculate_loan_period_batch, columns['remaining_principal'], columns['annual_rate'],
+                            columns['monthly_payment'])
+
+    never_paid_off = np.isnan(years).tolist()
+    errors = [error or ('payment does not cover interest' if unpaid else None)
+              for error, unpaid in zip(errors, never_paid_off)]
+    years = np.where(np.isnan(years), 0, years).astype(np.int64)
+    months = np.where(np.isnan(months), 0, months).astype(np.int64)
+
+    return _batch_response(data, {'years': years, 'months': months}, errors)
+
+
+@app.route('/batch/calculate-scheduled-payments', methods=['POST'])
+def batch_calculate_scheduled_payments_route():
+    """
+    API endpoint to calculate scheduled payments for a batch of scenarios, in whole cents if the `rounding` query
+    parameter is given as for `/calculate-scheduled-payments`
+    """
+    try:
+        data = _request_data()
+        columns, errors = _parse_scenarios(data, {
+            'remaining_principal': float,
+            'annual_rate': float,
+            'monthly_payment': float,
+            'previous_total_payments': float,
+            'previous_interest_paid': float,
+            'payment_period_months': int
+        })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    rounding = request.args.get('rounding')
+    if rounding is None:
+        total_payments, total_interest, remaining = _kernel(
+            calculate_scheduled_payments_batch, columns['remaining_principal'], columns['annual_rate'],
+            columns['monthly_payment'], columns['previous_total_payments'], columns['previous_interest_paid'],
+            columns['payment_period_months']
+        )
+    else:
+        errors = _limit_months(columns, 'payment_period_months', errors)
+        try:
+            cents = _kernel(
+                calculate_scheduled_payments_cents_batch, to_cents(columns['remaining_principal']),
+                columns['annual_rate'], to_cents(columns['monthly_payment']),
+                to_cents(columns['previous_total_payments']), to_cents(columns['previous_interest_paid']),
+                columns['payment_period_months'], rounding
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        total_payments, total_interest, remaining = (column / 100 for column in cents)
+
+    return _batch_response(data, {
         'total_payments': total_payments,
         'total_interest': total_interest,
         'remaining_principal': remaining
+    }, errors)
+
+
+def _unsolved_errors(errors: list, solutions: np.ndarray, message: str) -> list:
+    """
+    Add an error for every scenario without a solution to the errors of a batch.
+
+    :param list errors: error message or None for each scenario
+    :param np.ndarray solutions: solution of each scenario, NaN where there is none
+    :param str message: error message for scenarios without a solution
+    :return: the combined error messages
+    """
+    unsolved = (~np.isfinite(solutions)).tolist()
+    return [error or (message if failed else None) for error, failed in zip(errors, unsolved)]
+
+
+@app.route('/solve/required-payment', methods=['POST'])
+def solve_required_payment_route():
+    """
+    API endpoint to calculate the monthly payments that pay off a batch of loans in a number of months
+    """
+    try:
+        data = _request_data()
+        columns, errors = _parse_scenarios(data, {
+            'remaining_principal': float,
+            'annual_rate': float,
+            'months': int
+        })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    monthly_payment = _kernel(calculate_required_payment_batch, columns['remaining_principal'], columns['annual_rate'],
+                              columns['months'])
+    errors = _unsolved_errors(errors, monthly_payment, 'months must be positive')
+
+    return _batch_response(data, {'monthly_payment': np.nan_to_num(monthly_payment)}, errors)
+
+
+@app.route('/solve/implied-rate', methods=['POST'])
+def solve_implied_rate_route():
+    """
+    API endpoint to calculate the annual interest rates at which monthly payments pay off a batch of loans in a number
+    of months, along with the number of solver iterations each took
+    """
+    try:
+        data = _request_data()
+        columns, errors = _parse_scenarios(data, {
+            'remaining_principal': float,
+            'monthly_payment': float,
+            'months': int
+        })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    annual_rate, iterations = _kernel(calculate_implied_rate_batch, columns['remaining_principal'],
+                                      columns['monthly_payment'], columns['months'])
+    errors = _unsolved_errors(errors, annual_rate, 'payments do not add up to the principal')
+
+    return _batch_response(data, {'annual_rate': np.nan_to_num(annual_rate), 'iterations': iterations}, errors)
+
+
+@app.route('/solve/savings-contribution', methods=['POST'])
+def solve_savings_contribution_route():
+    """
+    API endpoint to calculate the monthly contributions that grow a batch of savings accounts to a target
+    """
+    try:
+        data = _request_data()
+        columns, errors = _parse_scenarios(data, {
+            'target': float,
+            'initial': float,
+            'rate': float,
+            'years': int,
+            'compounding_period': str
+        })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    monthly = _kernel(calculate_savings_contribution_batch, columns['target'], columns['initial'], columns['rate'],
+                      columns['years'], columns['compounding_period'])
+    errors = _unsolved_errors(errors, monthly, 'years must be positive')
+
+    return _batch_response(data, {'monthly': np.nan_to_num(monthly)}, errors)
+
+
+# most cells one sensitivity grid may ask for
+MAX_GRID_CELLS = int(os.environ.get('MAX_GRID_CELLS', 4000000))
+
+
+def _parse_axis(data, name: str, dtype: type) -> np.ndarray:
+    """
+    Parse an axis of a sensitivity grid, given either as a list of values or as an object with `start`, `stop`, and
+    `num` spreading `num` evenly spaced values from `start` to `stop` inclusive.
+
+    :param data: decoded JSON request body
+    :param str name: name of the axis
+    :param type dtype: type of the axis values, int or float
+    :return: the values of the axis
+    :raises ValueError: if the axis is missing or invalid
+    """
+    try:
+        axis = data[name]
+        if isinstance(axis, dict):
+            start, stop, num = float(axis['start']), float(axis['stop']), int(axis['num'])
+        else:
+            values = np.array([dtype(value) for value in axis], dtype=np.float64)
+    except KeyError as e:
+        raise ValueError(f'missing field {e}')
+    except (TypeError, ValueError) as e:
+        raise ValueError(f'invalid {name}: {e}')
+
+    if isinstance(axis, dict):
+        # checked before the values are spread, since the grid's check of its cells comes after every axis is built
+        if not 0 < num <= MAX_GRID_CELLS:
+            raise ValueError(f'{name} num must be between 1 and {MAX_GRID_CELLS}')
+        values = np.linspace(start, stop, num)
+        values = values.round() if dtype is int else values
+
+    if not len(values) or not np.isfinite(values).all():
+        raise ValueError(f'{name} must have at least one value and only finite values')
+    return values.astype({int: np.int64, float: np.float64}[dtype])
+
+
+def _grid_response(axes: dict, grids: dict):
+    """
+    Build the response to a sensitivity grid request. Each grid is a row-major matrix with a row per value of the first
+    axis and a column per value of the second. Grids are sent as JSON lists, or as raw little-endian float64 one after
+    the other if the `format` query parameter is `binary` or the Accept header prefers `application/octet-stream`, with
+    their shape and names in the `X-Grid-Shape` and `X-Grid-Outputs` headers.
+
+    :param dict axes: axis names mapped to their values, rows first
+    :param dict grids: output names mapped to 2D arrays
+    :return: JSON or binary response
+    """
+    output_format = request.args.get('format') or (
+        'binary' if request.accept_mimetypes.best_match(['application/json', 'application/octet-stream']) ==
+        'application/octet-stream' else 'json')
+    if output_format not in ('json', 'binary'):
+        return jsonify({'error': f'unknown format {output_format!r}'}), 400
+
+    shape = [len(values) for values in axes.values()]
+    if output_format == 'binary':
+        body = b''.join(np.ascontiguousarray(grid, dtype='<f8').tobytes() for grid in grids.values())
+        return Response(body, mimetype='application/octet-stream', headers={
+            'X-Grid-Shape': ','.join(map(str, shape)),
+            'X-Grid-Outputs': ','.join(grids)
+        })
+
+    return jsonify({
+        'shape': shape,
+        **{name: values.tolist() for name, values in axes.items()},
+        **{name: grid.ravel().tolist() for name, grid in grids.items()}
+    })
+
+
+def _grid_outputs(data, outputs: tuple) -> tuple:
+    """
+    :param data: decoded JSON request body
+    :param tuple outputs: names of the grids the endpoint calculates
+    :return: names of the grids asked for in the `outputs` field, defaulting to all of them
+    :raises ValueError: if an output is unknown
+    """
+    requested = tuple(data.get('outputs', outputs))
+    unknown = [name for name in requested if name not in outputs]
+    if unknown or not requested:
+        raise ValueError(f'outputs must be some of {", ".join(outputs)}')
+    return requested
+
+
+@app.route('/sensitivity/loan', methods=['POST'])
+def loan_sensitivity_route():
+    """
+    API endpoint to calculate the monthly payment and total interest of a loan over a grid of annual rates and terms
+    in months, with a row per rate and a column per term
+    """
+    data = request.get_json()
+    try:
+        principal = float(data['principal'])
+        annual_rate = _parse_axis(data, 'annual_rate', float)
+        months = _parse_axis(data, 'months', int)
+        outputs = _grid_outputs(data, ('monthly_payment', 'total_interest'))
+    except KeyError as e:
+        return jsonify({'error': f'missing field {e}'}), 400
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    if len(annual_rate) * len(months) > MAX_GRID_CELLS:
+        return jsonify({'error': f'grids may have at most {MAX_GRID_CELLS} cells'}), 400
+    if (months <= 0).any():
+        return jsonify({'error': 'months must be positive'}), 400
+
+    monthly_payment, total_interest = _kernel(loan_payment_grid, principal, annual_rate, months)
+    grids = {'monthly_payment': monthly_payment, 'total_interest': total_interest}
+    return _grid_response({'annual_rate': annual_rate, 'months': months}, {name: grids[name] for name in outputs})
+
+
+@app.route('/sensitivity/savings', methods=['POST'])
+def savings_sensitivity_route():
+    """
+    API endpoint to calculate the future value of savings over a grid of compounding rates and monthly contributions,
+    with a row per rate and a column per contribution
+    """
+    data = request.get_json()
+    try:
+        initial = float(data['initial'])
+        years = int(data['years'])
+        compounding_period = str(data.get('compounding_period', 'yearly'))
+        rate = _parse_axis(data, 'rate', float)
+        monthly = _parse_axis(data, 'monthly', float)
+        _grid_outputs(data, ('future_value',))
+    except KeyError as e:
+        return jsonify({'error': f'missing field {e}'}), 400
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    if len(rate) * len(monthly) > MAX_GRID_CELLS:
+        return jsonify({'error': f'grids may have at most {MAX_GRID_CELLS} cells'}), 400
+
+    future_value = _kernel(savings_future_value_grid, initial, monthly, rate, years, compounding_period)
+    return _grid_response({'rate': rate, 'monthly': monthly}, {'future_value': future_value})
+
+
+@app.route('/portfolio-projection', methods=['POST'])
+def portfolio_projection_route():
+    """
+    API endpoint to project the month by month cash flows of a portfolio of loans, each paid off with the monthly
+    payment from `/loan`. The portfolio is a CSV with principal, annual_rate, and years columns, uploaded as the request
+    body or as a multipart file named `file`, and is read as a stream one chunk of loans at a time.
+    """
+    upload = request.files.get('file')
+    stream = upload.stream if upload is not None else request.stream
+    size = request.content_length
+
+    # progress of a job is the share of the upload read so far
+    def on_chunk(_):
+        if size:
+            report_progress(stream.tell() / size)
+
+    try:
+        projection = _kernel(project_portfolio, io.TextIOWrapper(stream, encoding='utf-8', newline=''),
+                             on_chunk=on_chunk)
+    except (UnicodeDecodeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        'loans': projection.loans,
+        'month': list(range(1, len(projection.payments) + 1)),
+        'payments': projection.payments.tolist(),
+        'interest': projection.interest.tolist(),
+        'principal': (projection.payments - projection.interest).tolist(),
+        'balance': projection.balance.tolist()
     })
 
+
+# number of schedule rows written to the response at a time
+SCHEDULE_CHUNK_ROWS = 1000
+
+
+@app.route('/amortization-schedule', methods=['POST'])
+def amortization_schedule_route():
+    """
+    API endpoint to stream the month by month schedule of one loan, or of a list of loans one after the other, as
+    NDJSON or CSV. The format is picked with the `format` query parameter or the Accept header.
+    """
+    data = request.get_json()
+    try:
+        columns, errors = _parse_scenarios([data] if isinstance(data, dict) else data, {
+            'remaining_principal': float,
+            'annual_rate': float,
+            'monthly_payment': float,
+            'payment_period_months': int
+        })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    errors = _limit_months(columns, 'payment_period_months', errors)
+
+    for i, error in enumerate(errors):
+        if error is not None:
+            return jsonify({'error': f'scenario {i}: {error}'}), 400
+
+    output_format = request.args.get('format') or (
+        'csv' if request.accept_mimetypes.best_match(['application/x-ndjson', 'text/csv']) == 'text/csv' else 'ndjson')
+    if output_format not in ('ndjson', 'csv'):
+        return jsonify({'error': f'unknown format {output_format!r}'}), 400
+
+    loans = zip(*(columns[name].tolist() for name in
+                  ('remaining_principal', 'annual_rate', 'monthly_payment', 'payment_period_months')))
+    rows = ((loan, *row) for loan, scenario in enumerate(loans) for row in amortization_schedule(*scenario))
+
+    if output_format == 'csv':
+        header = 'loan,month,payment,interest,principal,balance\n'
+        lines = (f'{loan},{month},{payment!r},{interest!r},{principal!r},{balance!r}\n'
+                 for loan, month, payment, interest, principal, balance in rows)
+        mimetype = 'text/csv'
+    else:
+        header = ''
+        lines = (json.dumps({'loan': loan, 'month': month, 'payment': payment, 'interest': interest,
+                             'principal': principal, 'balance': balance}) + '\n'
+                 for loan, month, payment, interest, principal, balance in rows)
+        mimetype = 'application/x-ndjson'
+
+    def generate():
+        yield header
+        while chunk := ''.join(islice(lines, SCHEDULE_CHUNK_ROWS)):
+            yield chunk
+
+    return Response(generate(), mimetype=mimetype)
+
+# processes simulations are spread over, and the most paths one simulation may ask for
+SIMULATION_WORKERS = int(os.environ.get('SIMULATION_WORKERS', os.cpu_count() or 1))
+MAX_SIMULATION_PATHS = int(os.environ.get('MAX_SIMULATION_PATHS', 1000000))
+
+# process pool shared by simulations, started on the first simulation big enough to need it
+_simulation_pool = None
+
+
+def _simulation_executor(paths: int) -> ProcessPoolExecutor | None:
+    """
+    :param int paths: number of paths in the simulation
+    :return: the shared process pool, or None if the simulation fits in one block or there is one worker
+    """
+    global _simulation_pool
+    if SIMULATION_WORKERS <= 1 or paths <= BLOCK_PATHS:
+        return None
+    if _simulation_pool is None:
+        # spawned rather than forked, since forking a threaded server can copy held locks into the workers
+        _simulation_pool = ProcessPoolExecutor(SIMULATION_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+    return _simulation_pool
+
+
+def _parse_simulation(data, fields: dict) -> tuple[dict, dict]:
+    """
+    Parse the fixed inputs, rate model, and simulation options of a simulation request.
+
+    :param data: decoded JSON request body
+    :param dict fields: name and type of each fixed input
+    :return: tuple containing the keyword arguments of the simulation, and the rate model and simulation options
+    :raises ValueError: if a field is missing or invalid
+    """
+    try:
+        inputs = {name: field_type(data[name]) for name, field_type in fields.items()}
+        model = data['rate_model']
+        options = {
+            'model': RateModel(
+                initial_rate=float(model['initial_rate']),
+                long_run_rate=float(model.get('long_run_rate', model['initial_rate'])),
+                reversion_speed=float(model.get('reversion_speed', RateModel._field_defaults['reversion_speed'])),
+                volatility=float(model.get('volatility', RateModel._field_defaults['volatility'])),
+                min_rate=float(model.get('min_rate', RateModel._field_defaults['min_rate']))
+            ),
+            'paths': int(data.get('paths', 10000)),
+            'seed': int(data.get('seed', 0)),
+            'percentiles': tuple(float(percentile) for percentile in data.get('percentiles', DEFAULT_PERCENTILES))
+        }
+    except KeyError as e:
+        raise ValueError(f'missing field {e}')
+    except (AttributeError, TypeError, ValueError) as e:
+        raise ValueError(f'invalid value: {e}')
+
+    if not 0 < options['paths'] <= MAX_SIMULATION_PATHS:
+        raise ValueError(f'paths must be between 1 and {MAX_SIMULATION_PATHS}')
+    if not all(0 <= percentile <= 100 for percentile in options['percentiles']):
+        raise ValueError('percentiles must be between 0 and 100')
+    if options['model'].reversion_speed < 0 or options['model'].volatility < 0:
+        raise ValueError('reversion_speed and volatility must not be negative')
+    return inputs, options
+
+
+@app.route('/simulate/savings', methods=['POST'])
+def simulate_savings_route():
+    """
+    API endpoint to simulate the future value of savings over random paths of a mean-reverting compounding rate
+    """
+    data = request.get_json()
+    try:
+        inputs, options = _parse_simulation(data, {
+            'initial': float,
+            'monthly': float,
+            'years': int,
+            'compounding_period': str
+        })
+        if inputs['years'] * 12 > MAX_PAYMENT_PERIOD_MONTHS:
+            raise ValueError(f'years may be at most {MAX_PAYMENT_PERIOD_MONTHS // 12}')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        'percentiles': list(options['percentiles']),
+        **_kernel(simulate_savings, **inputs, **options, executor=_simulation_executor(options['paths']),
+                  progress=report_progress)
+    })
+
+
+@app.route('/simulate/scheduled-payments', methods=['POST'])
+def simulate_scheduled_payments_route():
+    """
+    API endpoint to simulate the payments of a loan over random paths of a mean-reverting interest rate
+    """
+    data = request.get_json()
+    try:
+        inputs, options = _parse_simulation(data, {
+            'remaining_principal': float,
+            'monthly_payment': float,
+            'payment_period_months': int
+        })
+        _check_months(inputs['payment_period_months'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        'percentiles': list(options['percentiles']),
+        **_kernel(simulate_scheduled_payments, **inputs, **options,
+                  executor=_simulation_executor(options['paths']), progress=report_progress)
+    })
+
+
+def _temporary_directory(prefix: str) -> str:
+    """
+    :param str prefix: start of the directory's name
+    :return: path of a new directory private to this user, removed when the process that created it exits
+    """
+    directory = tempfile.mkdtemp(prefix=prefix)
+    pid = os.getpid()
+    # processes forked from this one exit too, and must leave the directory to it
+    atexit.register(lambda: os.getpid() == pid and shutil.rmtree(directory, ignore_errors=True))
+    return directory
+
+
+# background jobs, run by a few worker threads with their results kept on disk until they expire, in JOB_DIR or else a
+# new directory private to this user
+job_queue = JobQueue(os.environ.get('JOB_DIR') or _temporary_directory('interest-calculator-jobs-'),
+                     workers=int(os.environ.get('JOB_WORKERS', 2)),
+                     max_queued=int(os.environ.get('JOB_QUEUE_SIZE', 100)),
+                     ttl=float(os.environ.get('JOB_RESULT_TTL', 3600)))
+
+# endpoints that can run as background jobs
+JOB_ENDPOINTS = ('portfolio-projection', 'simulate/savings', 'simulate/scheduled-payments',
+                 'batch/calculate-loan-period', 'batch/calculate-scheduled-payments', 'solve/required-payment',
+                 'solve/implied-rate', 'solve/savings-contribution')
+
+
+def _run_endpoint_job(endpoint: str, body_path: str, content_type: str | None, query_string: str) -> bytes:
+    """
+    Replay a request to an endpoint from its body saved on disk, so a background job gives the same result as calling
+    the endpoint directly.
+
+    :param str endpoint: path of the endpoint, without the leading slash
+    :param str body_path: path of the saved request body, which is removed afterwards
+    :param content_type: content type of the request
+    :param str query_string: query string of the request
+    :return: the JSON response body
+    :raises ValueError: if the endpoint rejects the request
+    """
+    try:
+        with open(body_path, 'rb') as body, app.test_request_context(
+                f'/{endpoint}', method='POST', input_stream=body, content_type=content_type,
+                content_length=os.path.getsize(body_path), query_string=query_string,
+                headers={'Accept': 'application/json'}):
+            response = app.make_response(app.view_functions[request.url_rule.endpoint]())
+    finally:
+        os.remove(body_path)
+
+    if response.status_code >= 400:
+        raise ValueError((response.get_json(silent=True) or {}).get('error', response.status))
+    return response.get_data()
+
+
+@app.route('/jobs/<path:endpoint>', methods=['POST'])
+def submit_job_route(endpoint: str):
+    """
+    API endpoint to run a request to a long running endpoint as a background job. The request is the same as the
+    endpoint's, and the `priority` query parameter orders queued jobs, lowest first. Responds with the job's status
+    and its URL to poll, or 503 if the queue is full.
+    """
+    if endpoint not in JOB_ENDPOINTS:
+        return jsonify({'error': f'{endpoint} cannot run as a job'}), 404
+    try:
+        priority = int(request.args.get('priority', 0))
+    except ValueError:
+        return jsonify({'error': 'priority must be a whole number'}), 400
+
+    # the request body is gone once this request ends, so the job reads it back from disk
+    with tempfile.NamedTemporaryFile(dir=job_queue.directory, suffix='.request', delete=False) as body:
+        shutil.copyfileobj(request.stream, body)
+    query_string = urlencode([(key, value) for key, value in request.args.items(multi=True) if key != 'priority'])
+
+    try:
+        job = job_queue.submit(endpoint, _run_endpoint_job, endpoint, body.name, request.content_type, query_string,
+                               priority=priority)
+    except QueueFullError as e:
+        os.remove(body.name)
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '5'}
+
+    return jsonify(job.to_dict()), 202, {'Location': f'/jobs/{job.job_id}'}
+
+
+@app.route('/jobs/<job_id>', methods=['GET', 'DELETE'])
+def job_route(job_id: str):
+    """
+    API endpoint to poll the status and progress of a background job, or to cancel it
+    """
+    job = job_queue.cancel(job_id) if request.method == 'DELETE' else job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': f'unknown or expired job {job_id}'}), 404
+    return jsonify(job.to_dict())
+
+
+@app.route('/jobs/<job_id>/result')
+def job_result_route(job_id: str):
+    """
+    API endpoint to fetch the result of a finished background job
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': f'unknown or expired job {job_id}'}), 404
+
+    result = job_queue.result(job_id)
+    if result is None:
+        return jsonify({'error': f'job is {job.status}', **job.to_dict()}), 409
+    return Response(result, mimetype='application/json')
+
+
+def warm_up() -> None:
+    """
+    Compile every template and run each calculation engine once on small inputs. A server that forks its workers
+    calls this first, so every worker starts ready, sharing the compiled templates and loaded code with the others,
+    rather than paying for them on its first requests.
+    """
+    for template in app.jinja_env.list_templates():
+        app.jinja_env.get_template(template)
+
+    calculate_loan_payment(1000, 5, 1)
+    calculate_loan_period(1000, 5, 100)
+    calculate_payment_plan(1000, 5, [(100, 6), (200, 6)])
+    calculate_savings_future_value(1000, 100, 5, 1)
+    calculate_loan_period_batch([1000.0], [5.0], [100.0])
+    calculate_scheduled_payments_batch([1000.0], [5.0], [100.0], [0.0], [0.0], [12])
+    calculate_scheduled_payments_cents_batch(to_cents([1000.0]), [5.0], to_cents([100.0]), [0], [0], [12])
+    loan_payment_grid(1000, [5.0], [12])
+    savings_future_value_grid(1000, [100.0], [5.0], 1)
+    calculate_required_payment_batch([1000.0], [5.0], [12])
+    decode_columns(encode_columns({'warm_up': np.zeros(1)}))
+
+
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file
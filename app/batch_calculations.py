@@ -0,0 +1,262 @@
+import numpy as np
+from numpy.typing import ArrayLike
+from .calculations import WHOLE_MONTH_TOLERANCE
+
+
+def _annuity_factor(log_growth: np.ndarray, periods: np.ndarray) -> np.ndarray:
+    """
+    Array version of `calculations._annuity_factor`.
+
+    :param np.ndarray log_growth: natural log of the per-period growth factors
+    :param np.ndarray periods: numbers of contributions
+    :return: the accumulated values of a contribution of 1 made every period
+    """
+    growing = log_growth != 0
+    safe_log_growth = np.where(growing, log_growth, 1.0)
+    with np.errstate(over='ignore', invalid='ignore'):
+        factor = np.expm1(periods * safe_log_growth) / np.expm1(safe_log_growth)
+    return np.where(growing, factor, periods)
+
+
+def _balance_after(principal: np.ndarray, monthly_rate: np.ndarray, monthly_payment: np.ndarray,
+                   months: np.ndarray) -> np.ndarray:
+    """
+    Array version of `calculations._balance_after`.
+
+    :param np.ndarray principal: principal amounts before the first payment
+    :param np.ndarray monthly_rate: monthly interest rates as decimals
+    :param np.ndarray monthly_payment: monthly payment amounts
+    :param np.ndarray months: numbers of payments made
+    :return: balances remaining after the payments
+    """
+    principal_paid = monthly_payment - principal * monthly_rate
+    return principal - principal_paid * _annuity_factor(np.log1p(monthly_rate), months)
+
+
+def _payment_periods(remaining_principal: np.ndarray, monthly_rate: np.ndarray,
+                     monthly_payment: np.ndarray) -> np.ndarray:
+    """
+    Array version of `calculations._payment_periods`. Rows whose payment never pays off the loan are NaN.
+
+    :param np.ndarray remaining_principal: remaining principal amounts
+    :param np.ndarray monthly_rate: monthly interest rates as decimals
+    :param np.ndarray monthly_payment: monthly payment amounts
+    :return: numbers of payments, with the last one possibly partial
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        zero_rate = remaining_principal / monthly_payment
+        # ln(1 + r) rather than log1p(r) to round as the scalar version does
+        with_rate = (np.log(monthly_payment / (monthly_payment - remaining_principal * monthly_rate)) /
+                     np.log(1 + monthly_rate))
+    periods = np.where(monthly_rate == 0, zero_rate, with_rate)
+    pays_off = (monthly_payment > 0) & (monthly_payment > remaining_principal * monthly_rate)
+    return np.where(pays_off, periods, np.nan)
+
+
+def _savings_log_growth(comp_rate: ArrayLike, compounding_period: ArrayLike) -> np.ndarray:
+    """
+    Calculate the monthly growth of savings the same way as `calculations.calculate_savings_future_value`.
+
+    :param ArrayLike comp_rate: compounding rates as percentages
+    :param ArrayLike compounding_period: periods of compounding ('daily', 'monthly', or 'yearly')
+    :return: natural log of the monthly growth factors, broadcast between the rates and compounding periods
+    """
+    # compare the compounding periods before broadcasting so a single period is not compared once per row
+    compounding_period = np.asarray(compounding_period)
+    is_monthly = compounding_period == 'monthly'
+    is_daily = compounding_period == 'daily'
+    rate, is_monthly, is_daily = np.broadcast_arrays(np.asarray(comp_rate, dtype=np.float64) / 100,
+                                                     is_monthly, is_daily)
+
+    # anything other than monthly or daily compounding defaults to the yearly compounding rate
+    log_growth = np.log1p(np.where(is_monthly | is_daily, rate, rate / 12))
+    return np.where(is_daily, (365 / 12) * log_growth, log_growth)
+
+
+def calculate_loan_payment_batch(principal: ArrayLike, annual_rate: ArrayLike,
+                                 years: ArrayLike) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Array version of `calculations.calculate_loan_payment`. The inputs are broadcast against each other.
+
+    :param ArrayLike principal: principal loan amounts
+    :param ArrayLike annual_rate: annual interest rates as percentages
+    :param ArrayLike years: loan periods in years
+    :return: tuple of arrays containing monthly payments, total amounts paid, and total interest paid in that order
+    """
+    principal, annual_rate, years = np.broadcast_arrays(np.asarray(principal, dtype=np.float64),
+                                                        np.asarray(annual_rate, dtype=np.float64),
+                                                        np.asarray(years, dtype=np.int64))
+    monthly_rate = annual_rate / 100 / 12
+    months = years * 12
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        monthly_payment = np.where(monthly_rate == 0,
+                                   principal / months,
+                                   principal * monthly_rate / (1 - (1 + monthly_rate) ** -months.astype(np.float64)))
+    total_paid = monthly_payment * months
+    total_interest = total_paid - principal
+    return monthly_payment, total_paid, total_interest
+
+
+def calculate_savings_future_value_batch(initial: ArrayLike, monthly: ArrayLike, comp_rate: ArrayLike,
+                                         years: ArrayLike, compounding_period: ArrayLike = 'yearly') -> np.ndarray:
+    """
+    Array version of `calculations.calculate_savings_future_value`. The inputs, including the compounding periods, are
+    broadcast against each other.
+
+    :param ArrayLike initial: initial savings amounts
+    :param ArrayLike monthly: monthly contributions
+    :param ArrayLike comp_rate: compounding rates as percentages
+    :param ArrayLike years: savings periods in years
+    :param ArrayLike compounding_period: periods of compounding ('daily', 'monthly', or 'yearly')
+    :return: total values of savings at the end of the savings periods
+    """
+    initial, monthly, years, log_growth = np.broadcast_arrays(
+        np.asarray(initial, dtype=np.float64), np.asarray(monthly, dtype=np.float64),
+        np.asarray(years, dtype=np.int64), _savings_log_growth(comp_rate, compounding_period))
+    months = years * 12
+
+    future_value = initial * np.exp(months * log_growth)
+    future_value += monthly * _annuity_factor(log_growth, months)
+    return future_value
+
+
+def calculate_loan_period_batch(remaining_principal: ArrayLike, annual_rate: ArrayLike,
+                                monthly_payment: ArrayLike) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Array version of `calculations.calculate_loan_period`. The inputs are broadcast against each other.
+
+    Rows whose payment never pays off the loan, where the scalar version raises, are NaN.
+
+    :param ArrayLike remaining_principal: remaining principal amounts
+    :param ArrayLike annual_rate: annual interest rates as percentages
+    :param ArrayLike monthly_payment: monthly payment amounts
+    :return: tuple of float arrays containing whole years and months needed to pay off the loans
+    """
+    remaining_principal, annual_rate, monthly_payment = np.broadcast_arrays(
+        np.asarray(remaining_principal, dtype=np.float64), np.asarray(annual_rate, dtype=np.float64),
+        np.asarray(monthly_payment, dtype=np.float64))
+    monthly_rate = annual_rate / 100 / 12
+    payment_periods = _payment_periods(remaining_principal, monthly_rate, monthly_payment)
+
+    # periods within a tolerance of a whole number of months are that number, as in the scalar version
+    whole_months = np.rint(payment_periods)
+    with np.errstate(invalid='ignore'):
+        near_whole = (monthly_rate != 0) & (np.abs(payment_periods - whole_months) <=
+                                            WHOLE_MONTH_TOLERANCE * payment_periods)
+    payment_periods = np.where(near_whole, whole_months, payment_periods)
+
+    years_remaining = np.floor(payment_periods / 12)
+    months_remaining = np.where(monthly_rate == 0, np.floor(payment_periods % 12), np.ceil(payment_periods % 12))
+
+    paid_off = remaining_principal <= 0
+    return np.where(paid_off, 0.0, years_remaining), np.where(paid_off, 0.0, months_remaining)
+
+
+def calculate_scheduled_payments_batch(remaining_principal: ArrayLike, annual_rate: ArrayLike,
+                                       monthly_payment: ArrayLike, previous_total_payments: ArrayLike,
+                                       previous_interest_paid: ArrayLike,
+                                       payment_period_months: ArrayLike) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Array version of `calculations.calculate_scheduled_payments`. The inputs are broadcast against each other.
+
+    :param ArrayLike remaining_principal: remaining principal amounts
+    :param ArrayLike annual_rate: annual interest rates as percentages
+    :param ArrayLike monthly_payment: monthly payment amounts
+    :param ArrayLike previous_total_payments: total payments made in previous periods
+    :param ArrayLike previous_interest_paid: total interest paid in previous periods
+    :param ArrayLike payment_period_months: durations of payment periods in months
+    :return: tuple of arrays containing total payments made during period, total interest paid thus far, and remaining
+        principal
+    """
+    (remaining_principal, annual_rate, monthly_payment, previous_total_payments, previous_interest_paid,
+     payment_period_months) = np.broadcast_arrays(
+        np.asarray(remaining_principal, dtype=np.float64), np.asarray(annual_rate, dtype=np.float64),
+        np.asarray(monthly_payment, dtype=np.float64), np.asarray(previous_total_payments, dtype=np.float64),
+        np.asarray(previous_interest_paid, dtype=np.float64), np.asarray(payment_period_months, dtype=np.int64))
+    monthly_rate = annual_rate / 100 / 12
+    growth = 1 + monthly_rate
+    active = (remaining_principal > 0) & (payment_period_months > 0)
+    months = np.where(active, payment_period_months, 0)
+
+    # the loan is paid off in month ceil(n) of the payoff period n, so every month before it is a full payment. Rows
+    # that are never paid off make full payments for the whole period
+    payment_periods = _payment_periods(remaining_principal, monthly_rate, monthly_payment)
+    with np.errstate(invalid='ignore'):
+        full_months = np.where(np.isnan(payment_periods), months, np.ceil(payment_periods) - 1)
+    full_months = np.clip(full_months, 0, months).astype(np.int64)
+    pays_off = ~np.isnan(payment_periods)
+
+    # step off any rounding at the boundary so the final month is the first one whose balance plus interest fits in a
+    # single payment
+    def fits(full: np.ndarray) -> np.ndarray:
+        return _balance_after(remaining_principal, monthly_rate, monthly_payment, full) * growth <= monthly_payment
+
+    while True:
+        step_back = pays_off & (full_months > 0) & fits(full_months - 1)
+        if not step_back.any():
+            break
+        full_months -= step_back
+    while True:
+        step_forward = pays_off & (full_months < months) & ~fits(full_months)
+        if not step_forward.any():
+            break
+        full_months += step_forward
+
+    paid_off = full_months < months
+    balance = _balance_after(remaining_principal, monthly_rate, monthly_payment, full_months)
+
+    # prorate the final payment to cover only the balance left on the loan and its interest
+    period_payments = monthly_payment * full_months + np.where(paid_off, balance * growth, 0.0)
+    remaining = np.where(paid_off, 0.0, balance)
+    period_interest = period_payments - (remaining_principal - remaining)
+
+    remaining = np.where(active, remaining, remaining_principal)
+    period_payments = np.where(active, period_payments, 0.0)
+    period_interest = np.where(active, period_interest, 0.0)
+
+    return (previous_total_payments + period_payments, previous_interest_paid + period_interest, remaining)
+
+
+def calculate_portfolio_cash_flows_batch(principal: ArrayLike, annual_rate: ArrayLike,
+                                         years: ArrayLike) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Calculate the month by month cash flows of a portfolio of loans paid off with the monthly payment from
+    `calculate_loan_payment_batch`, totalled over the loans. The inputs are broadcast against each other.
+
+    :param ArrayLike principal: principal loan amounts
+    :param ArrayLike annual_rate: annual interest rates as percentages
+    :param ArrayLike years: loan periods in years, all positive
+    :return: tuple of arrays containing the total payments, total interest, and total outstanding principal at the
+        end of each month, from month 1 to the end of the longest loan
+    """
+    principal, annual_rate, years = np.broadcast_arrays(np.asarray(principal, dtype=np.float64),
+                                                        np.asarray(annual_rate, dtype=np.float64),
+                                                        np.asarray(years, dtype=np.int64))
+    monthly_payment = calculate_loan_payment_batch(principal, annual_rate, years)[0]
+    monthly_rate = annual_rate / 100 / 12
+    log_growth = np.log1p(monthly_rate)
+    loan_months = years * 12
+    months = np.arange(1, int(loan_months.max(initial=0)) + 1)
+
+    # loans x months balances from `_balance_after`, written out so the large array is only passed over a few times:
+    # the balance after k months is the principal less the first month's principal paid times the annuity factor
+    growing = monthly_rate != 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        principal_paid = np.where(growing, (monthly_payment - principal * monthly_rate) / np.expm1(log_growth),
+                                  monthly_payment)
+    balance = np.expm1(np.multiply.outer(log_growth, months))
+    balance[~growing] = months
+    balance *= -principal_paid[:, np.newaxis]
+    balance += principal[:, np.newaxis]
+
+    # each loan is paid off exactly at the end of its period
+    balance *= months < loan_months[:, np.newaxis]
+
+    # interest is charged on the balance left after the previous month, and each payment is the interest plus the
+    # principal it pays off
+    total_balance = balance.sum(axis=0)
+    previous_balance = np.concatenate(([principal.sum()], total_balance[:-1]))
+    total_interest = np.concatenate(([principal @ monthly_rate], monthly_rate @ balance[:, :-1]))
+    total_payments = total_interest + previous_balance - total_balance
+    return total_payments, total_interest, total_balance
@@ -0,0 +1,359 @@
+from collections import OrderedDict
+from hashlib import sha256
+from threading import Lock, get_ident, local
+from typing import Any, Callable, Hashable
+import os
+import sqlite3
+import sys
+import time
+
+# decimal places money amounts and rates (as percentages) are rounded to before they are used as cache keys. Rates
+# keep more places than a basis point because the savings calculator takes monthly and daily rates, which are small
+MONEY_PLACES = 2
+RATE_PLACES = 6
+
+# marks a lookup that found no entry, since None can be a cached value
+_MISSING = object()
+
+
+def canonical_money(amount: float) -> float:
+    """
+    Round a money amount to the cent so amounts that only differ by rounding noise share a cache entry.
+
+    :param float amount: money amount
+    :return: amount rounded to the cent
+    """
+    # adding 0.0 turns -0.0 into 0.0 so both share a key
+    return round(amount, MONEY_PLACES) + 0.0
+
+
+def canonical_rate(rate: float) -> float:
+    """
+    Round a rate given as a percentage so rates that only differ by rounding noise share a cache entry.
+
+    :param float rate: rate as a percentage
+    :return: rate rounded to a ten-thousandth of a basis point
+    """
+    return round(rate, RATE_PLACES) + 0.0
+
+
+def private_directory(directory: str) -> str:
+    """
+    Create a directory that only this user may use, or check that an existing one is, so that other local users can
+    neither read the files kept in it nor plant files of their own for the server to read.
+
+    :param str directory: path of the directory
+    :return: the path of the directory
+    :raises PermissionError: if the directory belongs to another user, or other users may read or write it
+    """
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    status = os.stat(directory)
+    if status.st_uid != os.getuid() or status.st_mode & 0o077:
+        raise PermissionError(f'{directory} must belong to this user and be private to it (mode 0700)')
+    return directory
+
+
+def canonical_compounding_period(compounding_period: str) -> str:
+    """
+    Name a period of compounding the way the savings calculation reads it, so periods it treats alike share a cache
+    entry.
+
+    :param str compounding_period: period of compounding
+    :return: the period of compounding, with anything other than monthly or daily compounding as yearly
+    """
+    return compounding_period if compounding_period in ('monthly', 'daily') else 'yearly'
+
+
+class ResultCache:
+    """
+    Thread-safe cache of calculation results with a bounded number of entries. The least recently used entry is
+    evicted when the cache is full, and entries expire a fixed time after they are stored.
+    """
+
+    def __init__(self, maxsize: int = 4096, ttl: float = 3600, clock: Callable[[], float] = time.monotonic):
+        """
+        :param int maxsize: maximum number of entries
+        :param float ttl: seconds an entry is served for after it is stored
+        :param clock: function returning the current time in seconds
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = Lock()
+        self._entries = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._memory_bytes = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Look up an entry, counting a hit or a miss.
+
+        :param key: hashable key of the entry
+        :param default: value returned if there is no entry or it has expired
+        :return: the entry's value, or the default
+        """
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value, size = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return value
+                self._remove(key)
+                self._expirations += 1
+            self._misses += 1
+        return default
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """
+        Store an entry, replacing any entry with the same key and evicting the least recently used entries if the
+        cache is full.
+
+        :param key: hashable key of the entry
+        :param value: value to store
+        """
+        now = self._clock()
+        size = _footprint(key) + _footprint(value)
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (now + self.ttl, value, size)
+            self._memory_bytes += size
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+                self._evictions += 1
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """
+        Look up a result, computing and storing it if it is not cached or has expired. The result is computed outside
+        the lock, so concurrent misses on the same key may each compute it.
+
+        :param key: hashable key identifying the calculation and its canonical inputs
+        :param compute: function computing the result on a miss
+        :return: the result
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def delete(self, key: Hashable) -> None:
+        """
+        Remove an entry if there is one.
+
+        :param key: key of the entry
+        """
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def _remove(self, key: Hashable) -> None:
+        """
+        Remove an entry. The lock must be held.
+
+        :param key: key of the entry
+        """
+        self._memory_bytes -= self._entries.pop(key)[2]
+
+    def clear(self) -> None:
+        """
+        Remove every entry and reset the statistics.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._hits = self._misses = self._evictions = self._expirations = self._memory_bytes = 0
+
+    def stats(self) -> dict:
+        """
+        :return: dict of the hit, miss, eviction, and expiration counts, the hit rate, and the number of entries and
+            approximate memory they take up
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / lookups if lookups else 0.0,
+                'evictions': self._evictions,
+                'expirations': self._expirations,
+                'entries': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'memory_bytes': self._memory_bytes
+            }
+
+
+class DirectoryStore:
+    """
+    Store of entries kept as files in a directory, so that every process sharing the directory, such as the workers of
+    a server, sees the same entries. Keys have a stable repr, such as strings, and values are bytes. Entries expire a
+    fixed time after they are stored, and expired files are swept away now and then as entries are stored.
+    """
+
+    # seconds between sweeps of the directory for expired entries
+    SWEEP_INTERVAL = 60
+
+    def __init__(self, directory: str, ttl: float = 3600, clock: Callable[[], float] = time.time):
+        """
+        :param str directory: directory the entries are kept in, created if needed
+        :param float ttl: seconds an entry is served for after it is stored
+        :param clock: function returning the current time in seconds, compared against the modification times of the
+            files
+        :raises PermissionError: if the directory is not private to this user
+        """
+        self.directory = private_directory(directory)
+        self.ttl = ttl
+        self._clock = clock
+        self._swept_at = clock()
+
+    def _path(self, key: Hashable) -> str:
+        """
+        :param key: key of an entry, with a stable repr such as a string
+        :return: path of the entry's file, named by a hash of the key so no key can name a file outside the directory
+        """
+        return os.path.join(self.directory, sha256(repr(key).encode()).hexdigest())
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        :param key: key of the entry
+        :param default: value returned if there is no entry or it has expired
+        :return: the entry's value, or the default
+        """
+        try:
+            with open(self._path(key), 'rb') as file:
+                if os.fstat(file.fileno()).st_mtime + self.ttl <= self._clock():
+                    return default
+                return file.read()
+        except FileNotFoundError:
+            return default
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """
+        Store an entry, replacing any entry with the same key. The entry is written next to its file and then moved
+        into place, so other processes never see a partial entry.
+
+        :param key: key of the entry
+        :param bytes value: value to store
+        """
+        path = self._path(key)
+        temporary_path = f'{path}.{os.getpid()}.{get_ident()}.tmp'
+        with open(temporary_path, 'wb') as file:
+            file.write(value)
+        now = self._clock()
+        os.utime(temporary_path, (now, now))
+        os.replace(temporary_path, path)
+
+        if now - self._swept_at >= self.SWEEP_INTERVAL:
+            self._swept_at = now
+            for entry in os.scandir(self.directory):
+                try:
+                    if entry.stat().st_mtime + self.ttl <= now:
+                        os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+    def delete(self, key: Hashable) -> None:
+        """
+        Remove an entry if there is one.
+
+        :param key: key of the entry
+        """
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+class SQLiteStore:
+    """
+    Store of entries kept in a SQLite database file, so that every process sharing the file, such as the workers of a
+    server, sees the same entries. Keys are strings and values are bytes. Entries expire a fixed time after they are
+    stored, and expired entries are deleted now and then as entries are stored.
+    """
+
+    # seconds between deletions of expired entries
+    SWEEP_INTERVAL = 60
+
+    def __init__(self, path: str, ttl: float = 3600, clock: Callable[[], float] = time.time):
+        """
+        :param str path: path of the database file, created if needed in a directory private to this user
+        :param float ttl: seconds an entry is served for after it is stored
+        :param clock: function returning the current time in seconds
+        :raises PermissionError: if the directory of the database file is not private to this user
+        """
+        # the database and its write-ahead log sit next to each other, so the whole directory has to be private
+        private_directory(os.path.dirname(os.path.abspath(path)))
+        self.path = path
+        self.ttl = ttl
+        self._clock = clock
+        self._swept_at = clock()
+        # a connection per thread and process, since connections cannot be shared between threads or across a fork
+        self._local = local()
+        self._connection().execute('CREATE TABLE IF NOT EXISTS entries '
+                                   '(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL)')
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        :return: the connection of the current thread, opened on first use
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            # autocommit, and write-ahead logging so that readers in other processes do not wait for a writer
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """
+        :param str key: key of the entry
+        :param default: value returned if there is no entry or it has expired
+        :return: the entry's value, or the default
+        """
+        row = self._connection().execute('SELECT value FROM entries WHERE key = ? AND expires > ?',
+                                         (key, self._clock())).fetchone()
+        return default if row is None else row[0]
+
+    def put(self, key: str, value: bytes) -> None:
+        """
+        Store an entry, replacing any entry with the same key.
+
+        :param str key: key of the entry
+        :param bytes value: value to store
+        """
+        now = self._clock()
+        connection = self._connection()
+        connection.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?)', (key, value, now + self.ttl))
+
+        if now - self._swept_at >= self.SWEEP_INTERVAL:
+            self._swept_at = now
+            connection.execute('DELETE FROM entries WHERE expires <= ?', (now,))
+
+    def delete(self, key: str) -> None:
+        """
+        Remove an entry if there is one.
+
+        :param str key: key of the entry
+        """
+        self._connection().execute('DELETE FROM entries WHERE key = ?', (key,))
+
+
+def _footprint(value: Any) -> int:
+    """
+    Approximate the memory taken up by a cache key or result, counting the items of tuples.
+
+    :param value: cache key or result
+    :return: size in bytes
+    """
+    if isinstance(value, tuple):
+        return sys.getsizeof(value) + sum(_footprint(item) for item in value)
+    return sys.getsizeof(value)
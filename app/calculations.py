@@ -1,4 +1,60 @@
-from math import log as ln, ceil, floor
+from math import log as ln, log1p, exp, expm1, ceil, floor
+from typing import Iterator
+
+# version of the calculations, part of the ETag of every cacheable response. Bump it whenever a change alters any
+# calculated result, so caches stop serving results from the old calculations
+ENGINE_VERSION = 2
+
+# relative distance from a whole number of months within which a loan period is taken to be that whole number. The
+# last bit of the logarithms in the period decides which side of it a payment that amortizes the loan over exactly
+# that many months lands on
+WHOLE_MONTH_TOLERANCE = 1e-12
+
+
+def _annuity_factor(log_growth: float, periods: int) -> float:
+    """
+    Sum of the growth factors of a series of equal contributions, the last of which is made at the end of the period,
+    i.e. 1 + g + g^2 + ... + g^(periods - 1) for a per-period growth factor g.
+
+    :param float log_growth: natural log of the per-period growth factor
+    :param int periods: number of contributions
+    :return: the accumulated value of a contribution of 1 made every period
+    """
+    if log_growth == 0:
+        return float(periods)
+    return expm1(periods * log_growth) / expm1(log_growth)
+
+
+def _balance_after(principal: float, monthly_rate: float, monthly_payment: float, months: int) -> float:
+    """
+    Calculate the balance left on a loan after some number of full monthly payments.
+
+    :param float principal: principal amount before the first payment
+    :param float monthly_rate: monthly interest rate as a decimal
+    :param float monthly_payment: monthly payment amount
+    :param int months: number of payments made
+    :return: balance remaining after the payments
+    """
+    # the principal paid off in the first month grows every month by the interest no longer charged on it
+    principal_paid = monthly_payment - principal * monthly_rate
+    return principal - principal_paid * _annuity_factor(log1p(monthly_rate), months)
+
+
+def _payment_periods(remaining_principal: float, monthly_rate: float, monthly_payment: float) -> float:
+    """
+    Calculate the fractional number of monthly payments needed to pay off a loan.
+
+    :param float remaining_principal: remaining principal amount
+    :param float monthly_rate: monthly interest rate as a decimal
+    :param float monthly_payment: monthly payment amount
+    :return: number of payments, with the last one possibly partial
+    """
+    if monthly_rate == 0:
+        return remaining_principal / monthly_payment
+    return (ln(monthly_payment / (monthly_payment - remaining_principal * monthly_rate)) /
+            ln(1 + monthly_rate))
+
+
 def calculate_loan_payment(principal: float, annual_rate: float, years: int) -> tuple[float, float, float]:
     """
     Calculate the monthly payment, total amount paid, and total interest payments on a loan with a given principal,
@@ -38,36 +94,19 @@ def calculate_savings_future_value(initial: float, monthly: float, comp_rate: fl
     months = years * 12
 
     if compounding_period == 'monthly':
-        monthly_rate = comp_rate / 100
-
-        # Compound the initial deposit daily
-        future_value = initial * (1 + monthly_rate) ** months
-
-        # Add compounded monthly contributions (each made once per month)
-        for m in range(months):
-            future_value += monthly * (1 + monthly_rate) ** (months - m - 1)
-
+        # compounded once per month at the given monthly rate
+        log_growth = log1p(comp_rate / 100)
     elif compounding_period == 'daily':
-        days_per_month = 365 / 12
-        total_days = days_per_month * months
-
-        daily_rate = comp_rate / 100
-
-        # Compound the initial deposit daily
-        future_value = initial * (1 + daily_rate) ** total_days
-
-        # Add compounded monthly contributions (each made once per month)
-        for m in range(months):
-            days_remaining = total_days - ((m + 1) * days_per_month)
-            future_value += monthly * (1 + daily_rate) ** days_remaining
-
+        # compounded daily at the given daily rate over 365 / 12 days per month
+        log_growth = (365 / 12) * log1p(comp_rate / 100)
     else:
         # default to yearly compounding rate
-        monthly_rate = comp_rate / 100 / 12
-        future_value = initial * (1 + monthly_rate) ** months
-        for m in range(months):
-            future_value += monthly * (1 + monthly_rate) ** (months - m - 1)
+        log_growth = log1p(comp_rate / 100 / 12)
 
+    # Compound the initial deposit over the whole period, then add the monthly contributions (each made once per
+    # month) as a geometric series instead of compounding each one individually
+    future_value = initial * exp(months * log_growth)
+    future_value += monthly * _annuity_factor(log_growth, months)
 
     return future_value
 
@@ -85,16 +124,14 @@ def calculate_loan_period(remaining_principal: float, annual_rate: float, monthl
         return (0, 0)
 
     monthly_rate = annual_rate / 100 / 12
+    payment_periods = _payment_periods(remaining_principal, monthly_rate, monthly_payment)
+    if monthly_rate != 0 and abs(payment_periods - round(payment_periods)) <= WHOLE_MONTH_TOLERANCE * payment_periods:
+        payment_periods = round(payment_periods)
+    years_remaining = floor(payment_periods / 12)
 
     if monthly_rate == 0:
-        payment_periods = remaining_principal / monthly_payment
-        years_remaining = floor(payment_periods / 12)
         months_remaining = floor(payment_periods % 12)
     else:
-        # calculate correct values to test against
-        payment_periods = (ln(monthly_payment / (monthly_payment - remaining_principal * monthly_rate)) /
-                           ln(1 + monthly_rate))
-        years_remaining = floor(payment_periods / 12)
         months_remaining = ceil(payment_periods % 12)
 
     return (years_remaining, months_remaining)
@@ -119,21 +156,90 @@ def calculate_scheduled_payments(remaining_principal: float, annual_rate: float,
     period_payments = 0
     period_interest = 0
 
-    for month in range(payment_period_months):
-        if current_principal <= 0:
-            break
+    if current_principal > 0 and payment_period_months > 0:
+        growth = 1 + monthly_rate
+
+        if monthly_payment > 0 and monthly_payment > current_principal * monthly_rate:
+            # the loan is paid off in month ceil(n) of the payoff period n, so every month before it is a full
+            # payment. Step off any rounding at the boundary so the final month is the first one whose balance plus
+            # interest fits in a single payment
+            full_months = ceil(_payment_periods(current_principal, monthly_rate, monthly_payment)) - 1
+            full_months = min(max(full_months, 0), payment_period_months)
+            while (full_months > 0 and
+                   _balance_after(current_principal, monthly_rate, monthly_payment, full_months - 1) * growth
+                   <= monthly_payment):
+                full_months -= 1
+            while (full_months < payment_period_months and
+                   _balance_after(current_principal, monthly_rate, monthly_payment, full_months) * growth
+                   > monthly_payment):
+                full_months += 1
+        else:
+            # payment does not cover the interest so the loan is never paid off
+            full_months = payment_period_months
+
+        if full_months >= payment_period_months:
+            remaining = _balance_after(current_principal, monthly_rate, monthly_payment, payment_period_months)
+            period_payments = monthly_payment * payment_period_months
+        else:
+            # prorate the final payment to cover only the balance left on the loan and its interest
+            final_balance = _balance_after(current_principal, monthly_rate, monthly_payment, full_months)
+            remaining = 0.0
+            period_payments = monthly_payment * full_months + final_balance * growth
+
+        period_interest = period_payments - (current_principal - remaining)
+        current_principal = remaining
 
-        interest_payment = current_principal * monthly_rate
-        principal_payment = min(monthly_payment - interest_payment, current_principal)
+    total_payments_so_far = previous_total_payments + period_payments
+    total_interest_so_far = previous_interest_paid + period_interest
+
+    return (total_payments_so_far, total_interest_so_far, current_principal)
 
-        period_payments += interest_payment + principal_payment
-        period_interest += interest_payment
-        current_principal -= principal_payment
 
+def calculate_payment_plan(remaining_principal: float, annual_rate: float, segments: list[tuple[float, int]],
+                           previous_total_payments: float = 0,
+                           previous_interest_paid: float = 0) -> list[tuple[float, float, float]]:
+    """
+    Calculate scheduled payments for a payment plan made up of consecutive payment periods, each picking up the loan
+    where the previous one left off.
+
+    :param float remaining_principal: remaining principal amount at the start of the plan
+    :param float annual_rate: annual interest rate as a percentage
+    :param list segments: tuples containing the monthly payment amount and duration in months of each payment period
+    :param float previous_total_payments: total payments made before the plan
+    :param float previous_interest_paid: total interest paid before the plan
+    :return: list containing a tuple for each payment period of the total payments made thus far, total interest paid
+        thus far, and remaining principal at the end of the period
+    """
+    results = []
+    for monthly_payment, payment_period_months in segments:
+        previous_total_payments, previous_interest_paid, remaining_principal = calculate_scheduled_payments(
+            remaining_principal, annual_rate, monthly_payment, previous_total_payments, previous_interest_paid,
+            payment_period_months)
+        results.append((previous_total_payments, previous_interest_paid, remaining_principal))
+    return results
+
+
+def amortization_schedule(remaining_principal: float, annual_rate: float, monthly_payment: float,
+                          payment_period_months: int) -> Iterator[tuple[int, float, float, float, float]]:
+    """
+    Generate the month by month schedule of a loan over a payment period, stopping early once the loan is paid off.
+    The final payment only covers the balance left on the loan and its interest.
+
+    :param float remaining_principal: remaining principal amount
+    :param float annual_rate: annual interest rate as a percentage
+    :param float monthly_payment: monthly payment amount
+    :param int payment_period_months: duration of payment period in months
+    :return: iterator of tuples containing the month, payment, interest paid, principal paid, and remaining principal
+    """
+    monthly_rate = annual_rate / 100 / 12
+    current_principal = remaining_principal
+
+    for month in range(1, payment_period_months + 1):
         if current_principal <= 0:
-            break
+            return
 
-    total_payments_so_far = previous_total_payments + period_payments
-    total_interest_so_far = previous_interest_paid + period_interest
+        interest_payment = current_principal * monthly_rate
+        principal_payment = min(monthly_payment - interest_payment, current_principal)
+        current_principal -= principal_payment
 
-    return (total_payments_so_far, total_interest_so_far, current_principal)
\ No newline at end of file
+        yield month, interest_payment + principal_payment, interest_payment, principal_payment, current_principal
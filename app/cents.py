@@ -0,0 +1,187 @@
+import numpy as np
+from numpy.typing import ArrayLike
+
+# rates are held as integer ten-thousandths of a percent, so rates such as 6.125% are exact
+RATE_SCALE = 10000
+
+# a monthly interest charge is the balance in cents times the rate in rate units over this
+RATE_DENOMINATOR = 100 * 12 * RATE_SCALE
+
+# rules for rounding an interest charge that falls exactly between two cents: up to the next cent, or to the even
+# cent as in banker's rounding
+ROUNDING_MODES = ('half_up', 'half_even')
+
+# largest balance times rate in rate units that fits in an int64, with headroom for the interest added to it
+_MAX_PRODUCT = 2 ** 62
+
+# loans stepped through their months together, few enough for their columns to stay in the CPU cache
+_BLOCK_ROWS = 16384
+
+
+def to_cents(amount: ArrayLike) -> np.ndarray:
+    """
+    :param ArrayLike amount: money amounts in dollars
+    :return: the amounts in whole cents
+    """
+    return np.rint(np.asarray(amount, dtype=np.float64) * 100).astype(np.int64)
+
+
+def _divide_rounded(numerator: np.ndarray, denominator: int, rounding: str) -> np.ndarray:
+    """
+    Divide non-negative integers, rounding the quotient to the nearest integer with ties broken by a rounding mode.
+
+    :param np.ndarray numerator: non-negative integer numerators
+    :param int denominator: positive even integer denominator
+    :param str rounding: rounding mode from `ROUNDING_MODES`
+    :return: the rounded quotients
+    """
+    # shifting by half the denominator turns rounding to nearest into a floor division, with ties rounding up
+    shifted = numerator + denominator // 2
+    if rounding == 'half_up':
+        return shifted // denominator
+
+    # a tie divides exactly after the shift, and banker's rounding takes it back down if that made it odd
+    quotient = shifted // denominator
+    quotient -= (quotient * denominator == shifted) & (quotient & 1 == 1)
+    return quotient
+
+
+def _step_months(balance: np.ndarray, rate: np.ndarray, monthly_payment: np.ndarray, months: np.ndarray,
+                 rounding: str) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Step loans with a balance through their payment periods a month at a time. The loans are ordered from the longest
+    payment period to the shortest so that the loans still in their payment period in any month are a prefix of the
+    arrays. A paid off loan stays at a balance of 0 and adds nothing to its totals, so paid off loans are only dropped
+    once enough of them build up to be worth the copy.
+
+    :param np.ndarray balance: balances in cents
+    :param np.ndarray rate: annual interest rates in rate units
+    :param np.ndarray monthly_payment: monthly payment amounts in cents
+    :param np.ndarray months: durations of payment periods in months
+    :param str rounding: rounding mode of the monthly interest charge from `ROUNDING_MODES`
+    :return: tuple of arrays containing the balance left, the payments made, and the interest charged in cents
+    """
+    order = np.argsort(-months, kind='stable')
+    rows = np.arange(len(order))
+    balance, rate, monthly_payment, months = balance[order], rate[order], monthly_payment[order], months[order]
+    period_payments = np.zeros(len(order), dtype=np.int64)
+    period_interest = np.zeros(len(order), dtype=np.int64)
+    results = [np.empty(len(order), dtype=np.int64) for _ in range(3)]
+
+    def finish(done) -> None:
+        for result, column in zip(results, (balance, period_payments, period_interest)):
+            result[order[rows[done]]] = column[done]
+
+    month = 0
+    while len(rows) and month < months[0]:
+        # loans whose payment period is longer than the months so far
+        n = len(months) - np.searchsorted(months[::-1], month, side='right')
+        owing = balance[:n]
+        interest = _divide_rounded(owing * rate[:n], RATE_DENOMINATOR, rounding)
+        period_interest[:n] += interest
+
+        # the final payment covers only the balance left and its interest, which leaves a balance of 0
+        owing += interest
+        period_payments[:n] += np.minimum(owing, monthly_payment[:n])
+        owing -= monthly_payment[:n]
+        np.maximum(owing, 0, out=owing)
+        month += 1
+
+        if month % 12 == 0:
+            keep = np.zeros(len(rows), dtype=bool)
+            keep[:n] = balance[:n] > 0
+            if 4 * np.count_nonzero(keep) < 3 * n:
+                finish(~keep)
+                rows, balance, rate, monthly_payment, months, period_payments, period_interest = (
+                    column[keep] for column in (rows, balance, rate, monthly_payment, months, period_payments,
+                                                period_interest))
+    finish(slice(None))
+    return tuple(results)
+
+
+def calculate_scheduled_payments_cents_batch(remaining_principal: ArrayLike, annual_rate: ArrayLike,
+                                             monthly_payment: ArrayLike, previous_total_payments: ArrayLike,
+                                             previous_interest_paid: ArrayLike, payment_period_months: ArrayLike,
+                                             rounding: str = 'half_up') -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Version of `batch_calculations.calculate_scheduled_payments_batch` that works in whole cents the way a lender's
+    statement does, charging each month's interest rounded to the cent. Rounding makes every month depend on the last,
+    so the months are stepped through in turn, across blocks of loans at once, and the time taken grows with the
+    payment periods. Loans without interest are worked out directly. The inputs are broadcast against each other.
+
+    :param ArrayLike remaining_principal: remaining principal amounts in cents
+    :param ArrayLike annual_rate: annual interest rates as percentages, which are rounded to a ten-thousandth of a
+        percent
+    :param ArrayLike monthly_payment: monthly payment amounts in cents
+    :param ArrayLike previous_total_payments: total payments made in previous periods in cents
+    :param ArrayLike previous_interest_paid: total interest paid in previous periods in cents
+    :param ArrayLike payment_period_months: durations of payment periods in months
+    :param str rounding: rounding mode of the monthly interest charge from `ROUNDING_MODES`
+    :return: tuple of int64 arrays containing total payments made during period, total interest paid thus far, and
+        remaining principal, all in cents
+    :raises ValueError: if the rounding mode is unknown, a rate is negative, or a balance could grow too large to hold
+        in cents
+    """
+    if rounding not in ROUNDING_MODES:
+        raise ValueError(f'rounding must be one of {", ".join(ROUNDING_MODES)}')
+    if np.any(np.asarray(annual_rate) < 0):
+        raise ValueError('rates must not be negative')
+
+    rate = np.rint(np.asarray(annual_rate, dtype=np.float64) * RATE_SCALE).astype(np.int64)
+    columns = np.broadcast_arrays(
+        np.asarray(remaining_principal, dtype=np.int64), rate, np.asarray(monthly_payment, dtype=np.int64),
+        np.asarray(previous_total_payments, dtype=np.int64), np.asarray(previous_interest_paid, dtype=np.int64),
+        np.asarray(payment_period_months, dtype=np.int64))
+    shape = columns[0].shape
+    remaining, rate, monthly_payment, total_payments, total_interest, payment_period_months = (
+        column.flatten() for column in columns)
+
+    # a balance only grows if the payment does not cover the first month's interest, and then at most by the rate
+    growth = np.where(monthly_payment * RATE_DENOMINATOR < remaining * rate,
+                      (1 + rate / RATE_DENOMINATOR) ** payment_period_months.astype(np.float64), 1.0)
+    if np.any(np.abs(remaining) * growth * np.maximum(rate, 1) >= _MAX_PRODUCT):
+        raise ValueError('balances are too large to calculate in cents')
+
+    # without interest, every month takes the payment off the balance until it is paid off, so the totals are known
+    # outright. Negative payments add to the balance every month
+    rows = np.flatnonzero((remaining > 0) & (payment_period_months > 0) & (rate == 0))
+    paid = np.minimum(remaining[rows], monthly_payment[rows] * payment_period_months[rows])
+    remaining[rows] -= paid
+    total_payments[rows] += paid
+
+    # the other loans are stepped through a month at a time, in blocks small enough to stay in the CPU cache through
+    # every month, which is about twice as fast as stepping all of them through each month in turn
+    rows = np.flatnonzero((remaining > 0) & (payment_period_months > 0) & (rate != 0))
+    for start in range(0, len(rows), _BLOCK_ROWS):
+        block = rows[start:start + _BLOCK_ROWS]
+        remaining[block], period_payments, period_interest = _step_months(
+            remaining[block], rate[block], monthly_payment[block], payment_period_months[block], rounding)
+        total_payments[block] += period_payments
+        total_interest[block] += period_interest
+
+    return total_payments.reshape(shape), total_interest.reshape(shape), remaining.reshape(shape)
+
+
+def calculate_scheduled_payments_cents(remaining_principal: float, annual_rate: float, monthly_payment: float,
+                                       previous_total_payments: float, previous_interest_paid: float,
+                                       payment_period_months: int,
+                                       rounding: str = 'half_up') -> tuple[float, float, float]:
+    """
+    Version of `calculations.calculate_scheduled_payments` that charges each month's interest rounded to the cent,
+    taking and returning amounts in dollars.
+
+    :param float remaining_principal: remaining principal amount
+    :param float annual_rate: annual interest rate as a percentage
+    :param float monthly_payment: monthly payment amount
+    :param float previous_total_payments: total payments made in previous periods
+    :param float previous_interest_paid: total interest paid in previous periods
+    :param int payment_period_months: duration of payment period in months
+    :param str rounding: rounding mode of the monthly interest charge from `ROUNDING_MODES`
+    :return: tuple containing total payments made during period, total interest paid thus far, and remaining principal
+    :raises ValueError: if the rounding mode is unknown, the rate is negative, or the balance could grow too large to
+        hold in cents
+    """
+    cents = calculate_scheduled_payments_cents_batch(
+        to_cents(remaining_principal), annual_rate, to_cents(monthly_payment), to_cents(previous_total_payments),
+        to_cents(previous_interest_paid), payment_period_months, rounding)
+    return tuple(int(column) / 100 for column in cents)
@@ -0,0 +1,98 @@
+import numpy as np
+import struct
+
+# content type of the columnar binary format
+COLUMNAR_MIMETYPE = 'application/vnd.interest-calculator.columns'
+
+# start of every body in the format, ending in the format version
+MAGIC = b'COL1'
+
+# header of a body: the magic, the number of rows, and the number of columns
+_HEADER = struct.Struct('<4sII')
+
+# types a column may have: little-endian float64 or int32, or fixed-width byte strings of any width
+_FLOAT64, _INT32 = np.dtype('<f8'), np.dtype('<i4')
+
+# columns start on multiples of this many bytes so they can be read in place
+_ALIGNMENT = 8
+
+
+def _padding(size: int) -> int:
+    """
+    :param int size: number of bytes written so far
+    :return: number of zero bytes to write to reach the next column boundary
+    """
+    return -size % _ALIGNMENT
+
+
+def decode_columns(body: bytes) -> dict[str, np.ndarray]:
+    """
+    Read the columns of a body in the columnar binary format. The body is a header followed by the packed columns:
+
+    - the magic `COL1`, then the number of rows and the number of columns as little-endian uint32
+    - for each column, its name and its numpy dtype string (`<f8`, `<i4`, or `|S<width>`), each as a uint8 length
+      followed by that many UTF-8 bytes
+    - zero bytes up to a multiple of 8 bytes, then each column's values in order, each padded the same way
+
+    The columns are read-only views of the body rather than copies.
+
+    :param bytes body: the body
+    :return: column names mapped to their values, in the order they appear
+    :raises ValueError: if the body is not in the format
+    """
+    if len(body) < _HEADER.size:
+        raise ValueError('columnar body is too short')
+    magic, rows, column_count = _HEADER.unpack_from(body)
+    if magic != MAGIC:
+        raise ValueError('columnar body must start with COL1')
+
+    offset = _HEADER.size
+    layout = []
+    try:
+        for _ in range(column_count):
+            name = body[offset + 1:offset + 1 + body[offset]].decode()
+            offset += 1 + body[offset]
+            dtype = np.dtype(body[offset + 1:offset + 1 + body[offset]].decode())
+            offset += 1 + body[offset]
+            layout.append((name, dtype))
+    except (IndexError, TypeError, UnicodeDecodeError) as e:
+        raise ValueError(f'invalid columnar header: {e}')
+
+    columns = {}
+    offset += _padding(offset)
+    for name, dtype in layout:
+        if dtype not in (_FLOAT64, _INT32) and dtype.kind != 'S':
+            raise ValueError(f'column {name} must be <f8, <i4, or fixed-width bytes, not {dtype.str}')
+        if offset + rows * dtype.itemsize > len(body):
+            raise ValueError(f'columnar body ends before column {name}')
+        columns[name] = np.frombuffer(body, dtype=dtype, count=rows, offset=offset)
+        offset += rows * dtype.itemsize
+        offset += _padding(offset)
+    return columns
+
+
+def encode_columns(columns: dict[str, np.ndarray]) -> bytes:
+    """
+    Write columns in the columnar binary format described in `decode_columns`. Floats are written as float64, integers
+    and booleans as int32, and byte strings as they are.
+
+    :param dict columns: column names mapped to 1D arrays of the same length
+    :return: the body
+    """
+    arrays = {}
+    for name, values in columns.items():
+        values = np.asarray(values)
+        dtype = values.dtype if values.dtype.kind == 'S' else _INT32 if values.dtype.kind in 'biu' else _FLOAT64
+        arrays[name] = values.astype(dtype, copy=False)
+
+    rows = len(next(iter(arrays.values()))) if arrays else 0
+    header = bytearray(_HEADER.pack(MAGIC, rows, len(arrays)))
+    for name, values in arrays.items():
+        for field in (name.encode(), values.dtype.str.encode()):
+            header += bytes([len(field)]) + field
+    header += bytes(_padding(len(header)))
+
+    parts = [bytes(header)]
+    for values in arrays.values():
+        parts += [values.tobytes(), bytes(_padding(values.nbytes))]
+    return b''.join(parts)
@@ -0,0 +1,377 @@
+from .cache import private_directory
+from threading import Condition, Event, Thread, local
+from typing import Callable
+from uuid import uuid4
+import heapq
+import itertools
+import json
+import os
+import time
+
+# job states. Queued and running jobs are pending, the rest are finished
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = 'queued', 'running', 'done', 'failed', 'cancelled'
+
+# job running on the current worker thread, and the queue it belongs to
+_current = local()
+
+# seconds between saving the progress of a running job for other processes to see, and checking whether another
+# process cancelled it
+SYNC_INTERVAL = 0.5
+
+
+class QueueFullError(Exception):
+    """
+    Raised when a job is submitted to a queue that already holds its maximum number of queued jobs.
+    """
+
+
+class JobCancelled(Exception):
+    """
+    Raised inside a running job at its next progress report after it is cancelled.
+    """
+
+
+class Job:
+    """
+    Calculation submitted to a `JobQueue`, with its progress and status.
+    """
+    __slots__ = ('job_id', 'name', 'priority', 'status', 'progress', 'error', 'submitted_at', 'started_at',
+                 'finished_at', 'cancel_requested', '_func', '_args', '_synced_at')
+
+    def __init__(self, name: str, priority: int, func: Callable[..., bytes], args: tuple, now: float):
+        self.job_id = uuid4().hex
+        self.name = name
+        self.priority = priority
+        self.status = QUEUED
+        self.progress = 0.0
+        self.error = None
+        self.submitted_at = now
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_requested = Event()
+        self._func = func
+        self._args = args
+        self._synced_at = time.monotonic()
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Job':
+        """
+        :param dict data: status of a job returned by `to_dict`
+        :return: a copy of the job without its calculation, as seen by a process other than the one running it
+        """
+        job = cls(data['name'], data['priority'], None, (), data['submitted_at'])
+        for name in ('job_id', 'status', 'progress', 'error', 'started_at', 'finished_at'):
+            setattr(job, name, data[name])
+        return job
+
+    def to_dict(self) -> dict:
+        """
+        :return: JSON serializable status of the job
+        """
+        return {
+            'job_id': self.job_id,
+            'name': self.name,
+            'priority': self.priority,
+            'status': self.status,
+            'progress': self.progress,
+            'error': self.error,
+            'submitted_at': self.submitted_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+
+def report_progress(fraction: float) -> None:
+    """
+    Report the progress of the job running on this thread, which is also where a cancelled job stops. Does nothing
+    outside a job, so calculations can report progress whether or not they run as a job.
+
+    :param float fraction: fraction of the job done, from 0 to 1
+    :raises JobCancelled: if the job has been cancelled
+    """
+    job = getattr(_current, 'job', None)
+    if job is not None:
+        job.progress = min(max(fraction, 0.0), 1.0)
+        if time.monotonic() - job._synced_at >= SYNC_INTERVAL:
+            _current.queue._sync(job)
+        if job.cancel_requested.is_set():
+            raise JobCancelled()
+
+
+class JobQueue:
+    """
+    Priority queue of jobs run by a fixed number of worker threads in this process. Lower priorities run first, and
+    jobs of the same priority run in the order they were submitted. Submitting fails once the queue holds its maximum
+    number of queued jobs, so callers can back off instead of the queue growing without bound.
+
+    Results are written to files in a directory and, like the jobs themselves, expire a fixed time after the job
+    finished. So is the status of every job, so that every process sharing the directory, such as the workers of a
+    server, can look up, cancel, and fetch the result of a job run by any of them. Worker threads are started by the
+    first job submitted in each process, so a server can create the queue before forking its workers.
+    """
+
+    def __init__(self, directory: str, workers: int = 2, max_queued: int = 100, ttl: float = 3600,
+                 clock: Callable[[], float] = time.time):
+        """
+        :param str directory: directory job results are written to, created if needed and private to this user
+        :param int workers: number of worker threads
+        :param int max_queued: maximum number of jobs waiting to run
+        :param float ttl: seconds a finished job and its result are kept for
+        :param clock: function returning the current time in seconds
+        :raises PermissionError: if the directory is not private to this user
+        """
+        self.directory = directory
+        self.max_queued = max_queued
+        self.ttl = ttl
+        self._clock = clock
+        self._condition = Condition()
+        self._queue = []
+        self._order = itertools.count()
+        self._jobs = {}
+        self._closed = False
+
+        self._worker_count = workers
+        self._workers = []
+        self._pid = os.getpid()
+
+        # files left behind by an earlier process expire the same way, by the time they were written
+        private_directory(directory)
+        expired_before = clock() - ttl
+        for entry in os.scandir(directory):
+            if entry.name.endswith(('.result', '.job', '.cancel')) and entry.stat().st_mtime <= expired_before:
+                os.remove(entry.path)
+
+    def submit(self, name: str, func: Callable[..., bytes], *args, priority: int = 0) -> Job:
+        """
+        Queue a job.
+
+        :param str name: name of the calculation, reported in the job's status
+        :param func: function running the calculation and returning its result as bytes. It may call
+            `report_progress`, where it stops if the job is cancelled
+        :param args: arguments of the function
+        :param int priority: priority of the job, with lower priorities running first
+        :return: the queued job
+        :raises QueueFullError: if the queue already holds its maximum number of queued jobs
+        """
+        with self._condition:
+            self._expire()
+            queued = sum(job.status == QUEUED for _, _, job in self._queue)
+            if queued >= self.max_queued:
+                raise QueueFullError(f'{queued} jobs are already queued')
+
+            if self._pid != os.getpid():
+                # forked from the process that created the queue, whose jobs and workers belong to it
+                self._pid = os.getpid()
+                self._queue, self._jobs, self._workers = [], {}, []
+            if not self._workers:
+                self._workers = [Thread(target=self._work, daemon=True) for _ in range(self._worker_count)]
+                for worker in self._workers:
+                    worker.start()
+
+            job = Job(name, priority, func, args, self._clock())
+            self._jobs[job.job_id] = job
+            heapq.heappush(self._queue, (priority, next(self._order), job))
+            self._save(job)
+            self._condition.notify()
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        """
+        :param str job_id: ID of the job
+        :return: the job, or None if there is no such job or it has expired. Jobs run by another process are a copy of
+            their last saved status
+        """
+        with self._condition:
+            self._expire()
+            job = self._jobs.get(job_id)
+        return job if job is not None else self._load(job_id)
+
+    def cancel(self, job_id: str) -> Job | None:
+        """
+        Cancel a job. A queued job is cancelled straight away, and a running job stops at its next progress report.
+        Finished jobs are left as they are. A job run by another process is cancelled once that process sees the
+        request, when it starts the job or at the job's next progress report.
+
+        :param str job_id: ID of the job
+        :return: the job, or None if there is no such job or it has expired
+        """
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is not None and job.status in (QUEUED, RUNNING):
+                job.cancel_requested.set()
+                if job.status == QUEUED:
+                    self._finish(job, CANCELLED)
+        if job is not None:
+            return job
+
+        job = self._load(job_id)
+        if job is not None and job.status in (QUEUED, RUNNING):
+            open(self._path(job_id, 'cancel'), 'a').close()
+        return job
+
+    def result(self, job_id: str) -> bytes | None:
+        """
+        :param str job_id: ID of the job
+        :return: the result of the job, or None if it has not finished successfully or has expired
+        """
+        job = self.get(job_id)
+        if job is None or job.status != DONE:
+            return None
+        try:
+            with open(self._path(job_id, 'result'), 'rb') as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def stats(self) -> dict:
+        """
+        :return: dict of the number of jobs of this process in each state
+        """
+        with self._condition:
+            counts = dict.fromkeys((QUEUED, RUNNING, DONE, FAILED, CANCELLED), 0)
+            for job in self._jobs.values():
+                counts[job.status] += 1
+            return counts
+
+    def close(self) -> None:
+        """
+        Stop the workers once they finish their current jobs. Queued jobs are left unrun and marked failed.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._pid == os.getpid():
+            for worker in self._workers:
+                worker.join()
+        with self._condition:
+            for _, _, job in self._queue:
+                if job.status == QUEUED:
+                    self._finish(job, FAILED, 'the server stopped before the job ran')
+
+    def _path(self, job_id: str, kind: str) -> str:
+        """
+        :param str job_id: ID of the job
+        :param str kind: kind of file: 'result', 'job' for its status, or 'cancel' for a request to cancel it
+        :return: path of the file
+        """
+        return os.path.join(self.directory, f'{job_id}.{kind}')
+
+    def _save(self, job: Job) -> None:
+        """
+        Save the status of a job of this process for other processes to see. The lock must be held.
+        """
+        path = self._path(job.job_id, 'job')
+        with open(f'{path}.tmp', 'w') as file:
+            json.dump({**job.to_dict(), 'pid': self._pid}, file)
+        os.replace(f'{path}.tmp', path)
+        job._synced_at = time.monotonic()
+
+    def _sync(self, job: Job) -> None:
+        """
+        Save the progress of a running job, and cancel it if another process asked to.
+        """
+        if os.path.exists(self._path(job.job_id, 'cancel')):
+            job.cancel_requested.set()
+        with self._condition:
+            self._save(job)
+
+    def _load(self, job_id: str) -> Job | None:
+        """
+        :param str job_id: ID of a job run by another process
+        :return: a copy of the job as last saved, or None if there is no such job or it has expired. A pending job
+            whose process has exited is failed
+        """
+        if not job_id.isalnum():
+            return None
+        try:
+            with open(self._path(job_id, 'job')) as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return None
+
+        job = Job.from_dict(data)
+        if job.finished_at is not None and job.finished_at <= self._clock() - self.ttl:
+            return None
+        if job.status in (QUEUED, RUNNING) and not _process_exists(data['pid']):
+            job.status, job.error = FAILED, 'the server stopped before the job finished'
+        return job
+
+    def _finish(self, job: Job, status: str, error: str | None = None) -> None:
+        """
+        Mark a job finished. The lock must be held.
+        """
+        job.status = status
+        job.error = error
+        job.finished_at = self._clock()
+        job._func = job._args = None
+        self._save(job)
+
+    def _expire(self) -> None:
+        """
+        Remove finished jobs and their results once they expire. The lock must be held.
+        """
+        expired_before = self._clock() - self.ttl
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.finished_at is not None and job.finished_at <= expired_before]:
+            del self._jobs[job_id]
+            for kind in ('result', 'job', 'cancel'):
+                try:
+                    os.remove(self._path(job_id, kind))
+                except FileNotFoundError:
+                    pass
+
+    def _work(self) -> None:
+        """
+        Run queued jobs until the queue is closed.
+        """
+        while True:
+            with self._condition:
+                while not self._closed and not self._queue:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                job = heapq.heappop(self._queue)[2]
+                if job.status != QUEUED:
+                    continue
+                if os.path.exists(self._path(job.job_id, 'cancel')):
+                    self._finish(job, CANCELLED)
+                    continue
+                job.status = RUNNING
+                job.started_at = self._clock()
+                func, args = job._func, job._args
+                self._save(job)
+
+            _current.job = job
+            _current.queue = self
+            try:
+                result = func(*args)
+                path = self._path(job.job_id, 'result')
+                with open(f'{path}.tmp', 'wb') as file:
+                    file.write(result)
+                os.replace(f'{path}.tmp', path)
+                status, error = DONE, None
+            except JobCancelled:
+                status, error = CANCELLED, None
+            except Exception as e:
+                status, error = FAILED, str(e) or type(e).__name__
+            finally:
+                _current.job = None
+
+            with self._condition:
+                if status == DONE:
+                    job.progress = 1.0
+                self._finish(job, status, error)
+
+
+def _process_exists(pid: int) -> bool:
+    """
+    :param int pid: process ID
+    :return: whether a process with the ID is running
+    """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
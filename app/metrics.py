@@ -0,0 +1,441 @@
+from .cache import private_directory
+from bisect import bisect_left
+from collections import Counter
+from threading import Event, Lock, Thread, enumerate as threads, get_ident
+from typing import Callable
+from uuid import uuid4
+import fcntl
+import json
+import logging
+import os
+import sys
+import time
+
+# upper bounds in seconds of the latency histogram buckets, from 50 microseconds for cached scalar calculations up to
+# a minute for large simulations
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                   2.5, 5.0, 10.0, 30.0, 60.0)
+
+# upper bounds of the size histogram buckets, for request bodies in bytes and batches in rows
+SIZE_BUCKETS = (1, 10, 100, 1000, 10000, 100000, 1000000, 10000000, 100000000)
+
+# seconds between saves of a process's metrics to the shared directory, and so how far behind the other processes'
+# counts in a report may be
+SAVE_INTERVAL = 1.0
+
+# file in the shared directory holding the metrics of the processes that have exited
+_RETIRED = 'retired.json'
+
+logger = logging.getLogger(__name__)
+
+
+class Histogram:
+    """
+    Counts of observed values in fixed buckets, with their sum, as in a Prometheus histogram.
+    """
+    __slots__ = ('buckets', 'counts', 'sum')
+
+    def __init__(self, buckets: tuple[float, ...]):
+        """
+        :param tuple buckets: upper bounds of the buckets in increasing order. Values above the last one are only
+            counted in the total
+        """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """
+        :param float value: value to count
+        """
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Metrics:
+    """
+    Thread-safe registry of the histograms and counters reported on the `/metrics` endpoint. Each metric is a family
+    of series told apart by their labels, created on first use.
+
+    Given a directory, the processes sharing it, such as the workers of a server, report their histograms and counters
+    added up, so the counts do not depend on which process answers and do not drop when a process is replaced. Each
+    process saves its own series to a file there every `SAVE_INTERVAL` seconds, and folds them into the totals of the
+    exited processes when it retires.
+    """
+
+    def __init__(self, directory: str | None = None):
+        """
+        :param str directory: directory shared by the processes whose metrics are added up, or None for the metrics of
+            this process only
+        """
+        self.directory = private_directory(directory) if directory is not None else None
+        self._lock = Lock()
+        self._save_lock = Lock()
+        self._help = {}
+        self._histograms = {}
+        self._counters = {}
+
+        # the file this process saves its series to and the thread saving them, replaced in processes forked from it
+        self._pid = None
+        self._path = None
+        self._changed = Event()
+        self._retired = False
+
+    def describe(self, name: str, help_text: str) -> None:
+        """
+        :param str name: name of a metric
+        :param str help_text: description reported with the metric
+        """
+        self._help[name] = help_text
+
+    def observe(self, name: str, value: float, buckets: tuple[float, ...] = LATENCY_BUCKETS, **labels: str) -> None:
+        """
+        Count a value in a histogram.
+
+        :param str name: name of the histogram
+        :param float value: value to count
+        :param tuple buckets: upper bounds of the buckets, used when the series is created
+        :param labels: labels of the series
+        """
+        key = (name, tuple(labels.items()))
+        with self._lock:
+            self._check_process()
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+        self._changed.set()
+
+    def increment(self, name: str, amount: float = 1, **labels: str) -> None:
+        """
+        Add to a counter.
+
+        :param str name: name of the counter
+        :param float amount: amount to add
+        :param labels: labels of the series
+        """
+        key = (name, tuple(labels.items()))
+        with self._lock:
+            self._check_process()
+            self._counters[key] = self._counters.get(key, 0) + amount
+        self._changed.set()
+
+    def time(self, name: str, func: Callable, *args, **labels: str):
+        """
+        Call a function and count how long it took in a latency histogram.
+
+        :param str name: name of the histogram
+        :param func: function to call
+        :param args: arguments of the function
+        :param labels: labels of the series
+        :return: the function's result
+        """
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def clear(self) -> None:
+        """
+        Remove every series of this process.
+        """
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+        self._changed.set()
+
+    def _check_process(self) -> None:
+        """
+        Start saving the series of this process to the shared directory, if there is one and this process has not yet.
+        A process forked from the one that created the registry starts over with no series of its own, since the
+        series it inherited belong to its parent. Called with the lock held.
+        """
+        if self.directory is None or self._pid == os.getpid():
+            return
+        if self._pid is not None:
+            self._histograms, self._counters = {}, {}
+        self._pid = os.getpid()
+        self._path = os.path.join(self.directory, f'{self._pid}-{uuid4().hex}.json')
+        self._changed = Event()
+        self._retired = False
+        Thread(target=self._save_periodically, args=(self._changed,), daemon=True).start()
+
+    def _save_periodically(self, changed: Event) -> None:
+        """
+        Save the series of this process whenever they changed in the last `SAVE_INTERVAL` seconds, until it retires.
+        A save that fails is logged and tried again after the next interval, so the thread outlives the error.
+
+        :param Event changed: event set when the series change
+        """
+        while not self._retired:
+            changed.wait()
+            time.sleep(SAVE_INTERVAL)
+            changed.clear()
+            try:
+                self._save()
+            except OSError as e:
+                logger.warning('could not save the metrics to %s: %s', self._path, e)
+                changed.set()
+
+    def _snapshot(self) -> dict:
+        """
+        Called with the lock held.
+
+        :return: the series of this process as JSON serializable lists
+        """
+        return {'histograms': [[name, labels, histogram.buckets, list(histogram.counts), histogram.sum]
+                               for (name, labels), histogram in self._histograms.items()],
+                'counters': [[name, labels, value] for (name, labels), value in self._counters.items()]}
+
+    def _save(self) -> None:
+        """
+        Save the series of this process to its file in the shared directory. The file is written next to its path and
+        moved into place, so readers never see a partial file.
+        """
+        with self._save_lock:
+            with self._lock:
+                if self._retired or self._pid != os.getpid():
+                    return
+                snapshot = self._snapshot()
+            _write_json(self._path, snapshot)
+
+    def retire(self) -> None:
+        """
+        Fold the series of this process into the totals of the exited processes in the shared directory, so they keep
+        being reported after it exits without a file per process piling up. Called as a process exits.
+        """
+        with self._save_lock:
+            with self._lock:
+                if self.directory is None or self._retired or self._pid != os.getpid():
+                    return
+                self._retired = True
+                snapshot = self._snapshot()
+            self._changed.set()
+
+            with self._directory_lock(fcntl.LOCK_EX):
+                retired_path = os.path.join(self.directory, _RETIRED)
+                histograms, counters = {}, {}
+                _add_file(retired_path, histograms, counters)
+                _add_snapshot(snapshot, histograms, counters)
+                _write_json(retired_path, _to_snapshot(histograms, counters))
+                try:
+                    os.remove(self._path)
+                except FileNotFoundError:
+                    pass
+
+    def clear_directory(self) -> None:
+        """
+        Remove the series saved by every process sharing the directory, so that a server does not add the counts of an
+        earlier one to its own. Called before the processes sharing the directory start.
+        """
+        if self.directory is None:
+            return
+        with self._directory_lock(fcntl.LOCK_EX):
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith('.json'):
+                    os.remove(entry.path)
+
+    def _directory_lock(self, operation: int):
+        """
+        :param int operation: `fcntl.LOCK_SH` to read the saved series, or `fcntl.LOCK_EX` to fold some into the totals
+            of the exited processes
+        :return: context manager holding the lock of the shared directory
+        """
+        return _FileLock(os.path.join(self.directory, '.lock'), operation)
+
+    def render(self, gauges: dict[str, float] | None = None) -> str:
+        """
+        :param dict gauges: names of gauges mapped to their current values in this process, reported along with the
+            other metrics. With a shared directory they are labelled with the ID of this process, since they describe
+            it alone
+        :return: the metrics in the Prometheus text exposition format
+        """
+        histograms, counters = {}, {}
+        if self.directory is None:
+            with self._lock:
+                _add_snapshot(self._snapshot(), histograms, counters)
+        else:
+            # this process's series are saved before they are reported, so that every count reported by any process is
+            # in a file, and no later report leaves it out while the files only grow
+            with self._lock:
+                self._check_process()
+            self._save()
+            with self._directory_lock(fcntl.LOCK_SH):
+                for entry in os.scandir(self.directory):
+                    if entry.name.endswith('.json'):
+                        _add_file(entry.path, histograms, counters)
+        histograms = [(key, counts, total, buckets) for key, (buckets, counts, total) in histograms.items()]
+        counters = list(counters.items())
+
+        lines = []
+        described = set()
+
+        def header(name: str, metric_type: str) -> None:
+            if name not in described:
+                described.add(name)
+                if name in self._help:
+                    lines.append(f'# HELP {name} {self._help[name]}')
+                lines.append(f'# TYPE {name} {metric_type}')
+
+        for (name, labels), counts, total, buckets in sorted(histograms, key=lambda histogram: histogram[0]):
+            header(name, 'histogram')
+            cumulative = 0
+            for bound, count in zip((*map(repr, buckets), '+Inf'), counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels((*labels, ("le", bound)))} {cumulative}')
+            lines.append(f'{name}_sum{_labels(labels)} {total!r}')
+            lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+        for (name, labels), value in sorted(counters):
+            header(name, 'counter')
+            lines.append(f'{name}{_labels(labels)} {value!r}')
+        gauge_labels = (('worker', str(os.getpid())),) if self.directory is not None else ()
+        for name, value in (gauges or {}).items():
+            header(name, 'gauge')
+            lines.append(f'{name}{_labels(gauge_labels)} {value!r}')
+        return '\n'.join(lines) + '\n'
+
+
+class _FileLock:
+    """
+    Advisory lock on a file, shared between processes, held as a context manager.
+    """
+
+    def __init__(self, path: str, operation: int):
+        """
+        :param str path: path of the lock file, created if needed
+        :param int operation: `fcntl.LOCK_SH` or `fcntl.LOCK_EX`
+        """
+        self.path = path
+        self.operation = operation
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, 'a')
+        fcntl.flock(self._file, self.operation)
+        return self
+
+    def __exit__(self, *exc_info):
+        fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
+
+
+def _add_snapshot(snapshot: dict, histograms: dict, counters: dict) -> None:
+    """
+    Add saved series to running totals.
+
+    :param dict snapshot: series saved by `Metrics`
+    :param dict histograms: totals of the histograms by name and labels, as lists of the buckets, counts, and sum
+    :param dict counters: totals of the counters by name and labels
+    """
+    for name, labels, buckets, counts, total in snapshot['histograms']:
+        key = (name, tuple(map(tuple, labels)))
+        if key in histograms:
+            histogram = histograms[key]
+            histogram[1] = [a + b for a, b in zip(histogram[1], counts)]
+            histogram[2] += total
+        else:
+            histograms[key] = [tuple(buckets), list(counts), total]
+    for name, labels, value in snapshot['counters']:
+        key = (name, tuple(map(tuple, labels)))
+        counters[key] = counters.get(key, 0) + value
+
+
+def _add_file(path: str, histograms: dict, counters: dict) -> None:
+    """
+    Add the series saved in a file to running totals, if the file exists.
+
+    :param str path: path of the file
+    :param dict histograms: totals of the histograms, as in `_add_snapshot`
+    :param dict counters: totals of the counters
+    """
+    try:
+        with open(path) as file:
+            _add_snapshot(json.load(file), histograms, counters)
+    except FileNotFoundError:
+        pass
+
+
+def _write_json(path: str, value) -> None:
+    """
+    Write a value as JSON next to a path and move it into place, so readers never see a partial file.
+
+    :param str path: path of the file
+    :param value: JSON serializable value
+    """
+    with open(f'{path}.tmp', 'w') as file:
+        json.dump(value, file)
+    os.replace(f'{path}.tmp', path)
+
+
+def _to_snapshot(histograms: dict, counters: dict) -> dict:
+    """
+    :param dict histograms: totals of the histograms, as in `_add_snapshot`
+    :param dict counters: totals of the counters
+    :return: the totals as series saved by `Metrics`
+    """
+    return {'histograms': [[name, labels, buckets, counts, total]
+                           for (name, labels), (buckets, counts, total) in histograms.items()],
+            'counters': [[name, labels, value] for (name, labels), value in counters.items()]}
+
+
+def _labels(labels: tuple) -> str:
+    """
+    :param tuple labels: tuples of label names and values
+    :return: the labels as written after a series name, or nothing if there are none
+    """
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+
+def sample_stacks(seconds: float, interval: float = 0.02,
+                  clock: Callable[[], float] = time.monotonic) -> str:
+    """
+    Profile every other thread in the process by sampling their stacks at a fixed interval for a window of time.
+    Threads run untouched between samples, and a sample of ten threads 40 frames deep takes around a fifth of a
+    millisecond, so at the default of 50 samples a second profiling takes about 1% of one core.
+
+    :param float seconds: length of the window
+    :param float interval: seconds between samples
+    :param clock: function returning the current time in seconds
+    :return: the samples in the folded format read by flame graph tools such as flamegraph.pl and speedscope: one line
+        per distinct stack, from the thread down to the innermost frame separated by semicolons, and the number of
+        samples it was seen in
+    """
+    # samples are counted by thread and the IDs of the code objects of their frames, which hash much faster than the
+    # code objects themselves, and are only written out as text at the end. The code objects of each distinct stack are
+    # kept so their IDs stay unique
+    stacks = Counter()
+    code_objects = {}
+    names = {}
+    this_thread = get_ident()
+    end = clock() + seconds
+    while clock() < end:
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == this_thread:
+                continue
+            codes = []
+            while frame is not None:
+                codes.append(frame.f_code)
+                frame = frame.f_back
+            key = thread_id, tuple(map(id, codes))
+            stacks[key] += 1
+            if key not in code_objects:
+                code_objects[key] = codes
+            if thread_id not in names:
+                names.update((thread.ident, thread.name) for thread in threads())
+                names.setdefault(thread_id, f'thread {thread_id}')
+        time.sleep(interval)
+
+    labels = {}
+    lines = []
+    for key, count in stacks.most_common():
+        frames = [names[key[0]]]
+        for code in reversed(code_objects[key]):
+            if code not in labels:
+                labels[code] = f'{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+            frames.append(labels[code])
+        lines.append(f'{";".join(frames)} {count}\n')
+    return ''.join(lines)
@@ -0,0 +1,207 @@
+from concurrent.futures import Executor
+from functools import partial
+from typing import Callable, NamedTuple
+import numpy as np
+from .batch_calculations import _savings_log_growth
+
+# number of paths simulated together. Blocks are the unit of work handed to the process pool, and each block draws
+# from its own seed, so results do not depend on how many processes run the blocks
+BLOCK_PATHS = 4096
+
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+
+
+class RateModel(NamedTuple):
+    """
+    Mean-reverting (Vasicek) model of an interest rate that changes monthly. Rates are percentages in the same units
+    as the fixed rate they replace.
+    """
+    # rate charged or paid in the first month
+    initial_rate: float
+    # rate the paths revert towards
+    long_run_rate: float
+    # speed of reversion per year, so deviations from the long run rate halve in ln(2) / reversion_speed years
+    reversion_speed: float = 0.5
+    # standard deviation of the rate's yearly change in percentage points, before reversion
+    volatility: float = 1.0
+    # rates below this are floored to it
+    min_rate: float = 0.0
+
+
+def simulate_rate_paths(model: RateModel, rng: np.random.Generator, paths: int, months: int) -> np.ndarray:
+    """
+    Draw random rate paths from a rate model, stepping the exact discretization of the model one month at a time.
+
+    :param RateModel model: rate model
+    :param np.random.Generator rng: random number generator
+    :param int paths: number of paths
+    :param int months: number of months in each path
+    :return: months x paths array of the rate in each month
+    """
+    decay = np.exp(-model.reversion_speed / 12)
+    if model.reversion_speed > 0:
+        step_std = model.volatility * np.sqrt(-np.expm1(-model.reversion_speed / 6) / (2 * model.reversion_speed))
+    else:
+        step_std = model.volatility * np.sqrt(1 / 12)
+
+    rates = rng.standard_normal((months, paths))
+    rate = np.full(paths, float(model.initial_rate))
+    for month in range(months):
+        shock = rates[month] * step_std
+        rates[month] = rate
+        rate = model.long_run_rate + (rate - model.long_run_rate) * decay + shock
+    return np.maximum(rates, model.min_rate, out=rates)
+
+
+def _savings_block(initial: float, monthly: float, model: RateModel, years: int, compounding_period: str,
+                   seed: np.random.SeedSequence, paths: int) -> tuple[np.ndarray, ...]:
+    """
+    Simulate a block of savings paths with `calculations.calculate_savings_future_value`, but a rate that changes
+    every month.
+
+    :param seed: seed of the block's rate paths
+    :param int paths: number of paths in the block
+    :return: tuple containing the future value of each path
+    """
+    months = years * 12
+    if months <= 0:
+        return np.full(paths, float(initial)),
+
+    # growth from the end of each month to the end of the savings period, so a contribution made at the end of month
+    # k grows by the last entry divided by the k-th
+    log_growth = np.cumsum(_savings_log_growth(simulate_rate_paths(model, np.random.default_rng(seed), paths, months),
+                                               compounding_period), axis=0)
+    total_growth = log_growth[-1].copy()
+    np.subtract(total_growth, log_growth, out=log_growth)
+    contributions = np.exp(log_growth, out=log_growth).sum(axis=0)
+    return initial * np.exp(total_growth) + monthly * contributions,
+
+
+def _loan_block(remaining_principal: float, model: RateModel, monthly_payment: float, payment_period_months: int,
+                seed: np.random.SeedSequence, paths: int) -> tuple[np.ndarray, ...]:
+    """
+    Simulate a block of loan paths with `calculations.calculate_scheduled_payments`, but a rate that changes every
+    month.
+
+    :param seed: seed of the block's rate paths
+    :param int paths: number of paths in the block
+    :return: tuple containing the total payments, total interest, and remaining principal of each path
+    """
+    months = payment_period_months
+    if months <= 0:
+        zeros = np.zeros(paths)
+        return zeros, zeros, np.full(paths, float(remaining_principal))
+
+    # the blocks are large, so each step works in place
+    log_growth = simulate_rate_paths(model, np.random.default_rng(seed), paths, months)
+    log_growth *= 1 / 100 / 12
+    np.cumsum(np.log1p(log_growth, out=log_growth), axis=0, out=log_growth)
+
+    # the balance after k payments is the growth over k months times the principal less the payments discounted to
+    # the start, so the loan is paid off in the first month the discounted payments reach the principal
+    discounted_payments = np.exp(np.negative(log_growth))
+    np.cumsum(discounted_payments, axis=0, out=discounted_payments)
+    discounted_payments *= monthly_payment
+    paid_off = discounted_payments >= remaining_principal
+    is_paid_off = paid_off[-1]
+    payoff_index = np.where(is_paid_off, paid_off.argmax(axis=0), months - 1)
+
+    columns = np.arange(paths)
+    growth = np.exp(log_growth[payoff_index, columns])
+    discounted_before = np.where(payoff_index > 0, discounted_payments[payoff_index - 1, columns], 0.0)
+
+    # paths that pay off make a partial last payment of what is left, and the rest owe the balance after the period
+    final_payment = growth * (remaining_principal - discounted_before)
+    total_payments = np.where(is_paid_off, monthly_payment * payoff_index + final_payment, monthly_payment * months)
+    remaining = np.where(is_paid_off, 0.0, growth * (remaining_principal - discounted_payments[-1]))
+    return total_payments, total_payments + remaining - remaining_principal, remaining
+
+
+def _run_blocks(block, paths: int, seed: int, executor: Executor | None, progress: Callable[[float], None] | None,
+                *args) -> tuple[np.ndarray, ...]:
+    """
+    Split paths into blocks, simulate them, and join the results in block order.
+
+    :param block: function simulating a block of paths
+    :param int paths: total number of paths
+    :param int seed: seed of the whole simulation
+    :param executor: executor to simulate the blocks on, or None to simulate them in this process
+    :param progress: function called with the fraction of blocks done as each block finishes, or None
+    :param args: arguments of the block function before its seed and number of paths
+    :return: tuple of the block function's outputs over every path
+    """
+    block_paths = [BLOCK_PATHS] * (paths // BLOCK_PATHS) + ([paths % BLOCK_PATHS] if paths % BLOCK_PATHS else [])
+    seeds = np.random.SeedSequence(seed).spawn(len(block_paths))
+    results = []
+    for result in (executor.map if executor is not None else map)(partial(block, *args), seeds, block_paths):
+        results.append(result)
+        if progress is not None:
+            progress(len(results) / len(block_paths))
+    return tuple(np.concatenate(outputs) for outputs in zip(*results))
+
+
+def _summarize(values: np.ndarray, percentiles: tuple[float, ...]) -> dict:
+    """
+    :param np.ndarray values: outcome of each path
+    :param tuple percentiles: percentiles to report, between 0 and 100
+    :return: dict of the mean and percentiles of the outcome
+    """
+    return {'mean': float(values.mean()), 'percentiles': np.percentile(values, percentiles).tolist()}
+
+
+def simulate_savings(initial: float, monthly: float, model: RateModel, years: int,
+                     compounding_period: str = 'yearly', paths: int = 10000, seed: int = 0,
+                     percentiles: tuple[float, ...] = DEFAULT_PERCENTILES, executor: Executor | None = None,
+                     progress: Callable[[float], None] | None = None) -> dict:
+    """
+    Simulate the future value of savings over random paths of the compounding rate. The same seed and number of
+    paths always give the same result.
+
+    :param float initial: initial savings amount
+    :param float monthly: monthly contribution
+    :param RateModel model: model of the compounding rate as a percentage
+    :param int years: savings period in years
+    :param str compounding_period: period of compounding ('daily', 'monthly', or 'yearly')
+    :param int paths: number of paths to simulate
+    :param int seed: seed of the random rate paths
+    :param tuple percentiles: percentiles to report, between 0 and 100
+    :param executor: executor to spread the blocks of paths over, such as a process pool, or None to simulate them in
+        this process
+    :param progress: function called with the fraction of paths simulated as each block finishes, or None
+    :return: dict with the mean and percentiles of the future value
+    """
+    future_value, = _run_blocks(_savings_block, paths, seed, executor, progress, initial, monthly, model, years,
+                                compounding_period)
+    return {'future_value': _summarize(future_value, percentiles)}
+
+
+def simulate_scheduled_payments(remaining_principal: float, model: RateModel, monthly_payment: float,
+                                payment_period_months: int, paths: int = 10000, seed: int = 0,
+                                percentiles: tuple[float, ...] = DEFAULT_PERCENTILES,
+                                executor: Executor | None = None,
+                                progress: Callable[[float], None] | None = None) -> dict:
+    """
+    Simulate the payments of a loan over random paths of the interest rate. The same seed and number of paths always
+    give the same result.
+
+    :param float remaining_principal: remaining principal amount
+    :param RateModel model: model of the annual interest rate as a percentage
+    :param float monthly_payment: monthly payment amount
+    :param int payment_period_months: duration of payment period in months
+    :param int paths: number of paths to simulate
+    :param int seed: seed of the random rate paths
+    :param tuple percentiles: percentiles to report, between 0 and 100
+    :param executor: executor to spread the blocks of paths over, such as a process pool, or None to simulate them in
+        this process
+    :param progress: function called with the fraction of paths simulated as each block finishes, or None
+    :return: dict with the mean and percentiles of the total payments, total interest, and remaining principal, and
+        the fraction of paths that pay off the loan within the payment period
+    """
+    total_payments, total_interest, remaining = _run_blocks(
+        _loan_block, paths, seed, executor, progress, remaining_principal, model, monthly_payment, payment_period_months)
+    return {
+        'total_payments': _summarize(total_payments, percentiles),
+        'total_interest': _summarize(total_interest, percentiles),
+        'remaining_principal': _summarize(remaining, percentiles),
+        'paid_off_fraction': float(np.mean(remaining == 0))
+    }
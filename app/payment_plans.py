@@ -0,0 +1,90 @@
+from .calculations import calculate_payment_plan
+import json
+import sys
+
+
+class PaymentPlan:
+    """
+    Payment plan made up of consecutive payment periods, with the running totals and remaining principal checkpointed
+    at the end of each period. Changing the periods only recalculates from the first period that changed, picking up
+    from the checkpoint before it.
+
+    Plans are immutable so they can be shared between threads, and `with_segments` returns a new plan.
+    """
+    __slots__ = ('remaining_principal', 'annual_rate', 'previous_total_payments', 'previous_interest_paid',
+                 'segments', 'checkpoints')
+
+    def __init__(self, remaining_principal: float, annual_rate: float, segments: list[tuple[float, int]],
+                 previous_total_payments: float = 0, previous_interest_paid: float = 0,
+                 checkpoints: tuple[tuple[float, float, float], ...] = ()):
+        """
+        :param float remaining_principal: remaining principal amount at the start of the plan
+        :param float annual_rate: annual interest rate as a percentage
+        :param list segments: tuples containing the monthly payment amount and duration in months of each payment
+            period
+        :param float previous_total_payments: total payments made before the plan
+        :param float previous_interest_paid: total interest paid before the plan
+        :param tuple checkpoints: checkpoints already calculated for a prefix of the payment periods
+        """
+        self.remaining_principal = remaining_principal
+        self.annual_rate = annual_rate
+        self.previous_total_payments = previous_total_payments
+        self.previous_interest_paid = previous_interest_paid
+        self.segments = tuple(segments)
+
+        start = checkpoints[-1] if checkpoints else (previous_total_payments, previous_interest_paid,
+                                                     remaining_principal)
+        self.checkpoints = checkpoints + tuple(calculate_payment_plan(
+            start[2], annual_rate, self.segments[len(checkpoints):], start[0], start[1]))
+
+    def with_segments(self, segments: list[tuple[float, int]]) -> tuple['PaymentPlan', int]:
+        """
+        Change the payment periods of the plan, reusing the checkpoints of the periods before the first change.
+
+        :param list segments: tuples containing the monthly payment amount and duration in months of each payment
+            period
+        :return: tuple containing the new plan and the index of the first payment period that was recalculated
+        """
+        segments = tuple(segments)
+        unchanged = 0
+        for old, new in zip(self.segments, segments):
+            if old != new:
+                break
+            unchanged += 1
+
+        plan = PaymentPlan(self.remaining_principal, self.annual_rate, segments, self.previous_total_payments,
+                           self.previous_interest_paid, self.checkpoints[:unchanged])
+        return plan, unchanged
+
+    def __sizeof__(self) -> int:
+        return (object.__sizeof__(self) + sys.getsizeof(self.segments) + sys.getsizeof(self.checkpoints) +
+                sum(sys.getsizeof(item) for item in self.segments + self.checkpoints))
+
+
+def encode_plan(plan: PaymentPlan) -> bytes:
+    """
+    Encode a payment plan with its checkpoints as JSON, to keep it in a store shared with other processes.
+
+    :param PaymentPlan plan: payment plan
+    :return: the encoded plan
+    """
+    return json.dumps({
+        'remaining_principal': plan.remaining_principal,
+        'annual_rate': plan.annual_rate,
+        'previous_total_payments': plan.previous_total_payments,
+        'previous_interest_paid': plan.previous_interest_paid,
+        'segments': plan.segments,
+        'checkpoints': plan.checkpoints
+    }).encode()
+
+
+def decode_plan(body: bytes) -> PaymentPlan:
+    """
+    :param bytes body: payment plan encoded by `encode_plan`
+    :return: the payment plan, with the checkpoints it was encoded with rather than recalculated ones
+    """
+    data = json.loads(body)
+    return PaymentPlan(data['remaining_principal'], data['annual_rate'],
+                       [(monthly_payment, months) for monthly_payment, months in data['segments']],
+                       data['previous_total_payments'], data['previous_interest_paid'],
+                       tuple(tuple(checkpoint) for checkpoint in data['checkpoints']))
@@ -0,0 +1,93 @@
+from itertools import islice
+from typing import Callable, Iterable
+import csv
+import numpy as np
+from .batch_calculations import calculate_portfolio_cash_flows_batch
+
+# columns a portfolio CSV must have, in any order alongside any others
+PORTFOLIO_COLUMNS = ('principal', 'annual_rate', 'years')
+
+# number of loans read and projected at a time. Memory use grows with this times the longest loan in months
+CHUNK_ROWS = 10000
+
+# longest loan period accepted, which bounds the months in a projection
+MAX_YEARS = 100
+
+
+class PortfolioProjection:
+    """
+    Running month by month totals of the cash flows of a portfolio of loans, added to one chunk of loans at a time.
+    """
+    __slots__ = ('loans', 'payments', 'interest', 'balance')
+
+    def __init__(self):
+        self.loans = 0
+        self.payments = np.zeros(0)
+        self.interest = np.zeros(0)
+        self.balance = np.zeros(0)
+
+    def add(self, principal: np.ndarray, annual_rate: np.ndarray, years: np.ndarray) -> None:
+        """
+        Add a chunk of loans to the totals.
+
+        :param np.ndarray principal: principal loan amounts
+        :param np.ndarray annual_rate: annual interest rates as percentages
+        :param np.ndarray years: loan periods in years, all positive
+        """
+        totals = calculate_portfolio_cash_flows_batch(principal, annual_rate, years)
+        months = max(len(self.payments), len(totals[0]))
+        self.payments, self.interest, self.balance = (
+            np.pad(total, (0, months - len(total))) + np.pad(chunk_total, (0, months - len(chunk_total)))
+            for total, chunk_total in zip((self.payments, self.interest, self.balance), totals))
+        self.loans += len(principal)
+
+
+def project_portfolio(lines: Iterable[str], chunk_rows: int = CHUNK_ROWS,
+                      on_chunk: Callable[[PortfolioProjection], None] | None = None) -> PortfolioProjection:
+    """
+    Project the month by month cash flows of a portfolio of loans from a CSV with a header row, reading it as a stream
+    one chunk of rows at a time.
+
+    :param lines: lines of the CSV, such as a text file
+    :param int chunk_rows: number of loans projected at a time
+    :param on_chunk: function called with the projection so far after each chunk, such as to report progress
+    :return: the projection of the whole portfolio
+    :raises ValueError: if a column is missing or a row is invalid, counting the header as row 1
+    """
+    reader = csv.reader(lines)
+    header = next(reader, None) or []
+    missing = [column for column in PORTFOLIO_COLUMNS if column not in header]
+    if missing:
+        raise ValueError(f'missing columns {", ".join(missing)}')
+    indices = [header.index(column) for column in PORTFOLIO_COLUMNS]
+
+    projection = PortfolioProjection()
+    while chunk := list(islice(reader, chunk_rows)):
+        try:
+            principal, annual_rate, years = (np.array([row[i] for row in chunk], dtype=np.float64) for i in indices)
+        except (IndexError, ValueError):
+            raise ValueError(f'invalid row {projection.loans + _first_invalid_row(chunk, indices) + 2}')
+
+        invalid = (~np.isfinite(principal) | ~np.isfinite(annual_rate) | ~(years >= 1) | ~(years <= MAX_YEARS) |
+                   (years != np.floor(years)))
+        if invalid.any():
+            raise ValueError(f'invalid row {projection.loans + int(invalid.argmax()) + 2}: years must be a whole '
+                             f'number from 1 to {MAX_YEARS} and amounts must be finite')
+        projection.add(principal, annual_rate, years.astype(np.int64))
+        if on_chunk is not None:
+            on_chunk(projection)
+    return projection
+
+
+def _first_invalid_row(chunk: list[list[str]], indices: list[int]) -> int:
+    """
+    :param list chunk: rows of the CSV
+    :param list indices: indices of the portfolio columns
+    :return: index of the first row that is too short or not a number in a portfolio column
+    """
+    for i, row in enumerate(chunk):
+        try:
+            [float(row[index]) for index in indices]
+        except (IndexError, ValueError):
+            return i
+    return 0
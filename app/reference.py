@@ -0,0 +1,264 @@
+from math import log as ln, ceil, floor
+import numpy as np
+from numpy.typing import ArrayLike
+from .cents import RATE_DENOMINATOR
+
+# The original month-by-month implementations of the calculations, kept as the reference every faster version of them
+# has to agree with. They are deliberately left slow and simple: change them only if the intended results change.
+
+
+def calculate_savings_future_value(initial: float, monthly: float, comp_rate: float, years: int,
+                                   compounding_period: str = 'yearly') -> float:
+    """
+    Reference version of `calculations.calculate_savings_future_value`, compounding every contribution separately.
+
+    :param float initial: initial savings amount
+    :param float monthly: monthly contribution
+    :param float comp_rate: compounding rate as a percentage
+    :param int years: savings period in years
+    :param str compounding_period: period of compounding ('daily', 'monthly', or 'yearly')
+    :return: total value of savings at the end of the savings period
+    """
+    months = years * 12
+
+    if compounding_period == 'monthly':
+        monthly_rate = comp_rate / 100
+
+        # Compound the initial deposit daily
+        future_value = initial * (1 + monthly_rate) ** months
+
+        # Add compounded monthly contributions (each made once per month)
+        for m in range(months):
+            future_value += monthly * (1 + monthly_rate) ** (months - m - 1)
+
+    elif compounding_period == 'daily':
+        days_per_month = 365 / 12
+        total_days = days_per_month * months
+
+        daily_rate = comp_rate / 100
+
+        # Compound the initial deposit daily
+        future_value = initial * (1 + daily_rate) ** total_days
+
+        # Add compounded monthly contributions (each made once per month)
+        for m in range(months):
+            days_remaining = total_days - ((m + 1) * days_per_month)
+            future_value += monthly * (1 + daily_rate) ** days_remaining
+
+    else:
+        # default to yearly compounding rate
+        monthly_rate = comp_rate / 100 / 12
+        future_value = initial * (1 + monthly_rate) ** months
+        for m in range(months):
+            future_value += monthly * (1 + monthly_rate) ** (months - m - 1)
+
+    return future_value
+
+
+def calculate_loan_period(remaining_principal: float, annual_rate: float, monthly_payment: float) -> tuple[int, int]:
+    """
+    Reference version of `calculations.calculate_loan_period`.
+
+    :param float remaining_principal: remaining principal amount
+    :param float annual_rate: annual interest rate as a percentage
+    :param float monthly_payment: monthly payment amount
+    :return: tuple containing years and months needed to pay off the loan
+    """
+    if remaining_principal <= 0:
+        return (0, 0)
+
+    monthly_rate = annual_rate / 100 / 12
+
+    if monthly_rate == 0:
+        payment_periods = remaining_principal / monthly_payment
+        years_remaining = floor(payment_periods / 12)
+        months_remaining = floor(payment_periods % 12)
+    else:
+        payment_periods = (ln(monthly_payment / (monthly_payment - remaining_principal * monthly_rate)) /
+                           ln(1 + monthly_rate))
+        # a payment that amortizes the loan over a whole number of months pays it off in that many months, whichever
+        # side of it the last bit of the logarithms puts the period
+        if abs(payment_periods - round(payment_periods)) <= 1e-12 * payment_periods:
+            payment_periods = round(payment_periods)
+        years_remaining = floor(payment_periods / 12)
+        months_remaining = ceil(payment_periods % 12)
+
+    return (years_remaining, months_remaining)
+
+
+def calculate_scheduled_payments(remaining_principal: float, annual_rate: float, monthly_payment: float,
+                                 previous_total_payments: float, previous_interest_paid: float,
+                                 payment_period_months: int) -> tuple[float, float, float]:
+    """
+    Reference version of `calculations.calculate_scheduled_payments`, stepping through the period a month at a time.
+
+    :param float remaining_principal: remaining principal amount
+    :param float annual_rate: annual interest rate as a percentage
+    :param float monthly_payment: monthly payment amount
+    :param float previous_total_payments: total payments made in previous periods
+    :param float previous_interest_paid: total interest paid in previous periods
+    :param int payment_period_months: duration of payment period in months
+    :return: tuple containing total payments made during period, total interest paid thus far, and remaining principal
+    """
+    monthly_rate = annual_rate / 100 / 12
+    current_principal = remaining_principal
+    period_payments = 0
+    period_interest = 0
+
+    for month in range(payment_period_months):
+        if current_principal <= 0:
+            break
+
+        interest_payment = current_principal * monthly_rate
+        principal_payment = min(monthly_payment - interest_payment, current_principal)
+
+        period_payments += interest_payment + principal_payment
+        period_interest += interest_payment
+        current_principal -= principal_payment
+
+        if current_principal <= 0:
+            break
+
+    total_payments_so_far = previous_total_payments + period_payments
+    total_interest_so_far = previous_interest_paid + period_interest
+
+    return (total_payments_so_far, total_interest_so_far, current_principal)
+
+
+def calculate_scheduled_payments_cents(remaining_principal: int, rate: int, monthly_payment: int,
+                                       previous_total_payments: int, previous_interest_paid: int,
+                                       payment_period_months: int, rounding: str = 'half_up') -> tuple[int, int, int]:
+    """
+    Reference version of `cents.calculate_scheduled_payments_cents_batch` for a single loan: the loop of
+    `calculate_scheduled_payments` in whole cents, with each month's interest rounded to the cent.
+
+    :param int remaining_principal: remaining principal amount in cents
+    :param int rate: annual interest rate in ten-thousandths of a percent
+    :param int monthly_payment: monthly payment amount in cents
+    :param int previous_total_payments: total payments made in previous periods in cents
+    :param int previous_interest_paid: total interest paid in previous periods in cents
+    :param int payment_period_months: duration of payment period in months
+    :param str rounding: rounding mode of the monthly interest charge, 'half_up' or 'half_even'
+    :return: tuple containing total payments made during period, total interest paid thus far, and remaining principal,
+        all in cents
+    """
+    current_principal = remaining_principal
+    period_payments = 0
+    period_interest = 0
+
+    for month in range(payment_period_months):
+        if current_principal <= 0:
+            break
+
+        interest_payment, remainder = divmod(current_principal * rate, RATE_DENOMINATOR)
+        tie = 2 * remainder == RATE_DENOMINATOR
+        if 2 * remainder > RATE_DENOMINATOR or tie and (rounding == 'half_up' or interest_payment % 2 == 1):
+            interest_payment += 1
+        principal_payment = min(monthly_payment - interest_payment, current_principal)
+
+        period_payments += interest_payment + principal_payment
+        period_interest += interest_payment
+        current_principal -= principal_payment
+
+    return (previous_total_payments + period_payments, previous_interest_paid + period_interest, current_principal)
+
+
+def _by_months(months: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    :param np.ndarray months: numbers of months of each case
+    :return: tuple containing the order of the cases from the most months to the fewest, and the number of cases with
+        more than each number of months up to the most
+    """
+    order = np.argsort(-months, kind='stable')
+    active = np.searchsorted(-months[order], -np.arange(months.max(initial=0)), side='left')
+    return order, active
+
+
+def calculate_savings_future_value_stepped(initial: ArrayLike, monthly: ArrayLike, comp_rate: ArrayLike,
+                                           years: ArrayLike, compounding_period: ArrayLike) -> np.ndarray:
+    """
+    The loop of `calculate_savings_future_value` run across many cases at once, a month at a time, to check the batch
+    calculations against millions of cases in reasonable time. The inputs are broadcast against each other.
+
+    :param ArrayLike initial: initial savings amounts
+    :param ArrayLike monthly: monthly contributions
+    :param ArrayLike comp_rate: compounding rates as percentages
+    :param ArrayLike years: savings periods in years
+    :param ArrayLike compounding_period: periods of compounding ('daily', 'monthly', or 'yearly')
+    :return: total values of savings at the end of the savings periods
+    """
+    initial, monthly, comp_rate, years, compounding_period = (column.ravel() for column in np.broadcast_arrays(
+        np.asarray(initial, dtype=np.float64), np.asarray(monthly, dtype=np.float64),
+        np.asarray(comp_rate, dtype=np.float64), np.asarray(years, dtype=np.int64), np.asarray(compounding_period)))
+    months = years * 12
+    daily = compounding_period == 'daily'
+
+    # every branch compounds at a base rate for a number of periods per month: days for daily compounding and one
+    # month otherwise
+    base = 1 + np.where((compounding_period == 'monthly') | daily, comp_rate / 100, comp_rate / 100 / 12)
+    days_per_month = 365 / 12
+    total_periods = np.where(daily, days_per_month * months, months)
+
+    order, active = _by_months(months)
+    base, monthly, months, total_periods, daily = (column[order] for column in (base, monthly, months, total_periods,
+                                                                               daily))
+    with np.errstate(over='ignore'):
+        future_value = initial[order] * base ** total_periods
+        for m, rows in enumerate(active):
+            periods_remaining = np.where(daily[:rows], total_periods[:rows] - ((m + 1) * days_per_month),
+                                         months[:rows] - m - 1)
+            future_value[:rows] += monthly[:rows] * base[:rows] ** periods_remaining
+
+    result = np.empty_like(future_value)
+    result[order] = future_value
+    return result
+
+
+def calculate_scheduled_payments_stepped(remaining_principal: ArrayLike, annual_rate: ArrayLike,
+                                         monthly_payment: ArrayLike, previous_total_payments: ArrayLike,
+                                         previous_interest_paid: ArrayLike,
+                                         payment_period_months: ArrayLike) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    The loop of `calculate_scheduled_payments` run across many cases at once, a month at a time, to check the batch
+    calculations against millions of cases in reasonable time. The inputs are broadcast against each other.
+
+    :param ArrayLike remaining_principal: remaining principal amounts
+    :param ArrayLike annual_rate: annual interest rates as percentages
+    :param ArrayLike monthly_payment: monthly payment amounts
+    :param ArrayLike previous_total_payments: total payments made in previous periods
+    :param ArrayLike previous_interest_paid: total interest paid in previous periods
+    :param ArrayLike payment_period_months: durations of payment periods in months
+    :return: tuple of arrays containing total payments made during period, total interest paid thus far, and remaining
+        principal
+    """
+    remaining_principal, annual_rate, monthly_payment, previous_total_payments, previous_interest_paid, months = (
+        column.ravel() for column in np.broadcast_arrays(
+            np.asarray(remaining_principal, dtype=np.float64), np.asarray(annual_rate, dtype=np.float64),
+            np.asarray(monthly_payment, dtype=np.float64), np.asarray(previous_total_payments, dtype=np.float64),
+            np.asarray(previous_interest_paid, dtype=np.float64), np.asarray(payment_period_months, dtype=np.int64)))
+
+    order, active = _by_months(months)
+    monthly_rate = annual_rate[order] / 100 / 12
+    monthly_payment = monthly_payment[order]
+    current_principal = remaining_principal[order]
+    period_payments = np.zeros(len(order))
+    period_interest = np.zeros(len(order))
+
+    # a loan stops changing once it is paid off, as the loop breaks out
+    for rows in active:
+        principal = current_principal[:rows]
+        owing = principal > 0
+        interest_payment = principal * monthly_rate[:rows]
+        principal_payment = np.minimum(monthly_payment[:rows] - interest_payment, principal)
+
+        period_payments[:rows] += np.where(owing, interest_payment + principal_payment, 0.0)
+        period_interest[:rows] += np.where(owing, interest_payment, 0.0)
+        principal -= np.where(owing, principal_payment, 0.0)
+
+    results = []
+    for column, previous in ((period_payments, previous_total_payments), (period_interest, previous_interest_paid),
+                             (current_principal, None)):
+        result = np.empty_like(column)
+        result[order] = column
+        results.append(result if previous is None else previous + result)
+    return tuple(results)
@@ -0,0 +1,53 @@
+import numpy as np
+from numpy.typing import ArrayLike
+from .batch_calculations import calculate_savings_future_value_batch
+
+
+def loan_payment_grid(principal: float, annual_rate: ArrayLike, months: ArrayLike) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Evaluate `calculations.calculate_loan_payment` over every pair of rate and term in one broadcast computation, with
+    a row per rate and a column per term. The log of each rate's growth is taken once per row, leaving one exponential
+    and one division per cell.
+
+    :param float principal: principal loan amount
+    :param ArrayLike annual_rate: annual interest rates as percentages
+    :param ArrayLike months: loan periods in months, all positive
+    :return: tuple of 2D arrays containing monthly payments and total interest paid
+    """
+    monthly_rate = np.asarray(annual_rate, dtype=np.float64).reshape(-1, 1) / 100 / 12
+    months = np.asarray(months, dtype=np.float64).reshape(1, -1)
+
+    # the payment is P r / (1 - (1 + r)^-n), worked in place in one grid-sized array
+    monthly_payment = np.log1p(monthly_rate) * -months
+    np.expm1(monthly_payment, out=monthly_payment)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.divide(-principal * monthly_rate, monthly_payment, out=monthly_payment)
+    zero_rate = monthly_rate[:, 0] == 0
+    monthly_payment[zero_rate] = principal / months
+
+    total_interest = monthly_payment * months
+    total_interest -= principal
+    return monthly_payment, total_interest
+
+
+def savings_future_value_grid(initial: float, monthly: ArrayLike, comp_rate: ArrayLike, years: int,
+                              compounding_period: str = 'yearly') -> np.ndarray:
+    """
+    Evaluate `calculations.calculate_savings_future_value` over every pair of rate and monthly contribution, with a row
+    per rate and a column per contribution. The future value is linear in the contribution, so the growth of the
+    initial amount and of a contribution of 1 are found once per rate and the grid is their outer product.
+
+    :param float initial: initial savings amount
+    :param ArrayLike monthly: monthly contributions
+    :param ArrayLike comp_rate: compounding rates as percentages
+    :param int years: savings period in years
+    :param str compounding_period: period of compounding ('daily', 'monthly', or 'yearly')
+    :return: 2D array of the total values of savings at the end of the savings period
+    """
+    comp_rate = np.asarray(comp_rate, dtype=np.float64).ravel()
+    initial_growth = calculate_savings_future_value_batch(initial, 0, comp_rate, years, compounding_period)
+    annuity = calculate_savings_future_value_batch(0, 1, comp_rate, years, compounding_period)
+
+    future_value = np.multiply.outer(annuity, np.asarray(monthly, dtype=np.float64).ravel())
+    future_value += initial_growth[:, None]
+    return future_value
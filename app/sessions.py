@@ -0,0 +1,245 @@
+from flask import Flask, Request, Response
+from flask.sessions import SecureCookieSession, SessionInterface
+from typing import Any
+import re
+import secrets
+import struct
+
+# Sessions kept on the server, with only a random session ID in the cookie. The session is stored in a store with
+# `get`, `put`, and `delete` methods, such as a `ResultCache` in memory or a `DirectoryStore` or `SQLiteStore` shared
+# by the workers of a server, in the compact binary encoding below.
+
+# version of the encoding, the first byte of every encoded session
+_VERSION = b'\x01'
+
+# one byte tags starting each encoded value
+_NONE, _TRUE, _FALSE, _INT, _FLOAT, _STR, _BYTES, _LIST, _DICT = b'NTFidsblm'
+
+_INT64 = struct.Struct('<q')
+_FLOAT64 = struct.Struct('<d')
+
+# bytes of randomness in a session ID, and the form of the IDs, which are URL-safe base64
+SESSION_ID_BYTES = 16
+_SESSION_ID = re.compile(r'[A-Za-z0-9_-]{22}')
+
+
+def _write_length(out: bytearray, length: int) -> None:
+    """
+    Write a length as an unsigned LEB128 varint, a single byte for lengths below 128.
+
+    :param bytearray out: encoding written so far
+    :param int length: length to write
+    """
+    while length >= 0x80:
+        out.append(length & 0x7f | 0x80)
+        length >>= 7
+    out.append(length)
+
+
+def _read_length(body: bytes, position: int) -> tuple[int, int]:
+    """
+    :param bytes body: encoded session
+    :param int position: position of a length in the body
+    :return: tuple containing the length and the position after it
+    """
+    length = shift = 0
+    while True:
+        byte = body[position]
+        position += 1
+        length |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return length, position
+        shift += 7
+
+
+def _encode(out: bytearray, value: Any) -> None:
+    """
+    Write a value as a tag followed by its contents.
+
+    :param bytearray out: encoding written so far
+    :param value: value to write
+    :raises TypeError: if the value, or a value in it, is of a type the encoding does not have
+    """
+    if value is None:
+        out.append(_NONE)
+    elif value is True or value is False:
+        out.append(_TRUE if value else _FALSE)
+    elif isinstance(value, int):
+        out.append(_INT)
+        out += _INT64.pack(value)
+    elif isinstance(value, float):
+        out.append(_FLOAT)
+        out += _FLOAT64.pack(value)
+    elif isinstance(value, str):
+        encoded = value.encode()
+        out.append(_STR)
+        _write_length(out, len(encoded))
+        out += encoded
+    elif isinstance(value, bytes):
+        out.append(_BYTES)
+        _write_length(out, len(value))
+        out += value
+    elif isinstance(value, (list, tuple)):
+        out.append(_LIST)
+        _write_length(out, len(value))
+        for item in value:
+            _encode(out, item)
+    elif isinstance(value, dict):
+        out.append(_DICT)
+        _write_length(out, len(value))
+        for key, item in value.items():
+            if not isinstance(key, str):
+                raise TypeError(f'session keys must be strings, not {type(key).__name__}')
+            _encode(out, key)
+            _encode(out, item)
+    else:
+        raise TypeError(f'sessions cannot hold values of type {type(value).__name__}')
+
+
+def _decode(body: bytes, position: int) -> tuple[Any, int]:
+    """
+    :param bytes body: encoded session
+    :param int position: position of a value's tag in the body
+    :return: tuple containing the value and the position after it
+    """
+    tag = body[position]
+    position += 1
+    if tag == _NONE:
+        return None, position
+    if tag == _TRUE or tag == _FALSE:
+        return tag == _TRUE, position
+    if tag == _INT:
+        return _INT64.unpack_from(body, position)[0], position + _INT64.size
+    if tag == _FLOAT:
+        return _FLOAT64.unpack_from(body, position)[0], position + _FLOAT64.size
+    if tag == _STR or tag == _BYTES:
+        length, position = _read_length(body, position)
+        value = body[position:position + length]
+        return value.decode() if tag == _STR else bytes(value), position + length
+    if tag == _LIST or tag == _DICT:
+        length, position = _read_length(body, position)
+        items = []
+        for _ in range(length * 2 if tag == _DICT else length):
+            item, position = _decode(body, position)
+            items.append(item)
+        return (dict(zip(items[::2], items[1::2])) if tag == _DICT else items), position
+    raise ValueError(f'unknown tag {chr(tag)!r} at byte {position - 1}')
+
+
+def encode_session(data: dict) -> bytes:
+    """
+    Encode the data of a session in a compact binary encoding: a version byte, then each value as a one byte tag
+    followed by its contents. Integers are int64 and floats float64, both little-endian, strings (UTF-8) and bytes are
+    a varint length followed by their bytes, and lists and dicts are a varint count followed by their items, with each
+    key of a dict before its value. Tuples are encoded as lists, as they would be in JSON.
+
+    :param dict data: data of the session, mapping strings to None, booleans, ints, floats, strings, bytes, lists,
+        tuples, and dicts of them
+    :return: the encoded session
+    :raises TypeError: if the data holds a value of another type
+    :raises struct.error: if an int does not fit in 64 bits
+    """
+    out = bytearray(_VERSION)
+    _encode(out, data)
+    return bytes(out)
+
+
+def decode_session(body: bytes) -> dict:
+    """
+    :param bytes body: session encoded by `encode_session`
+    :return: the data of the session
+    :raises ValueError: if the body is not an encoded session
+    """
+    if body[:1] != _VERSION:
+        raise ValueError('not an encoded session')
+    try:
+        data, position = _decode(body, 1)
+    except (IndexError, struct.error, UnicodeDecodeError) as e:
+        raise ValueError('truncated or corrupt session') from e
+    if position != len(body) or not isinstance(data, dict):
+        raise ValueError('truncated or corrupt session')
+    return data
+
+
+class ServerSideSession(SecureCookieSession):
+    """
+    Session whose data is kept on the server under its session ID, which is None until the session is first stored.
+    """
+
+    def __init__(self, initial: dict | None = None, session_id: str | None = None):
+        """
+        :param dict initial: data of the session
+        :param str session_id: ID the session is stored under, or None for a new session
+        """
+        super().__init__(initial)
+        self.session_id = session_id
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """
+    Flask session interface keeping the data of each session in a store on the server, with only the session ID in the
+    cookie. A session is only written to the store when it is modified, and removed from it when it is emptied. IDs are
+    random, so unlike Flask's signed cookies they need no secret key and the cookie reveals nothing of the data.
+    """
+
+    session_class = ServerSideSession
+
+    def __init__(self, store):
+        """
+        :param store: store the sessions are kept in, with `get(key, default)`, `put(key, value)`, and `delete(key)`
+            methods taking string keys and bytes values. Its time to live bounds how long a session lasts on the server
+        """
+        self.store = store
+
+    def open_session(self, app: Flask, request: Request) -> ServerSideSession:
+        """
+        :return: the session named by the request's cookie, or a new session if there is none, it is unknown or has
+            expired, or the cookie is not a session ID
+        """
+        session_id = request.cookies.get(self.get_cookie_name(app))
+        if session_id and _SESSION_ID.fullmatch(session_id):
+            body = self.store.get(session_id)
+            if body is not None:
+                try:
+                    return self.session_class(decode_session(body), session_id)
+                except ValueError:
+                    app.logger.warning('discarding corrupt session %s', session_id)
+        return self.session_class()
+
+    def save_session(self, app: Flask, session: ServerSideSession, response: Response) -> None:
+        """
+        Store the session if it was modified, and set or delete its cookie as Flask's cookie sessions do.
+        """
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        partitioned = self.get_cookie_partitioned(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        # remove a session that was emptied, and never store an empty one
+        if not session:
+            if session.modified:
+                if session.session_id is not None:
+                    self.store.delete(session.session_id)
+                response.delete_cookie(name, domain=domain, path=path, secure=secure, partitioned=partitioned,
+                                       samesite=samesite, httponly=httponly)
+                response.vary.add('Cookie')
+            return
+
+        if not self.should_set_cookie(app, session):
+            return
+
+        if session.modified or session.session_id is None:
+            if session.session_id is None:
+                session.session_id = secrets.token_urlsafe(SESSION_ID_BYTES)
+            self.store.put(session.session_id, encode_session(dict(session)))
+
+        response.set_cookie(name, session.session_id, expires=self.get_expiration_time(app, session),
+                            httponly=httponly, domain=domain, path=path, secure=secure, partitioned=partitioned,
+                            samesite=samesite)
+        response.vary.add('Cookie')
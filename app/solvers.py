@@ -0,0 +1,128 @@
+import numpy as np
+from numpy.typing import ArrayLike
+from .batch_calculations import _annuity_factor, _savings_log_growth
+
+# absolute tolerance on the monthly rate found by `calculate_implied_rate_batch`, about 1e-9 of a percent of APR
+RATE_TOLERANCE = 1e-12
+
+# iteration limit of `calculate_implied_rate_batch`. Newton's method converges in under 10 iterations for realistic
+# loans, and each bisection fallback at least halves the bracket, so 100 iterations always reach the tolerance
+MAX_RATE_ITERATIONS = 100
+
+
+def calculate_required_payment_batch(remaining_principal: ArrayLike, annual_rate: ArrayLike,
+                                     months: ArrayLike) -> np.ndarray:
+    """
+    Calculate the monthly payment that pays off a loan in a number of months, in closed form. The inputs are broadcast
+    against each other.
+
+    :param ArrayLike remaining_principal: remaining principal amounts
+    :param ArrayLike annual_rate: annual interest rates as percentages
+    :param ArrayLike months: numbers of months to pay off the loans in
+    :return: monthly payment amounts, NaN where the number of months is not positive
+    """
+    remaining_principal, annual_rate, months = np.broadcast_arrays(
+        np.asarray(remaining_principal, dtype=np.float64), np.asarray(annual_rate, dtype=np.float64),
+        np.asarray(months, dtype=np.float64))
+    monthly_rate = annual_rate / 100 / 12
+
+    # the principal is the present value of the payments, which is the payment times the present value of an annuity.
+    # Its discount factor is taken with expm1 rather than as the annuity factor discounted back over the whole loan,
+    # which overflows for long terms
+    growing = monthly_rate != 0
+    safe_rate = np.where(growing, monthly_rate, 1.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        present_value = np.where(growing, -np.expm1(-months * np.log1p(safe_rate)) / safe_rate, months)
+        payment = remaining_principal / present_value
+    return np.where(months > 0, payment, np.nan)
+
+
+def calculate_implied_rate_batch(remaining_principal: ArrayLike, monthly_payment: ArrayLike,
+                                 months: ArrayLike, tolerance: float = RATE_TOLERANCE,
+                                 max_iterations: int = MAX_RATE_ITERATIONS) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Calculate the annual interest rate at which a monthly payment pays off a loan in a number of months. The inputs are
+    broadcast against each other.
+
+    There is no closed form, so each row is solved with Newton's method on the monthly rate, safeguarded by a bracket
+    between 0 and the rate at which the payment only covers the interest. A Newton step that leaves the bracket is
+    replaced with bisection. Iteration stops once a step moves the monthly rate by no more than the tolerance.
+
+    :param ArrayLike remaining_principal: remaining principal amounts
+    :param ArrayLike monthly_payment: monthly payment amounts
+    :param ArrayLike months: numbers of months to pay off the loans in
+    :param float tolerance: absolute tolerance on the monthly rate as a decimal
+    :param int max_iterations: maximum number of iterations
+    :return: tuple containing the annual interest rates as percentages, and the number of iterations each row took.
+        Rows where the payments add up to less than the principal, which would need a negative rate, are NaN
+    """
+    remaining_principal, monthly_payment, months = np.broadcast_arrays(
+        np.asarray(remaining_principal, dtype=np.float64), np.asarray(monthly_payment, dtype=np.float64),
+        np.asarray(months, dtype=np.float64))
+    total_paid = monthly_payment * months
+
+    # payments that add up to the principal to within rounding are solved by a zero rate
+    at_least_principal = total_paid >= remaining_principal * (1 - 4 * np.finfo(np.float64).eps)
+    valid = (remaining_principal > 0) & (monthly_payment > 0) & (months > 0) & at_least_principal
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # the payment covers the interest at any rate below payment / principal
+        low = np.zeros_like(remaining_principal)
+        high = np.where(valid, monthly_payment / remaining_principal, 0.0)
+
+        # start from the first order expansion of the annuity factor in the rate, which is close for small rates
+        rate = 2 * (total_paid - remaining_principal) / (total_paid * (months + 1))
+        rate = np.clip(np.where(valid, rate, 0.0), low, high)
+
+    iterations = np.zeros(remaining_principal.shape, dtype=np.int64)
+    active = valid & (total_paid > remaining_principal)
+
+    for _ in range(max_iterations):
+        if not active.any():
+            break
+
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            # present value of the payments at the rate, less the principal, and its derivative in the rate
+            log_growth = np.log1p(rate)
+            discounted = -np.expm1(-months * log_growth)
+            error = monthly_payment * discounted / rate - remaining_principal
+            slope = monthly_payment * (months * np.exp(-(months + 1) * log_growth) * rate - discounted) / rate ** 2
+
+            # the present value falls as the rate rises, so a positive error means the rate is too low
+            low = np.where(active & (error > 0), rate, low)
+            high = np.where(active & (error < 0), rate, high)
+
+            newton = rate - error / slope
+            next_rate = np.where((newton > low) & (newton < high), newton, (low + high) / 2)
+            next_rate = np.where(error == 0, rate, next_rate)
+
+        converged = np.abs(next_rate - rate) <= tolerance
+        rate = np.where(active, next_rate, rate)
+        iterations += active
+        active &= ~converged
+
+    return np.where(valid, rate * 12 * 100, np.nan), iterations
+
+
+def calculate_savings_contribution_batch(target: ArrayLike, initial: ArrayLike, comp_rate: ArrayLike,
+                                         years: ArrayLike, compounding_period: ArrayLike = 'yearly') -> np.ndarray:
+    """
+    Calculate the monthly contribution that grows savings to a target with
+    `calculations.calculate_savings_future_value`, in closed form. The inputs are broadcast against each other.
+
+    :param ArrayLike target: target savings amounts
+    :param ArrayLike initial: initial savings amounts
+    :param ArrayLike comp_rate: compounding rates as percentages
+    :param ArrayLike years: savings periods in years
+    :param ArrayLike compounding_period: periods of compounding ('daily', 'monthly', or 'yearly')
+    :return: monthly contributions, negative where the initial amount alone grows past the target, and NaN where the
+        savings period is not positive
+    """
+    target, initial, years, log_growth = np.broadcast_arrays(
+        np.asarray(target, dtype=np.float64), np.asarray(initial, dtype=np.float64),
+        np.asarray(years, dtype=np.int64), _savings_log_growth(comp_rate, compounding_period))
+    months = years * 12
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        contribution = (target - initial * np.exp(months * log_growth)) / _annuity_factor(log_growth, months)
+    return np.where(months > 0, contribution, np.nan)
@@ -0,0 +1,486 @@
+from app import batch_calculations
+from app.calculations import (calculate_loan_payment, calculate_savings_future_value, calculate_loan_period,
+                              calculate_scheduled_payments, calculate_payment_plan, amortization_schedule)
+from app.cents import calculate_scheduled_payments_cents_batch, to_cents
+from app.sensitivity import loan_payment_grid, savings_future_value_grid
+from app.monte_carlo import RateModel, simulate_scheduled_payments
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterator
+import argparse
+import json
+import numpy as np
+import os
+import platform
+import sys
+import tempfile
+import time
+from timeit import Timer
+
+
+def time_call(func, *args, repeat: int = 5) -> float:
+    """
+    Time a single call of a function with the given arguments.
+
+    :param func: function to time
+    :param args: positional arguments passed to the function
+    :param int repeat: number of timing runs, the fastest of which is reported
+    :return: fastest time per call in seconds
+    """
+    timer = Timer(lambda: func(*args))
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def benchmark_savings_future_value() -> None:
+    """
+    Print the cost of `calculate_savings_future_value` over increasing horizons for each compounding period. The
+    cost per call should stay flat as the number of years grows.
+    """
+    print('calculate_savings_future_value')
+    for compounding_period in ('yearly', 'monthly', 'daily'):
+        for years in (1, 10, 50, 100):
+            seconds = time_call(calculate_savings_future_value, 1000, 100, 0.3, years, compounding_period)
+            print(f'  {compounding_period:>8} {years:>4} years: {seconds * 1e6:8.3f} us/call')
+
+
+def benchmark_scheduled_payments() -> None:
+    """
+    Print the cost of `calculate_scheduled_payments` over increasing payment periods, both for periods that end before
+    the loan is paid off and for periods that run past the payoff month. The cost per call should stay flat.
+    """
+    print('calculate_scheduled_payments')
+    for months in (12, 120, 1200, 12000):
+        seconds = time_call(calculate_scheduled_payments, 250000, 6.5, 1580.17, 0, 0, months)
+        print(f'  {months:>6} months: {seconds * 1e6:8.3f} us/call')
+
+
+def benchmark_batch(rows: int = 1_000_000, sample: int = 10_000) -> None:
+    """
+    Print the throughput of each batch function in `batch_calculations` against calling its scalar counterpart in a
+    Python loop. The scalar time is measured on a sample of the rows and scaled up to the full batch.
+
+    :param int rows: number of rows in the batch
+    :param int sample: number of rows the scalar functions are timed on
+    """
+    rng = np.random.default_rng(0)
+    principal = rng.uniform(1000, 1000000, rows)
+    rate = rng.uniform(0, 20, rows)
+    rate[::10] = 0
+    payment = principal * (rate / 1200 + rng.uniform(0.001, 0.03, rows))
+    years = rng.integers(1, 40, rows)
+    months = years * 12
+    compounding_period = rng.choice(['yearly', 'monthly', 'daily'], rows)
+    savings_rate = np.where(compounding_period == 'yearly', rate, rate / 1000)
+
+    kernels = (
+        (calculate_loan_payment, batch_calculations.calculate_loan_payment_batch,
+         (principal, rate, years)),
+        (calculate_savings_future_value, batch_calculations.calculate_savings_future_value_batch,
+         (principal, payment, savings_rate, years, compounding_period)),
+        (calculate_loan_period, batch_calculations.calculate_loan_period_batch,
+         (principal, rate, payment)),
+        (calculate_scheduled_payments, batch_calculations.calculate_scheduled_payments_batch,
+         (principal, rate, payment, np.zeros(rows), np.zeros(rows), months)),
+    )
+
+    print(f'batch_calculations ({rows} rows)')
+    for scalar, batch, columns in kernels:
+        sample_rows = list(zip(*(column[:sample].tolist() for column in columns)))
+        scalar_seconds = time_call(lambda: [scalar(*row) for row in sample_rows], repeat=1) * rows / sample
+        batch_seconds = time_call(batch, *columns, repeat=3)
+        print(f'  {batch.__name__:>40}: {rows / batch_seconds:14,.0f} rows/s, '
+              f'{scalar_seconds / batch_seconds:6.1f}x the scalar loop')
+
+
+# time the whole-cents calculation is meant to take at most, as a multiple of the float calculation's. It is not met
+# yet: see "Whole cents" in the README
+CENTS_TARGET_RATIO = 2
+
+
+def benchmark_cents(rows: int = 1_000_000) -> None:
+    """
+    Print the throughput of `calculate_scheduled_payments_cents_batch` under each rounding mode against the float
+    `calculate_scheduled_payments_batch` on the same loans, and against the `CENTS_TARGET_RATIO` target.
+
+    :param int rows: number of loans in the batch
+    """
+    rng = np.random.default_rng(0)
+    principal = rng.uniform(1000, 1000000, rows).round(2)
+    rate = rng.uniform(0, 20, rows).round(4)
+    payment = (principal * (rate / 1200 + rng.uniform(0.001, 0.03, rows))).round(2)
+    months = rng.integers(1, 361, rows)
+
+    float_seconds = time_call(batch_calculations.calculate_scheduled_payments_batch, principal, rate, payment, 0, 0,
+                              months, repeat=3)
+    print(f'calculate_scheduled_payments_cents_batch ({rows} rows)')
+    print(f'  {"float":>10}: {rows / float_seconds:14,.0f} rows/s')
+    for rounding in ('half_up', 'half_even'):
+        seconds = time_call(calculate_scheduled_payments_cents_batch, to_cents(principal), rate, to_cents(payment),
+                            0, 0, months, rounding, repeat=1)
+        print(f'  {rounding:>10}: {rows / seconds:14,.0f} rows/s, {seconds / float_seconds:6.1f}x the float time '
+              f'(target {CENTS_TARGET_RATIO}x)')
+
+
+def benchmark_sensitivity(size: int = 1000) -> None:
+    """
+    Print the time the sensitivity grids take to calculate a square grid.
+
+    :param int size: number of values on each axis
+    """
+    rates = np.linspace(0, 20, size)
+    grids = ((loan_payment_grid, (250000, rates, np.arange(1, size + 1))),
+             (savings_future_value_grid, (1000, np.linspace(0, 5000, size), rates, 30)))
+
+    print(f'sensitivity grids ({size} x {size})')
+    for grid, args in grids:
+        print(f'  {grid.__name__:>25}: {time_call(grid, *args, repeat=3) * 1e3:8.2f} ms')
+
+
+def benchmark_monte_carlo(paths: int = 1_000_000, months: int = 360) -> None:
+    """
+    Print the time `simulate_scheduled_payments` takes to simulate a 30 year loan in this process and spread over a
+    process pool with one worker per core.
+
+    :param int paths: number of rate paths
+    :param int months: number of months in each path
+    """
+    model = RateModel(5, 4, reversion_speed=0.3, volatility=1.2)
+    workers = os.cpu_count() or 1
+
+    def simulate(executor=None):
+        return simulate_scheduled_payments(300000, model, 1700, months, paths, executor=executor)
+
+    print(f'simulate_scheduled_payments ({paths} paths x {months} months)')
+    print(f'  {"1 process":>12}: {time_call(simulate, repeat=1):8.2f} s')
+    with ProcessPoolExecutor(workers) as executor:
+        # the first call starts the workers, so only later calls are timed
+        simulate(executor)
+        seconds = time_call(simulate, executor, repeat=1)
+    print(f'  {f"{workers} processes":>12}: {seconds:8.2f} s')
+
+
+def benchmark_sessions() -> None:
+    """
+    Print the time each request spends loading and saving the session `/loan` stores for `/payment-schedule`, with
+    Flask's signed cookie sessions and with each server-side session store, and the size of the cookie the browser
+    sends back with every request.
+    """
+    from app.app import app
+    from app.cache import DirectoryStore, ResultCache, SQLiteStore
+    from app.sessions import ServerSideSessionInterface
+    from flask import request
+    from flask.sessions import SecureCookieSessionInterface
+
+    loan_data = {'principal': 250000.0, 'rate': 6.5, 'years': 30, 'monthly_payment': 1580.1684483897238,
+                 'total_paid': 568860.6414203006, 'total_interest': 318860.6414203006}
+
+    def handle(interface, write: bool = False) -> str:
+        session = interface.open_session(app, request)
+        if write:
+            session['loan_data'] = loan_data
+        else:
+            session.get('loan_data')
+        response = app.response_class()
+        interface.save_session(app, session, response)
+        return response.headers.get('Set-Cookie', '').split(';')[0]
+
+    with tempfile.TemporaryDirectory() as directory:
+        interfaces = {'signed cookie': SecureCookieSessionInterface(),
+                      'memory': ServerSideSessionInterface(ResultCache()),
+                      'directory': ServerSideSessionInterface(DirectoryStore(directory)),
+                      'sqlite': ServerSideSessionInterface(SQLiteStore(os.path.join(directory, 'sessions.db')))}
+
+        print('sessions (time per request spent on the session)')
+        for name, interface in interfaces.items():
+            with app.test_request_context():
+                cookie = handle(interface, write=True)
+            with app.test_request_context(headers={'Cookie': cookie}):
+                read = time_call(handle, interface)
+                write = time_call(handle, interface, True)
+            print(f'  {name:>13}: read {read * 1e6:7.1f} us, write {write * 1e6:7.1f} us, '
+                  f'cookie {len(cookie):4} bytes')
+
+
+# rates, horizons, and batch sizes the benchmark suite covers
+SUITE_RATES = (0, 5, 20)
+SUITE_YEARS = (1, 10, 30, 100)
+SUITE_BATCH_SIZES = (1, 100, 10_000, 1_000_000)
+
+# fraction by which throughput may fall below the baseline before the suite fails
+DEFAULT_THRESHOLD = 0.25
+
+
+def measure_throughput(func, *args, rows: int = 1, min_seconds: float = 0.02, repeat: int = 5) -> float:
+    """
+    Measure the throughput of a function, timing enough calls per run to take `min_seconds` and keeping the fastest
+    of the runs.
+
+    :param func: function to time
+    :param args: positional arguments passed to the function
+    :param int rows: number of rows the function works through per call
+    :param float min_seconds: shortest time a run takes
+    :param int repeat: number of timing runs
+    :return: rows per second
+    """
+    timer = Timer(lambda: func(*args))
+    number = 1
+    while timer.timeit(number) < min_seconds:
+        number *= 4
+    return rows * number / min(timer.repeat(repeat=repeat, number=number))
+
+
+def calculation_cases() -> Iterator[tuple[str, Callable, tuple]]:
+    """
+    :return: iterator of tuples containing the name, function, and arguments of every case of the functions in
+        `app/calculations.py`, across rates (including 0) and horizons
+    """
+    for rate in SUITE_RATES:
+        for years in SUITE_YEARS:
+            months = years * 12
+            payment = calculate_loan_payment(250000, rate, years)[0]
+            label = f'rate={rate},years={years}'
+            yield f'calculate_loan_payment[{label}]', calculate_loan_payment, (250000, rate, years)
+            for compounding_period, period_rate in (('yearly', rate), ('monthly', rate / 12), ('daily', rate / 365)):
+                yield (f'calculate_savings_future_value[{label},{compounding_period}]', calculate_savings_future_value,
+                       (1000, 100, period_rate, years, compounding_period))
+            yield f'calculate_loan_period[{label}]', calculate_loan_period, (250000, rate, payment)
+            yield (f'calculate_scheduled_payments[{label}]', calculate_scheduled_payments,
+                   (250000, rate, payment, 0, 0, months))
+            yield (f'calculate_payment_plan[{label}]', calculate_payment_plan,
+                   (250000, rate, [(payment, months // 2), (payment * 2, months)]))
+            yield (f'amortization_schedule[{label}]', lambda *args: deque(amortization_schedule(*args), maxlen=0),
+                   (250000, rate, payment, months))
+
+
+def batch_cases(sizes: tuple[int, ...]) -> Iterator[tuple[str, Callable, tuple, int]]:
+    """
+    :param tuple sizes: batch sizes
+    :return: iterator of tuples containing the name, function, arguments, and number of rows of every case of the
+        batch versions of the functions in `app/calculations.py`
+    """
+    for rows in sizes:
+        rng = np.random.default_rng(0)
+        principal = rng.uniform(1000, 1000000, rows).round(2)
+        rate = rng.choice(np.array(SUITE_RATES, dtype=np.float64), rows)
+        years = rng.choice(SUITE_YEARS, rows)
+        payment = (principal * (rate / 1200 + rng.uniform(0.001, 0.03, rows))).round(2)
+        compounding_period = rng.choice(['yearly', 'monthly', 'daily'], rows)
+        savings_rate = np.where(compounding_period == 'yearly', rate, rate / 1000)
+        zeros = np.zeros(rows)
+
+        for batch, args in (
+                (batch_calculations.calculate_loan_payment_batch, (principal, rate, years)),
+                (batch_calculations.calculate_savings_future_value_batch,
+                 (principal, payment, savings_rate, years, compounding_period)),
+                (batch_calculations.calculate_loan_period_batch, (principal, rate, payment)),
+                (batch_calculations.calculate_scheduled_payments_batch,
+                 (principal, rate, payment, zeros, zeros, years * 12)),
+                (calculate_scheduled_payments_cents_batch,
+                 (to_cents(principal), rate, to_cents(payment), 0, 0, years * 12))):
+            yield f'{batch.__name__}[rows={rows}]', batch, args, rows
+
+
+def route_cases() -> list[tuple[str, str, dict]]:
+    """
+    :return: list of tuples containing the method, path, and test client keyword arguments of a request to every
+        calculation route in `app/app.py`
+    """
+    scenario = {'remaining_principal': 10000, 'annual_rate': 6.5, 'monthly_payment': 195.66,
+                'previous_total_payments': 0, 'previous_interest_paid': 0, 'payment_period_months': 12}
+    scenarios = [scenario] * 1000
+    plan = {'remaining_principal': 10000, 'annual_rate': 6.5,
+            'segments': [{'monthly_payment': 195.66, 'months': 12}, {'monthly_payment': 300, 'months': 100}]}
+    portfolio = 'principal,annual_rate,years\n' + '250000,6.5,30\n10000,0,5\n' * 500
+    rate_model = {'initial_rate': 5, 'long_run_rate': 4, 'volatility': 1}
+
+    return [
+        ('GET', '/', {}),
+        ('POST', '/loan', {'data': {'principal': 250000, 'rate': 6.5, 'years': 30}}),
+        ('GET', '/loan?principal=250000&rate=6.5&years=30', {}),
+        # reads the session stored by the POST to /loan
+        ('GET', '/payment-schedule', {}),
+        ('POST', '/savings', {'data': {'initial': 1000, 'monthly': 100, 'rate': 5, 'years': 30,
+                                       'compounding_period': 'monthly'}}),
+        ('POST', '/calculate-loan-period', {'json': {key: scenario[key] for key in
+                                                     ('remaining_principal', 'annual_rate', 'monthly_payment')}}),
+        ('POST', '/calculate-scheduled-payments', {'json': scenario}),
+        ('POST', '/calculate-scheduled-payments?rounding=half_even', {'json': scenario}),
+        ('POST', '/calculate-payment-plan', {'json': plan}),
+        ('POST', '/payment-plans', {'json': plan}),
+        ('POST', '/calculate-adjustable-rate-loan', {'json': {
+            'remaining_principal': 200000, 'term_months': 360, 'caps': {'periodic_cap': 2},
+            'rate_schedule': [{'month': 0, 'annual_rate': 3}, {'month': 60, 'annual_rate': 9}]}}),
+        ('POST', '/batch/calculate-loan-period', {'json': scenarios}),
+        ('POST', '/batch/calculate-scheduled-payments', {'json': scenarios}),
+        ('POST', '/solve/required-payment', {'json': [{'remaining_principal': 10000, 'annual_rate': 6.5,
+                                                       'months': 60}] * 1000}),
+        ('POST', '/solve/implied-rate', {'json': [{'remaining_principal': 10000, 'monthly_payment': 195.66,
+                                                   'months': 60}] * 1000}),
+        ('POST', '/solve/savings-contribution', {'json': [{'target': 100000, 'initial': 1000, 'rate': 5, 'years': 30,
+                                                           'compounding_period': 'yearly'}] * 1000}),
+        ('POST', '/sensitivity/loan?format=binary', {'json': {
+            'principal': 250000, 'annual_rate': {'start': 0, 'stop': 20, 'num': 100}, 'months': list(range(1, 361))}}),
+        ('POST', '/sensitivity/savings?format=binary', {'json': {
+            'initial': 1000, 'years': 30, 'rate': {'start': 0, 'stop': 20, 'num': 100},
+            'monthly': {'start': 0, 'stop': 1000, 'num': 100}}}),
+        ('POST', '/portfolio-projection', {'data': portfolio, 'content_type': 'text/csv'}),
+        ('POST', '/amortization-schedule', {'json': {key: scenario[key] for key in (
+            'remaining_principal', 'annual_rate', 'monthly_payment', 'payment_period_months')}}),
+        ('POST', '/simulate/savings', {'json': {'initial': 1000, 'monthly': 100, 'years': 30,
+                                                'compounding_period': 'monthly', 'paths': 1000,
+                                                'rate_model': rate_model}}),
+        ('POST', '/simulate/scheduled-payments', {'json': {'remaining_principal': 250000, 'monthly_payment': 1600,
+                                                           'payment_period_months': 360, 'paths': 1000,
+                                                           'rate_model': rate_model}}),
+        ('GET', '/cache-stats', {}),
+        ('GET', '/metrics', {}),
+    ]
+
+
+def measure_route(client, method: str, path: str, kwargs: dict, min_seconds: float = 0.25,
+                  max_requests: int = 1000) -> dict:
+    """
+    Measure the latency of a route through the Flask test client. The result cache is cleared before every request,
+    so each one runs its calculation.
+
+    :param client: Flask test client
+    :param str method: HTTP method
+    :param str path: path and query string of the request
+    :param dict kwargs: keyword arguments of the request, such as its body
+    :param float min_seconds: time to keep sending requests for, after one warm-up request
+    :param int max_requests: most requests to send
+    :return: dict of the 50th, 90th, and 99th percentile latencies in seconds, and the throughput in requests per
+        second at the median latency
+    :raises RuntimeError: if the route responds with an error
+    """
+    from app.app import result_cache
+    response = client.open(path, method=method, **kwargs)
+    if response.status_code >= 400:
+        raise RuntimeError(f'{method} {path} responded {response.status}')
+
+    latencies = []
+    end = time.perf_counter() + min_seconds
+    while time.perf_counter() < end and len(latencies) < max_requests:
+        result_cache.clear()
+        start = time.perf_counter()
+        client.open(path, method=method, **kwargs).close()
+        latencies.append(time.perf_counter() - start)
+
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+    return {'p50': p50, 'p90': p90, 'p99': p99, 'throughput': 1 / p50}
+
+
+def run_suite(batch_sizes: tuple[int, ...] = SUITE_BATCH_SIZES, rounds: int = 3) -> dict:
+    """
+    Run the benchmark suite, printing the results. Every case is measured once per round, one round after the other,
+    and keeps its best round, so that a spell of noise from other work on the machine does not read as a regression.
+
+    :param tuple batch_sizes: batch sizes of the batch functions
+    :param int rounds: number of times every case is measured
+    :return: dict of the machine the suite ran on, and the results of each case by name. Every result has a throughput
+        in rows or requests per second, and routes also have latency percentiles
+    """
+    # the app is only imported here, since it starts threads that would be copied into the processes of the Monte Carlo
+    # benchmark
+    from app.app import app
+    client = app.test_client()
+    cases = ([(name, 'calls/s', lambda func=func, args=args: {'throughput': measure_throughput(func, *args)})
+              for name, func, args in calculation_cases()] +
+             [(name, 'rows/s', lambda func=func, args=args, rows=rows: {
+                 'throughput': measure_throughput(func, *args, rows=rows, repeat=3 if rows > 10000 else 5)})
+              for name, func, args, rows in batch_cases(batch_sizes)] +
+             [(f'{method} {path}', 'requests/s', lambda method=method, path=path, kwargs=kwargs: measure_route(
+                 client, method, path, kwargs)) for method, path, kwargs in route_cases()])
+
+    results = {}
+    for i in range(rounds):
+        print(f'round {i + 1} of {rounds}')
+        for name, _, measure in cases:
+            result = measure()
+            if name not in results or result['throughput'] > results[name]['throughput']:
+                results[name] = result
+
+    for name, unit, _ in cases:
+        latency = (f' (p50 / p90 / p99 {results[name]["p50"] * 1e3:.3f} / {results[name]["p90"] * 1e3:.3f} / '
+                   f'{results[name]["p99"] * 1e3:.3f} ms)' if 'p50' in results[name] else '')
+        print(f'  {name:>65}: {results[name]["throughput"]:14,.0f} {unit}{latency}')
+
+    return {
+        'machine': {'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform(),
+                    'cpus': os.cpu_count()},
+        'results': results
+    }
+
+
+def find_regressions(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """
+    :param dict results: results of the suite
+    :param dict baseline: results of an earlier run of the suite
+    :param float threshold: fraction by which throughput may fall below the baseline
+    :return: a description of every case whose throughput fell further than the threshold below the baseline
+    """
+    regressions = []
+    for name, baseline_result in baseline['results'].items():
+        result = results['results'].get(name)
+        if result is not None and result['throughput'] < (1 - threshold) * baseline_result['throughput']:
+            regressions.append(f'{name}: {result["throughput"]:,.1f}/s against a baseline of '
+                               f'{baseline_result["throughput"]:,.1f}/s '
+                               f'({result["throughput"] / baseline_result["throughput"] - 1:+.0%})')
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    """
+    Print the benchmarks, or run the benchmark suite against a baseline.
+
+    :param list argv: command line arguments
+    :return: exit status, 1 if the suite found a regression
+    """
+    parser = argparse.ArgumentParser(description='Print the cost of the calculations over a range of inputs, or with '
+                                                 '--suite run a suite covering every calculation and route')
+    parser.add_argument('--suite', action='store_true',
+                        help='run the benchmark suite and compare it to the baseline, failing on a regression')
+    parser.add_argument('--baseline', default='benchmark_baseline.json', help='baseline file of the suite')
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='write the results of the suite to the baseline file instead of comparing to it')
+    parser.add_argument('--threshold', type=float,
+                        default=float(os.environ.get('BENCHMARK_THRESHOLD', DEFAULT_THRESHOLD)),
+                        help='fraction by which throughput may fall below the baseline')
+    parser.add_argument('--max-batch-size', type=int, default=max(SUITE_BATCH_SIZES),
+                        help='largest batch size of the suite, to shorten a run')
+    parser.add_argument('--rounds', type=int, default=3,
+                        help='number of times every case is measured, keeping the best')
+    args = parser.parse_args(argv)
+
+    if not args.suite:
+        benchmark_savings_future_value()
+        benchmark_scheduled_payments()
+        benchmark_batch()
+        benchmark_cents()
+        benchmark_sensitivity()
+        benchmark_monte_carlo()
+        benchmark_sessions()
+        return 0
+
+    results = run_suite(tuple(size for size in SUITE_BATCH_SIZES if size <= args.max_batch_size), args.rounds)
+    if args.update_baseline or not os.path.exists(args.baseline):
+        with open(args.baseline, 'w') as file:
+            json.dump(results, file, indent=2)
+        print(f'wrote the baseline to {args.baseline}')
+        return 0
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    if baseline['machine'] != results['machine']:
+        print(f'warning: the baseline was taken on a different machine: {baseline["machine"]}')
+
+    regressions = find_regressions(results, baseline, args.threshold)
+    for regression in regressions:
+        print(f'REGRESSION {regression}')
+    print(f'{len(regressions)} of {len(baseline["results"])} cases regressed more than {args.threshold:.0%}')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+import gc
+import os
+import shutil
+import tempfile
+
+# Production settings of the gunicorn server that serves the app, read from the working directory by `gunicorn
+# app.app:app`. The app is loaded once in the arbiter before it forks the workers, so the modules and the compiled
+# templates are in memory pages that every worker shares copy-on-write.
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+
+# one worker process per core the server may run on, each handling THREADS_PER_WORKER requests at a time. The
+# calculations hold the GIL, so threads mostly let a worker keep serving while another request waits on a client
+_cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+workers = int(os.environ.get('WEB_CONCURRENCY', _cores))
+threads = int(os.environ.get('THREADS_PER_WORKER', 4))
+worker_class = 'gthread' if threads > 1 else 'sync'
+preload_app = True
+
+# replace each worker after about MAX_REQUESTS requests, at staggered times so they are not all replaced at once, and
+# let it finish its requests for up to GRACEFUL_TIMEOUT seconds first
+max_requests = int(os.environ.get('MAX_REQUESTS', 10000))
+max_requests_jitter = max_requests // 10
+graceful_timeout = int(os.environ.get('GRACEFUL_TIMEOUT', 30))
+timeout = int(os.environ.get('WORKER_TIMEOUT', 120))
+keepalive = 5
+
+# the workers' heartbeat files, in memory where a tmpfs is available
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+accesslog = os.environ.get('ACCESS_LOG')
+errorlog = '-'
+
+# the workers share the sessions through a SQLite database, and the payment plans and background jobs through files,
+# kept in RUNTIME_DIR unless each is configured. Without RUNTIME_DIR they are kept in a new directory private to this
+# user, removed when the server stops, so no other local user can read them or plant files for the workers to read
+_created_runtime_dir = None
+if not os.environ.get('RUNTIME_DIR'):
+    os.environ['RUNTIME_DIR'] = _created_runtime_dir = tempfile.mkdtemp(prefix='interest-calculator-')
+os.environ.setdefault('PAYMENT_PLAN_DIR', os.path.join(os.environ['RUNTIME_DIR'], 'plans'))
+os.environ.setdefault('SESSION_DB', os.path.join(os.environ['RUNTIME_DIR'], 'sessions', 'sessions.db'))
+os.environ.setdefault('JOB_DIR', os.path.join(os.environ['RUNTIME_DIR'], 'jobs'))
+
+# the workers add up their request and calculation metrics through files, so /metrics reports the same counts whichever
+# worker answers, and counts of replaced workers are kept
+os.environ.setdefault('METRICS_DIR', os.path.join(os.environ['RUNTIME_DIR'], 'metrics'))
+
+# each worker starts its own pool of simulation processes on its first large simulation, so the cores are split
+# between the pools rather than each pool taking every core. With a worker per core, that leaves one process per pool,
+# and simulations run in the worker itself, which is already busy on its core; with fewer workers than cores, large
+# simulations spread over the cores the workers leave free
+os.environ.setdefault('SIMULATION_WORKERS', str(max(1, _cores // workers)))
+
+
+def on_starting(server):
+    # the settings are read again when the server reloads, and would no longer know they created the directory
+    server.created_runtime_dir = _created_runtime_dir
+    from app.app import metrics
+    metrics.clear_directory()
+
+
+def when_ready(server):
+    from app.app import warm_up
+    warm_up()
+    server.log.info('Warmed up the calculations and templates')
+    server.log.info('Simulations use up to %s processes per worker', os.environ['SIMULATION_WORKERS'])
+
+
+def pre_fork(server, worker):
+    # move everything loaded so far out of the garbage collector's reach, so that collections in the workers do not
+    # write to the shared pages and copy them
+    gc.freeze()
+
+
+def worker_exit(server, worker):
+    from app.app import job_queue, metrics
+    job_queue.close()
+    metrics.retire()
+
+
+def on_exit(server):
+    if server.created_runtime_dir is not None:
+        shutil.rmtree(server.created_runtime_dir, ignore_errors=True)
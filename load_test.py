@@ -0,0 +1,172 @@
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import signal
+import subprocess
+import sys
+import time
+import numpy as np
+
+# Load test of the production server: starts gunicorn with each number of worker processes in turn, drives it with
+# client processes sending a mix of calculation requests for a fixed time, and prints the throughput and latency of
+# each, to show how throughput scales with the number of cores the server uses.
+
+HOST = '127.0.0.1'
+
+
+def _scheduled_payments(rng: random.Random) -> tuple[str, str, dict]:
+    principal = rng.uniform(1000, 500000)
+    return 'POST', '/calculate-scheduled-payments', {
+        'remaining_principal': principal, 'annual_rate': rng.uniform(0, 12), 'monthly_payment': principal * 0.01 + 1,
+        'previous_total_payments': 0, 'previous_interest_paid': 0, 'payment_period_months': rng.randint(1, 360)}
+
+
+def _batch(rng: random.Random) -> tuple[str, str, list]:
+    scenarios = [{'remaining_principal': rng.uniform(1000, 500000), 'annual_rate': rng.uniform(0, 12),
+                  'monthly_payment': rng.uniform(6000, 10000), 'previous_total_payments': 0,
+                  'previous_interest_paid': 0, 'payment_period_months': rng.randint(1, 360)} for _ in range(100)]
+    return 'POST', '/batch/calculate-scheduled-payments', scenarios
+
+
+def _grid(rng: random.Random) -> tuple[str, str, dict]:
+    return 'POST', '/sensitivity/loan', {'principal': rng.uniform(1000, 500000),
+                                         'annual_rate': {'start': 1, 'stop': 10, 'num': 20},
+                                         'months': {'start': 12, 'stop': 360, 'num': 30}}
+
+
+# the mix of requests sent, by relative frequency
+MIX = ((_scheduled_payments, 6), (_batch, 3), (_grid, 1))
+
+
+def _client(port: int, seconds: float, seed: int, results) -> None:
+    """
+    Send requests to the server one after another for a number of seconds, and put the latency of each and the number
+    of failures in the results queue.
+
+    :param int port: port of the server
+    :param float seconds: how long to send requests for
+    :param int seed: seed of the random requests
+    :param results: queue the results are put in
+    """
+    rng = random.Random(seed)
+    makers, weights = zip(*MIX)
+    connection = http.client.HTTPConnection(HOST, port, timeout=60)
+    latencies = []
+    failures = 0
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        method, path, body = rng.choices(makers, weights)[0](rng)
+        start = time.perf_counter()
+        try:
+            connection.request(method, path, json.dumps(body), {'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            response.read()
+            ok = response.status == 200
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            connection = http.client.HTTPConnection(HOST, port, timeout=60)
+            ok = False
+        if ok:
+            latencies.append(time.perf_counter() - start)
+        else:
+            failures += 1
+    connection.close()
+    results.put((latencies, failures))
+
+
+def _start_server(port: int, workers: int, threads: int) -> subprocess.Popen:
+    """
+    Start gunicorn with the production settings and wait until it answers.
+
+    :param int port: port to serve on
+    :param int workers: number of worker processes
+    :param int threads: number of threads of each worker
+    :return: the server process
+    """
+    env = {**os.environ, 'PORT': str(port), 'WEB_CONCURRENCY': str(workers), 'THREADS_PER_WORKER': str(threads)}
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', 'app.app:app'], env=env,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with status {server.returncode}')
+        try:
+            connection = http.client.HTTPConnection(HOST, port, timeout=5)
+            connection.request('GET', '/')
+            connection.getresponse().read()
+            connection.close()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError('gunicorn did not start in time')
+
+
+def run(workers: int, threads: int, clients: int, seconds: float, port: int, seed: int) -> dict:
+    """
+    Load test the server with a number of workers.
+
+    :param int workers: number of worker processes of the server
+    :param int threads: number of threads of each worker
+    :param int clients: number of client processes sending requests at once
+    :param float seconds: how long to send requests for
+    :param int port: port to serve on
+    :param int seed: seed of the random requests
+    :return: dict of the requests per second, the latency percentiles in milliseconds, and the number of failures
+    """
+    server = _start_server(port, workers, threads)
+    try:
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=_client, args=(port, seconds, seed + i, results))
+                     for i in range(clients)]
+        for process in processes:
+            process.start()
+        outcomes = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(60)
+
+    latencies = np.concatenate([np.asarray(latencies) for latencies, _ in outcomes])
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000 if len(latencies) else (float('nan'), float('nan'))
+    return {'requests_per_second': len(latencies) / seconds, 'p50': p50, 'p99': p99,
+            'failures': sum(failures for _, failures in outcomes)}
+
+
+def main() -> None:
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description='Load test the production server with increasing numbers of workers')
+    parser.add_argument('--workers', type=int, nargs='+', default=list(range(1, cores + 1)),
+                        help='numbers of worker processes to test (default: 1 up to the number of cores)')
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('THREADS_PER_WORKER', 4)),
+                        help='threads of each worker')
+    parser.add_argument('--clients', type=int, default=None,
+                        help='client processes sending requests at once (default: twice the most workers)')
+    parser.add_argument('--seconds', type=float, default=10, help='how long to load each server')
+    parser.add_argument('--port', type=int, default=5050)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    clients = args.clients or 2 * max(args.workers)
+
+    print(f'{cores} cores, {clients} clients, {args.threads} threads per worker, {args.seconds:g}s per run')
+    print('The clients run on the same machine and take CPU time from the server, so the scaling is understated.')
+    print(f"{'workers':>7} {'requests/s':>11} {'speedup':>8} {'efficiency':>10} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'failures':>8}")
+    base = None
+    for workers in args.workers:
+        result = run(workers, args.threads, clients, args.seconds, args.port, args.seed)
+        if base is None:
+            # throughput per worker of the first run
+            base = result['requests_per_second'] / workers
+        speedup = result['requests_per_second'] / base
+        print(f"{workers:>7} {result['requests_per_second']:>11.1f} {speedup:>7.2f}x {speedup / workers:>10.0%} "
+              f"{result['p50']:>8.2f} {result['p99']:>8.2f} {result['failures']:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,38 @@
 from app.calculations import (calculate_loan_payment, calculate_savings_future_value,
-                              calculate_loan_period, calculate_scheduled_payments)
+                              calculate_loan_period, calculate_scheduled_payments, amortization_schedule,
+                              calculate_payment_plan)
+from app.batch_calculations import (calculate_portfolio_cash_flows_batch, calculate_loan_payment_batch,
+                                    calculate_savings_future_value_batch, calculate_loan_period_batch,
+                                    calculate_scheduled_payments_batch)
+from app.adjustable_rate import apply_rate_caps, calculate_adjustable_rate_loan
+from app.amortization_table import AmortizationTable
+from app.app import app, metrics, result_cache, warm_up
+from app.cache import DirectoryStore, ResultCache, SQLiteStore
+from app.columnar import COLUMNAR_MIMETYPE, decode_columns, encode_columns
+from app.cents import RATE_SCALE, calculate_scheduled_payments_cents, calculate_scheduled_payments_cents_batch
+from app import cents as app_cents, reference
+from app.metrics import Metrics, sample_stacks
+from app.jobs import JobQueue, QueueFullError, report_progress
+from app.monte_carlo import RateModel, simulate_savings, simulate_scheduled_payments
+from app.payment_plans import PaymentPlan, decode_plan, encode_plan
+from app.portfolio import project_portfolio
+from app.sessions import decode_session, encode_session
+from app.sensitivity import loan_payment_grid, savings_future_value_grid
+from app.solvers import (calculate_required_payment_batch, calculate_implied_rate_batch,
+                         calculate_savings_contribution_batch)
+from concurrent.futures import ProcessPoolExecutor
+import io
+import json
+from decimal import Decimal, ROUND_HALF_EVEN, ROUND_HALF_UP
+import numpy as np
+import os
+import pickle
+import subprocess
+import tempfile
+import threading
+import time
 import unittest
+import verify_engines
 from math import log as ln, ceil, floor
 
 
@@ -141,6 +173,47 @@ class TestCalculations(unittest.TestCase):
 
         self.assertAlmostEqual(future_value, calculated, places=2)
 
+    def test_savings_long_horizon(self):
+        """
+        Ensure `calculate_savings_future_value` matches month-by-month compounding over a long savings period for
+        every compounding period
+        """
+
+        initial = 2500
+        monthly_contrib = 150
+        years = 50
+        months = years * 12
+        days_per_month = 365 / 12
+        total_days = days_per_month * months
+
+        for compounding_period, rate in (('yearly', 4.5), ('monthly', 0.4), ('daily', 0.012)):
+            decimal_rate = rate / 100
+            if compounding_period == 'yearly':
+                decimal_rate /= 12
+
+            if compounding_period == 'daily':
+                future_value = initial * (1 + decimal_rate) ** total_days
+                for m in range(months):
+                    days_remaining = total_days - ((m + 1) * days_per_month)
+                    future_value += monthly_contrib * (1 + decimal_rate) ** days_remaining
+            else:
+                future_value = initial * (1 + decimal_rate) ** months
+                for m in range(months):
+                    future_value += monthly_contrib * (1 + decimal_rate) ** (months - m - 1)
+
+            calculated = calculate_savings_future_value(initial, monthly_contrib, rate, years, compounding_period)
+            self.assertAlmostEqual(future_value, calculated, places=2)
+
+    def test_savings_zero_rate_all_periods(self):
+        """
+        Ensure `calculate_savings_future_value` adds up contributions exactly when there is no growth, regardless of
+        the compounding period
+        """
+
+        for compounding_period in ('yearly', 'monthly', 'daily'):
+            calculated = calculate_savings_future_value(1000, 100, 0, 30, compounding_period)
+            self.assertEqual(1000 + 100 * 360, calculated)
+
     def test_loan_period_calculator(self):
         """
         Test that `calculate_loan_period` returns correct value
@@ -335,6 +408,1185 @@ class TestCalculations(unittest.TestCase):
             self.assertAlmostEqual(correct_output[i], trial_output[i])
 
 
+    def test_calculate_scheduled_payments_long_period(self):
+        """
+        Test that `calculate_scheduled_payments` pays off a loan in the right month when the payment period is far
+        longer than the loan, and leaves the loan untouched by rounding once it is paid off
+        """
+
+        principal = 250000
+        yearly_rate = 6.5
+        monthly_rate = yearly_rate / 100 / 12
+        monthly_payment = 1580.17
+
+        remaining_principal = principal
+        payments_made = 0
+        interest_paid = 0
+        while remaining_principal > 0:
+            interest = remaining_principal * monthly_rate
+            principal_payment = min(monthly_payment - interest, remaining_principal)
+            payments_made += interest + principal_payment
+            interest_paid += interest
+            remaining_principal -= principal_payment
+
+        for months in (361, 1200, 12000):
+            trial_output = calculate_scheduled_payments(principal, yearly_rate, monthly_payment, 0, 0, months)
+            self.assertAlmostEqual(payments_made, trial_output[0], places=6)
+            self.assertAlmostEqual(interest_paid, trial_output[1], places=6)
+            self.assertEqual(0, trial_output[2])
+
+    def test_calculate_scheduled_payments_interest_only(self):
+        """
+        Test that `calculate_scheduled_payments` never pays off a loan when the payment does not cover the interest
+        """
+
+        principal = 10000
+        yearly_rate = 6
+        monthly_payment = 40
+        months = 24
+
+        remaining_principal = principal
+        interest_paid = 0
+        for i in range(months):
+            interest = remaining_principal * yearly_rate / 100 / 12
+            remaining_principal -= monthly_payment - interest
+            interest_paid += interest
+
+        trial_output = calculate_scheduled_payments(principal, yearly_rate, monthly_payment, 0, 0, months)
+        self.assertAlmostEqual(monthly_payment * months, trial_output[0])
+        self.assertAlmostEqual(interest_paid, trial_output[1])
+        self.assertAlmostEqual(remaining_principal, trial_output[2])
+
+    def test_amortization_schedule(self):
+        """
+        Test that `amortization_schedule` stops at the payoff month and adds up to `calculate_scheduled_payments`
+        """
+
+        principal = 10000
+        yearly_rate = 6.5
+        monthly_payment = 195.66
+        months = 70
+
+        schedule = list(amortization_schedule(principal, yearly_rate, monthly_payment, months))
+        total_payments, total_interest, remaining = calculate_scheduled_payments(principal, yearly_rate,
+                                                                                 monthly_payment, 0, 0, months)
+
+        self.assertEqual(list(range(1, len(schedule) + 1)), [row[0] for row in schedule])
+        self.assertLess(len(schedule), months)
+        self.assertAlmostEqual(total_payments, sum(row[1] for row in schedule))
+        self.assertAlmostEqual(total_interest, sum(row[2] for row in schedule))
+        self.assertEqual(remaining, schedule[-1][4])
+
+    def test_calculate_payment_plan(self):
+        """
+        Test that `calculate_payment_plan` matches chaining `calculate_scheduled_payments` over each payment period
+        """
+
+        principal = 10000
+        yearly_rate = 6.5
+        segments = [(195.66, 12), (300, 6), (150, 100)]
+
+        correct_output = []
+        state = (0, 0, principal)
+        for monthly_payment, months in segments:
+            state = calculate_scheduled_payments(state[2], yearly_rate, monthly_payment, state[0], state[1], months)
+            correct_output.append(state)
+
+        self.assertEqual(correct_output, calculate_payment_plan(principal, yearly_rate, segments))
+
+
+class TestBatchCalculations(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        rows = 2000
+        self.principal = rng.uniform(0, 500000, rows)
+        self.principal[::7] = 0
+        self.rate = rng.uniform(0, 15, rows)
+        self.rate[::5] = 0
+        self.payment = self.principal * (self.rate / 1200 + rng.uniform(0, 0.03, rows))
+        self.payment[::11] = self.principal[::11] * self.rate[::11] / 1200 / 2
+        self.years = rng.integers(1, 40, rows)
+        self.months = rng.integers(0, 600, rows)
+
+    def test_loan_payment_batch(self):
+        """
+        Ensure `calculate_loan_payment_batch` matches `calculate_loan_payment` row by row
+        """
+        trial_output = calculate_loan_payment_batch(self.principal, self.rate, self.years)
+        for i in range(len(self.principal)):
+            correct_output = calculate_loan_payment(self.principal[i], self.rate[i], int(self.years[i]))
+            for j in range(3):
+                self.assertAlmostEqual(correct_output[j], trial_output[j][i], places=6)
+
+    def test_savings_future_value_batch(self):
+        """
+        Ensure `calculate_savings_future_value_batch` matches `calculate_savings_future_value` row by row with mixed
+        compounding periods
+        """
+        compounding_period = np.resize(['yearly', 'monthly', 'daily'], len(self.principal))
+        rate = np.where(compounding_period == 'yearly', self.rate, self.rate / 1000)
+        trial_output = calculate_savings_future_value_batch(self.principal, 100, rate, self.years, compounding_period)
+        for i in range(len(self.principal)):
+            correct_output = calculate_savings_future_value(self.principal[i], 100, rate[i], int(self.years[i]),
+                                                            compounding_period[i])
+            self.assertAlmostEqual(correct_output, trial_output[i], delta=1e-9 * max(1, correct_output))
+
+    def test_loan_period_batch(self):
+        """
+        Ensure `calculate_loan_period_batch` matches `calculate_loan_period` row by row, with NaN for loans that are
+        never paid off
+        """
+        years, months = calculate_loan_period_batch(self.principal, self.rate, self.payment)
+        for i in range(len(self.principal)):
+            try:
+                correct_output = calculate_loan_period(float(self.principal[i]), float(self.rate[i]),
+                                                       float(self.payment[i]))
+            except (ValueError, ZeroDivisionError):
+                self.assertTrue(np.isnan(years[i]) and np.isnan(months[i]))
+            else:
+                self.assertEqual(correct_output, (years[i], months[i]))
+
+    def test_loan_period_batch_whole_months(self):
+        """
+        Ensure `calculate_loan_period_batch` rounds the periods of payments that pay off a loan over a whole number of
+        months the same way as `calculate_loan_period`, which gives them exactly that many months
+        """
+        rate = np.repeat(np.linspace(0.01, 30, 200), 4)
+        years = np.tile([1, 5, 30, 100], 200)
+        payment = calculate_loan_payment_batch(574.72, rate, years)[0]
+        periods = calculate_loan_period_batch(574.72, rate, payment)
+        for i in range(len(rate)):
+            self.assertEqual(calculate_loan_period(574.72, float(rate[i]), float(payment[i])),
+                             (periods[0][i], periods[1][i]))
+        short = years <= 30
+        np.testing.assert_array_equal((years[short], np.zeros(short.sum())), (periods[0][short], periods[1][short]))
+
+    def test_scheduled_payments_batch(self):
+        """
+        Ensure `calculate_scheduled_payments_batch` matches `calculate_scheduled_payments` row by row
+        """
+        trial_output = calculate_scheduled_payments_batch(self.principal, self.rate, self.payment, 100, 10,
+                                                          self.months)
+        for i in range(len(self.principal)):
+            correct_output = calculate_scheduled_payments(self.principal[i], self.rate[i], self.payment[i], 100, 10,
+                                                          int(self.months[i]))
+            for j in range(3):
+                self.assertAlmostEqual(correct_output[j], trial_output[j][i], delta=1e-9 * max(1, correct_output[j]))
+
+
+    def test_portfolio_cash_flows(self):
+        """
+        Ensure `calculate_portfolio_cash_flows_batch` adds up the `amortization_schedule` of each loan at the payment
+        from `calculate_loan_payment`, including a zero rate loan
+        """
+        loans = [(10000, 5, 1), (20000, 0, 2), (5000, 12, 3)]
+        payments, interest, balance = calculate_portfolio_cash_flows_batch(*zip(*loans))
+
+        expected = np.zeros((3, 36))
+        for principal, annual_rate, years in loans:
+            monthly_payment = calculate_loan_payment(principal, annual_rate, years)[0]
+            for month, payment, month_interest, _, month_balance in amortization_schedule(
+                    principal, annual_rate, monthly_payment, years * 12):
+                expected[:, month - 1] += payment, month_interest, month_balance
+
+        np.testing.assert_allclose(expected, [payments, interest, balance], atol=1e-8)
+
+
+class TestAmortizationTable(unittest.TestCase):
+    def setUp(self):
+        self.principal = 10000
+        self.yearly_rate = 6.5
+        self.monthly_payment = 195.66
+        self.table = AmortizationTable.build(self.principal, self.yearly_rate, self.monthly_payment, 120)
+
+    def test_range_totals(self):
+        """
+        Test that range totals of `AmortizationTable` match chained `calculate_scheduled_payments` calls
+        """
+        first = calculate_scheduled_payments(self.principal, self.yearly_rate, self.monthly_payment, 0, 0, 12)
+        second = calculate_scheduled_payments(first[2], self.yearly_rate, self.monthly_payment, first[0], first[1],
+                                              24)
+
+        self.assertAlmostEqual(second[0] - first[0], self.table.payments_between(13, 36))
+        self.assertAlmostEqual(second[1] - first[1], self.table.interest_between(13, 36))
+        self.assertAlmostEqual(first[2] - second[2], self.table.principal_between(13, 36))
+        self.assertAlmostEqual(second[2], self.table.balance_at(36))
+
+    def test_payoff(self):
+        """
+        Test that `AmortizationTable` stops at the payoff month and treats later months as paid off
+        """
+        periods = calculate_loan_period(self.principal, self.yearly_rate, self.monthly_payment)
+        self.assertEqual(periods[0] * 12 + periods[1], self.table.payoff_month)
+        self.assertEqual(self.table.payoff_month, len(self.table))
+        self.assertEqual(0, self.table.balance_at(100))
+        self.assertEqual(0, self.table.interest_between(70, 100))
+        self.assertEqual(self.table.payoff_month, self.table.month_balance_below(0))
+        self.assertIsNone(AmortizationTable.build(self.principal, self.yearly_rate, 10, 12).payoff_month)
+
+    def test_build_plan(self):
+        """
+        Test that the table of a payment plan matches the plan's checkpoints at the end of each payment period, and
+        stops at the payoff month
+        """
+        plan = PaymentPlan(self.principal, self.yearly_rate, [(self.monthly_payment, 12), (300, 12), (500, 100)])
+        table = AmortizationTable.build_plan(self.principal, self.yearly_rate, plan.segments)
+
+        for month, (total_payments, total_interest, remaining) in zip((12, 24), plan.checkpoints):
+            self.assertAlmostEqual(total_payments, table.payments_between(1, month))
+            self.assertAlmostEqual(total_interest, table.interest_between(1, month))
+            self.assertAlmostEqual(remaining, table.balance_at(month))
+        self.assertEqual(len(table), table.payoff_month)
+        self.assertAlmostEqual(plan.checkpoints[-1][0], table.payments_between(1, len(table)))
+
+    def test_save_and_pickle(self):
+        """
+        Test that `AmortizationTable` survives pickling and a memory-mapped save and load
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'table.npy')
+            self.table.save(path)
+            tables = [pickle.loads(pickle.dumps(self.table)), AmortizationTable.load(path)]
+
+            for table in tables:
+                self.assertEqual(self.table.payoff_month, table.payoff_month)
+                self.assertEqual(self.table.interest_between(1, 12), table.interest_between(1, 12))
+
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.now = 0
+        self.cache = ResultCache(maxsize=2, ttl=10, clock=lambda: self.now)
+
+    def test_lru_eviction(self):
+        """
+        Test that `ResultCache` evicts the least recently used entry once it is full
+        """
+        self.cache.get_or_compute('a', lambda: 1)
+        self.cache.get_or_compute('b', lambda: 2)
+        self.cache.get_or_compute('a', lambda: None)
+        self.cache.get_or_compute('c', lambda: 3)
+
+        self.assertEqual(1, self.cache.get_or_compute('a', lambda: None))
+        self.assertEqual(4, self.cache.get_or_compute('b', lambda: 4))
+
+        stats = self.cache.stats()
+        self.assertEqual((2, 4, 2, 2), (stats['hits'], stats['misses'], stats['evictions'], stats['entries']))
+        self.assertGreater(stats['memory_bytes'], 0)
+
+    def test_ttl_expiry(self):
+        """
+        Test that `ResultCache` recomputes an entry once it expires
+        """
+        self.cache.get_or_compute('a', lambda: 1)
+        self.now = 9
+        self.assertEqual(1, self.cache.get_or_compute('a', lambda: 2))
+        self.now = 10
+        self.assertEqual(2, self.cache.get_or_compute('a', lambda: 2))
+        self.assertEqual(1, self.cache.stats()['expirations'])
+
+    def test_directory_store(self):
+        """
+        Ensure entries stored in a directory are seen by another store sharing it until they expire, and expired
+        entries are swept away
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            store = DirectoryStore(directory, ttl=100, clock=lambda: self.now)
+            other = DirectoryStore(directory, ttl=100, clock=lambda: self.now)
+            plan = PaymentPlan(1000, 5, [(100, 12)])
+            store.put('plan', encode_plan(plan))
+            self.assertEqual(plan.checkpoints, decode_plan(other.get('plan')).checkpoints)
+            self.assertIsNone(other.get('../plan'))
+
+            self.now += 100
+            self.assertEqual('expired', other.get('plan', 'expired'))
+            other.put('other', b'1')
+            self.assertEqual(1, len(os.listdir(directory)))
+
+    def test_private_directory(self):
+        """
+        Ensure the stores create their directories private to this user, and refuse directories other users may use
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            DirectoryStore(os.path.join(directory, 'plans'))
+            SQLiteStore(os.path.join(directory, 'sessions', 'sessions.db'))
+            for name in ('plans', 'sessions'):
+                self.assertEqual(0o700, os.stat(os.path.join(directory, name)).st_mode & 0o777)
+
+            os.chmod(directory, 0o755)
+            with self.assertRaises(PermissionError):
+                DirectoryStore(directory)
+            with self.assertRaises(PermissionError):
+                SQLiteStore(os.path.join(directory, 'sessions.db'))
+            with self.assertRaises(PermissionError):
+                JobQueue(directory)
+
+    def test_sqlite_store(self):
+        """
+        Ensure entries stored in a SQLite database are seen by another store sharing it until they expire or are
+        deleted
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'sessions.db')
+            store = SQLiteStore(path, ttl=100, clock=lambda: self.now)
+            other = SQLiteStore(path, ttl=100, clock=lambda: self.now)
+            store.put('a', b'\x00session')
+            store.put('b', b'other')
+            self.assertEqual(b'\x00session', other.get('a'))
+
+            other.delete('b')
+            self.assertIsNone(store.get('b'))
+            self.now += 100
+            self.assertEqual('expired', other.get('a', 'expired'))
+
+
+class TestPaymentPlan(unittest.TestCase):
+    def test_with_segments(self):
+        """
+        Test that `PaymentPlan.with_segments` keeps the checkpoints before the first changed payment period and
+        recalculates the rest to the same values as a new plan
+        """
+        segments = [(195.66, 12), (300, 12), (200, 12)]
+        edited = [(195.66, 12), (300, 12), (250, 24)]
+        plan = PaymentPlan(10000, 6.5, segments)
+
+        edited_plan, recalculated_from = plan.with_segments(edited)
+
+        self.assertEqual(2, recalculated_from)
+        self.assertIs(plan.checkpoints[1], edited_plan.checkpoints[1])
+        self.assertEqual(PaymentPlan(10000, 6.5, edited).checkpoints, edited_plan.checkpoints)
+        self.assertEqual(calculate_payment_plan(10000, 6.5, edited), list(edited_plan.checkpoints))
+
+    def test_encoding(self):
+        """
+        Test that a payment plan encoded by `encode_plan` decodes to the same terms, payment periods, and checkpoints
+        """
+        plan = PaymentPlan(10000.01, 6.5, [(195.66, 12), (300, 12)], 1234.56, 78.9)
+        decoded = decode_plan(encode_plan(plan))
+
+        for name in PaymentPlan.__slots__:
+            self.assertEqual(getattr(plan, name), getattr(decoded, name))
+
+
+class TestSolvers(unittest.TestCase):
+    def test_required_payment(self):
+        """
+        Ensure `calculate_required_payment_batch` matches the payment from `calculate_loan_payment`, including at a
+        zero rate, and that over a very long term it approaches the interest alone instead of overflowing
+        """
+        payments = calculate_required_payment_batch([10000, 12000, 10000], [5, 0, 5], [60, 48, 200000])
+        self.assertAlmostEqual(calculate_loan_payment(10000, 5, 5)[0], payments[0])
+        self.assertAlmostEqual(calculate_loan_payment(12000, 0, 4)[0], payments[1])
+        self.assertAlmostEqual(10000 * 0.05 / 12, payments[2])
+
+    def test_implied_rate(self):
+        """
+        Ensure `calculate_implied_rate_batch` recovers the rates the required payments were calculated at, and has no
+        solution when the payments add up to less than the principal
+        """
+        rng = np.random.default_rng(0)
+        principal = rng.uniform(1000, 1000000, 1000)
+        rate = rng.uniform(0, 30, 1000)
+        rate[::10] = 0
+        months = rng.integers(1, 480, 1000)
+        payment = calculate_required_payment_batch(principal, rate, months)
+
+        implied_rate, iterations = calculate_implied_rate_batch(principal, payment, months)
+        np.testing.assert_allclose(rate, implied_rate, atol=1e-8)
+        self.assertLessEqual(iterations.max(), 50)
+        self.assertTrue(np.isnan(calculate_implied_rate_batch(10000, 100, 60)[0]))
+
+    def test_savings_contribution(self):
+        """
+        Ensure the contribution from `calculate_savings_contribution_batch` grows savings to the target with
+        `calculate_savings_future_value`
+        """
+        for compounding_period, rate in (('yearly', 5), ('monthly', 0.4), ('daily', 0.01), ('yearly', 0)):
+            monthly = calculate_savings_contribution_batch(100000, 1000, rate, 10, compounding_period)
+            self.assertAlmostEqual(100000, calculate_savings_future_value(1000, float(monthly), rate, 10,
+                                                                         compounding_period), places=6)
+
+
+class TestCents(unittest.TestCase):
+    def test_rounding_modes(self):
+        """
+        Ensure interest of exactly half a cent rounds up under half-up rounding and to the even cent under banker's
+        rounding
+        """
+        # 6% a year is half a percent a month, so a dollar charges half a cent and three dollars a cent and a half
+        payments, interest, remaining = calculate_scheduled_payments_cents_batch([100, 300], 6, 1000, 0, 0, 1,
+                                                                                 'half_up')
+        self.assertEqual([1, 2], interest.tolist())
+        payments, interest, remaining = calculate_scheduled_payments_cents_batch([100, 300], 6, 1000, 0, 0, 1,
+                                                                                 'half_even')
+        self.assertEqual([0, 2], interest.tolist())
+        self.assertEqual([100, 302], payments.tolist())
+
+    def test_matches_statement(self):
+        """
+        Ensure `calculate_scheduled_payments_cents` matches a statement that rounds each month's interest to the cent
+        with `Decimal`, whether the loan is paid off in the period or not
+        """
+        for rounding, decimal_rounding in (('half_up', ROUND_HALF_UP), ('half_even', ROUND_HALF_EVEN)):
+            for remaining_principal, annual_rate, monthly_payment, months in ((10000, 6.5, 195.66, 200),
+                                                                              (250000, 4.375, 1248.22, 120)):
+                balance, payment = Decimal(remaining_principal), Decimal(str(monthly_payment))
+                total_payments = total_interest = Decimal(0)
+                for _ in range(months):
+                    interest = (balance * Decimal(str(annual_rate)) / 1200).quantize(Decimal('0.01'),
+                                                                                     decimal_rounding)
+                    paid = min(balance + interest, payment)
+                    total_payments, total_interest = total_payments + paid, total_interest + interest
+                    balance += interest - paid
+                    if balance == 0:
+                        break
+
+                self.assertEqual((float(total_payments), float(total_interest), float(balance)),
+                                 calculate_scheduled_payments_cents(remaining_principal, annual_rate, monthly_payment,
+                                                                    0, 0, months, rounding))
+
+    def test_matches_reference(self):
+        """
+        Ensure the batch matches the reference loop across several blocks of loans, for loans without interest, loans
+        whose payment does not cover the interest, and loans paid off at different times
+        """
+        rng = np.random.default_rng(7)
+        size = 3000
+        principal = rng.integers(0, 10 ** 7, size)
+        rate = np.where(rng.random(size) < 0.2, 0, rng.integers(0, 20 * RATE_SCALE, size))
+        payment = rng.integers(-10 ** 4, 10 ** 5, size)
+        months = rng.integers(0, 400, size)
+        original_block_rows = app_cents._BLOCK_ROWS
+        app_cents._BLOCK_ROWS = 256
+        try:
+            for rounding in ('half_up', 'half_even'):
+                payments, interest, remaining = calculate_scheduled_payments_cents_batch(
+                    principal, rate / RATE_SCALE, payment, 0, 0, months, rounding)
+                for i in range(size):
+                    self.assertEqual(reference.calculate_scheduled_payments_cents(
+                        int(principal[i]), int(rate[i]), int(payment[i]), 0, 0, int(months[i]), rounding),
+                        (payments[i], interest[i], remaining[i]))
+        finally:
+            app_cents._BLOCK_ROWS = original_block_rows
+
+
+class TestAdjustableRate(unittest.TestCase):
+    def test_single_rate(self):
+        """
+        Ensure a loan with one rate for the whole term is paid off by the payment from `calculate_loan_payment`
+        """
+        segments = calculate_adjustable_rate_loan(10000, [(0, 5)], 60)
+        monthly_payment, total_paid, total_interest = calculate_loan_payment(10000, 5, 5)
+
+        self.assertEqual(1, len(segments))
+        self.assertAlmostEqual(monthly_payment, segments[0].monthly_payment)
+        self.assertAlmostEqual(total_interest, segments[0].total_interest, places=6)
+        self.assertAlmostEqual(0, segments[0].remaining_principal, places=6)
+
+    def test_reamortize(self):
+        """
+        Ensure each rate change starts where `calculate_scheduled_payments` left off, and that re-amortizing pays off
+        the loan at the end of the term while keeping the payment leaves a balance after a rate rise
+        """
+        schedule = [(0, 2.99), (12, 6.5), (36, 7.5)]
+        segments = calculate_adjustable_rate_loan(200000, schedule, 360)
+        second = calculate_scheduled_payments(segments[0].remaining_principal, 6.5, segments[1].monthly_payment,
+                                              segments[0].total_payments, segments[0].total_interest, 24)
+
+        self.assertEqual([(0, 12), (12, 24), (36, 324)], [(s.start_month, s.months) for s in segments])
+        self.assertEqual(second, segments[1][4:])
+        self.assertAlmostEqual(0, segments[-1].remaining_principal, places=4)
+
+        fixed = calculate_adjustable_rate_loan(200000, schedule, 360, reamortize=False)
+        self.assertEqual(segments[0].monthly_payment, fixed[-1].monthly_payment)
+        self.assertGreater(fixed[-1].remaining_principal, 0)
+
+    def test_caps(self):
+        """
+        Ensure `apply_rate_caps` limits the first change, later changes, the lifetime rise, and the floor
+        """
+        capped = apply_rate_caps([(0, 3), (60, 9), (72, 9), (84, 12), (96, 0)], initial_cap=5, periodic_cap=2,
+                                 lifetime_cap=6, min_rate=2)
+        self.assertEqual([(0, 3), (60, 8), (72, 9), (84, 9), (96, 7)], capped)
+
+
+class TestJobQueue(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.now = 1000.0
+        self.queue = JobQueue(self.directory.name, workers=1, max_queued=2, ttl=60, clock=lambda: self.now)
+        self.release = threading.Event()
+
+    def tearDown(self):
+        self.release.set()
+        self.queue.close()
+        self.directory.cleanup()
+
+    def wait(self, job):
+        while job.status in ('queued', 'running'):
+            time.sleep(0.01)
+
+    def blocking_job(self) -> bytes:
+        while not self.release.wait(0.01):
+            report_progress(0.5)
+        return b'released'
+
+    def test_priority_and_backpressure(self):
+        """
+        Ensure queued jobs run lowest priority first, and submitting fails once the queue is full
+        """
+        order = []
+        blocker = self.queue.submit('blocker', self.blocking_job)
+        while blocker.status == 'queued':
+            time.sleep(0.01)
+        low = self.queue.submit('low', lambda: order.append('low') or b'')
+        high = self.queue.submit('high', lambda: order.append('high') or b'', priority=-1)
+        self.assertRaises(QueueFullError, self.queue.submit, 'extra', lambda: b'')
+
+        self.release.set()
+        self.wait(low)
+        self.assertEqual(['high', 'low'], order)
+        self.assertEqual(b'released', self.queue.result(blocker.job_id))
+        self.assertEqual(1.0, high.progress)
+
+    def test_cancel_and_expire(self):
+        """
+        Ensure cancelling stops a running job at its next progress report and a queued job straight away, and that
+        finished jobs and their results expire
+        """
+        running = self.queue.submit('running', self.blocking_job)
+        queued = self.queue.submit('queued', lambda: b'')
+        while running.status == 'queued':
+            time.sleep(0.01)
+
+        self.queue.cancel(queued.job_id)
+        self.queue.cancel(running.job_id)
+        self.wait(running)
+        self.assertEqual(('cancelled', 'cancelled'), (running.status, queued.status))
+
+        done = self.queue.submit('done', lambda: b'result')
+        self.wait(done)
+        self.assertEqual(b'result', self.queue.result(done.job_id))
+        self.now += 60
+        self.assertIsNone(self.queue.get(done.job_id))
+        self.assertEqual([], os.listdir(self.directory.name))
+
+    def test_shared_between_processes(self):
+        """
+        Ensure a queue sharing the directory, as the queue of another worker process does, can look up, cancel, and
+        fetch the results of the jobs of this queue, and sees the jobs of a process that exited as failed
+        """
+        other = JobQueue(self.directory.name, ttl=60, clock=lambda: self.now)
+        done = self.queue.submit('done', lambda: b'result')
+        self.wait(done)
+        self.assertEqual('done', other.get(done.job_id).status)
+        self.assertEqual(b'result', other.result(done.job_id))
+
+        running = self.queue.submit('running', self.blocking_job)
+        while running.status == 'queued':
+            time.sleep(0.01)
+        self.assertEqual('running', other.cancel(running.job_id).status)
+        self.wait(running)
+        self.assertEqual('cancelled', other.get(running.job_id).status)
+
+        exited = subprocess.Popen(['true'])
+        exited.wait()
+        path = os.path.join(self.directory.name, f'{done.job_id}.job')
+        with open(path) as file:
+            status = json.load(file)
+        with open(path, 'w') as file:
+            json.dump({**status, 'status': 'running', 'pid': exited.pid}, file)
+        self.assertEqual('failed', other.get(done.job_id).status)
+        self.assertIsNone(other.get('../done'))
+
+
+class TestMonteCarlo(unittest.TestCase):
+    def test_fixed_rate(self):
+        """
+        Ensure simulations with no volatility match `calculate_savings_future_value` and
+        `calculate_scheduled_payments`, whether or not the loan is paid off in the payment period
+        """
+        for compounding_period, rate in (('yearly', 5), ('monthly', 0.4), ('daily', 0.01)):
+            result = simulate_savings(1000, 100, RateModel(rate, rate, volatility=0), 20, compounding_period, paths=5)
+            self.assertAlmostEqual(calculate_savings_future_value(1000, 100, rate, 20, compounding_period),
+                                   result['future_value']['percentiles'][2], places=6)
+
+        for payment_period_months in (12, 120):
+            result = simulate_scheduled_payments(10000, RateModel(6.5, 6.5, volatility=0), 195.66,
+                                                 payment_period_months, paths=5)
+            expected = calculate_scheduled_payments(10000, 6.5, 195.66, 0, 0, payment_period_months)
+            for expected_value, key in zip(expected, ('total_payments', 'total_interest', 'remaining_principal')):
+                self.assertAlmostEqual(expected_value, result[key]['mean'], places=6)
+
+    def test_reproducible(self):
+        """
+        Ensure the same seed gives the same simulation whether the blocks of paths run in this process or a process
+        pool, and a different seed gives a different one
+        """
+        model = RateModel(5, 4, reversion_speed=0.3, volatility=1.5)
+        result = simulate_scheduled_payments(300000, model, 1700, 360, paths=10000, seed=7)
+        with ProcessPoolExecutor(2) as executor:
+            self.assertEqual(result, simulate_scheduled_payments(300000, model, 1700, 360, paths=10000, seed=7,
+                                                                 executor=executor))
+        self.assertNotEqual(result, simulate_scheduled_payments(300000, model, 1700, 360, paths=10000, seed=8))
+
+        percentiles = result['total_interest']['percentiles']
+        self.assertEqual(sorted(percentiles), percentiles)
+        self.assertGreater(percentiles[-1], percentiles[0])
+
+
+class TestSensitivity(unittest.TestCase):
+    def test_grids_match_scalar(self):
+        """
+        Ensure every cell of the loan and savings grids matches the scalar calculation for its row and column
+        """
+        rates, years, monthly = [0, 3.5, 6.5, 12], [1, 15, 30], [0, 100, 2500]
+        monthly_payment, total_interest = loan_payment_grid(250000, rates, [12 * y for y in years])
+        future_value = savings_future_value_grid(1000, monthly, rates, 30, 'monthly')
+
+        self.assertEqual((4, 3), monthly_payment.shape)
+        for i, rate in enumerate(rates):
+            for j in range(3):
+                expected_payment, _, expected_interest = calculate_loan_payment(250000, rate, years[j])
+                self.assertAlmostEqual(expected_payment, monthly_payment[i, j], places=8)
+                self.assertAlmostEqual(expected_interest, total_interest[i, j], places=6)
+                self.assertAlmostEqual(calculate_savings_future_value(1000, monthly[j], rate, 30, 'monthly'),
+                                       future_value[i, j], places=6)
+
+
+class TestColumnar(unittest.TestCase):
+    def test_round_trip(self):
+        """
+        Ensure columns written by `encode_columns` are read back by `decode_columns` as aligned views of the body, and
+        that a body not in the format is rejected
+        """
+        columns = {'rate': np.array([6.5, 0, np.nan]), 'months': np.array([12, 360, 1]),
+                   'compounding_period': np.array([b'monthly', b'daily', b''])}
+        body = encode_columns(columns)
+        decoded = decode_columns(body)
+
+        self.assertEqual(['rate', 'months', 'compounding_period'], list(decoded))
+        self.assertEqual(['<f8', '<i4', '|S7'], [column.dtype.str for column in decoded.values()])
+        for name, column in columns.items():
+            np.testing.assert_array_equal(column, decoded[name])
+            self.assertFalse(decoded[name].flags.owndata)
+            self.assertTrue(decoded[name].flags.aligned)
+
+        with self.assertRaises(ValueError):
+            decode_columns(b'JSON' + body[4:])
+        with self.assertRaises(ValueError):
+            decode_columns(body[:-8])
+
+
+class TestSessions(unittest.TestCase):
+    def test_encoding(self):
+        """
+        Ensure sessions come back from `decode_session` as they were encoded, with tuples as lists, and that values
+        the encoding does not have and corrupt sessions are rejected
+        """
+        data = {'loan_data': {'principal': 250000.0, 'rate': 6.5, 'years': 30, 'monthly_payment': 1580.17},
+                '_flashes': [('message', 'Saved ✓')], 'token': b'\xff' * 200, '_permanent': True, 'plan': None,
+                'segments': [[-1, 2 ** 62]] * 100}
+        body = encode_session(data)
+        self.assertEqual({**data, '_flashes': [['message', 'Saved ✓']]}, decode_session(body))
+        loan_data = {'principal': 250000.0, 'rate': 6.5, 'years': 30, 'monthly_payment': 1580.1684483897238,
+                     'total_paid': 568860.6414203006, 'total_interest': 318860.6414203006}
+        self.assertLess(len(encode_session(loan_data)), len(json.dumps(loan_data, separators=(',', ':'))))
+
+        with self.assertRaises(TypeError):
+            encode_session({'rate': np.int64(5)})
+        for corrupt in (body[:-1], body + b'N', b'\x02' + body[1:], body[:1] + b'l\x00'):
+            with self.assertRaises(ValueError):
+                decode_session(corrupt)
+
+
+class TestMetrics(unittest.TestCase):
+    def test_render(self):
+        """
+        Ensure histograms are rendered with cumulative buckets, a sum, and a count per series in the Prometheus text
+        format
+        """
+        metrics = Metrics()
+        metrics.describe('latency_seconds', 'Latency.')
+        for value in (0.5, 2, 20):
+            metrics.observe('latency_seconds', value, (1, 10), route='/loan')
+        metrics.increment('requests_total', 2, status='200')
+        lines = metrics.render({'hit_rate': 0.5}).splitlines()
+
+        self.assertEqual(['# HELP latency_seconds Latency.', '# TYPE latency_seconds histogram',
+                          'latency_seconds_bucket{route="/loan",le="1"} 1',
+                          'latency_seconds_bucket{route="/loan",le="10"} 2',
+                          'latency_seconds_bucket{route="/loan",le="+Inf"} 3',
+                          'latency_seconds_sum{route="/loan"} 22.5', 'latency_seconds_count{route="/loan"} 3',
+                          '# TYPE requests_total counter', 'requests_total{status="200"} 2',
+                          '# TYPE hit_rate gauge', 'hit_rate 0.5'], lines)
+
+    def test_shared_directory(self):
+        """
+        Ensure registries sharing a directory report their counts added up, keep reporting the counts of a retired
+        registry, and label their gauges with the process ID
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            registries = [Metrics(directory) for _ in range(4)]
+            first, second, third, fourth = registries
+            try:
+                first.observe('latency_seconds', 0.5, (1,))
+                first.increment('requests_total', 2, status='200')
+                second.increment('requests_total', 3, status='200')
+                first._save()
+                first.retire()
+                second.observe('latency_seconds', 2, (1,))
+
+                lines = second.render({'hit_rate': 0.5}).splitlines()
+                self.assertIn('requests_total{status="200"} 5', lines)
+                self.assertIn('latency_seconds_bucket{le="1"} 1', lines)
+                self.assertIn('latency_seconds_count 2', lines)
+                self.assertIn(f'hit_rate{{worker="{os.getpid()}"}} 0.5', lines)
+                second._save()
+                self.assertEqual(lines[:-2], third.render().splitlines())
+
+                second.clear_directory()
+                self.assertNotIn('requests_total{status="200"} 5', fourth.render().splitlines())
+            finally:
+                # retired before the directory is removed, so their saving threads stop
+                for registry in registries:
+                    registry.retire()
+
+    def test_sample_stacks(self):
+        """
+        Ensure the profiler reports the stacks of other threads in the folded format, from the thread name down
+        """
+        release = threading.Event()
+
+        def waiting_calculation():
+            release.wait()
+
+        thread = threading.Thread(target=waiting_calculation, name='calculation')
+        thread.start()
+        try:
+            profile = sample_stacks(0.05, 0.005)
+        finally:
+            release.set()
+            thread.join()
+
+        stacks = [line.rsplit(' ', 1) for line in profile.splitlines()]
+        waiting = [stack for stack, count in stacks if 'waiting_calculation' in stack]
+        self.assertTrue(waiting)
+        self.assertTrue(waiting[0].startswith('calculation;'))
+        self.assertTrue(all(int(count) > 0 for _, count in stacks))
+
+
+class TestReference(unittest.TestCase):
+    def test_verify_engines(self):
+        """
+        Ensure every calculation agrees with the month-by-month reference implementations within its tolerance on
+        random edge cases
+        """
+        report = verify_engines.verify(2000, 300, 20, seed=0)
+        self.assertEqual([], report.failed())
+        self.assertEqual(14, len(report.kernels))
+
+
+class TestRoutes(unittest.TestCase):
+    def setUp(self):
+        self.client = app.test_client()
+        self.scenarios = [
+            {'remaining_principal': 10000, 'annual_rate': 6.5, 'monthly_payment': 195.66,
+             'previous_total_payments': 0, 'previous_interest_paid': 0, 'payment_period_months': 12},
+            {'remaining_principal': 10000, 'annual_rate': 6.5},
+            {'remaining_principal': 194.71, 'annual_rate': 6.5, 'monthly_payment': 195.66,
+             'previous_total_payments': 11543.94, 'previous_interest_paid': 1738.65, 'payment_period_months': 10},
+        ]
+
+    def test_batch_scheduled_payments(self):
+        """
+        Test that `/batch/calculate-scheduled-payments` returns each scenario's result in order, with an error for
+        the invalid scenario only
+        """
+        results = self.client.post('/batch/calculate-scheduled-payments', json=self.scenarios).get_json()
+        self.assertEqual(3, len(results))
+        self.assertIn('error', results[1])
+
+        for i in (0, 2):
+            single = self.client.post('/calculate-scheduled-payments', json=self.scenarios[i]).get_json()
+            for key in ('total_payments', 'total_interest', 'remaining_principal'):
+                self.assertAlmostEqual(single[key], results[i][key])
+
+    def test_batch_out_of_range(self):
+        """
+        Test that a scenario with an integer beyond 64 bits or a float beyond float64 fails on its own, in both
+        layouts
+        """
+        scenarios = [self.scenarios[0], {**self.scenarios[0], 'payment_period_months': 10 ** 30},
+                     {**self.scenarios[0], 'remaining_principal': 10 ** 400}]
+        results = self.client.post('/batch/calculate-scheduled-payments', json=scenarios).get_json()
+        self.assertNotIn('error', results[0])
+        self.assertEqual(['invalid value: 1000000000000000000000000000000 is out of range',
+                          'invalid value: int too large to convert to float'], [results[1]['error'],
+                                                                                results[2]['error']])
+
+        columns = {name: [scenario[name] for scenario in scenarios] for name in scenarios[0]}
+        results = self.client.post('/batch/calculate-scheduled-payments', json=columns).get_json()
+        self.assertEqual([None, 'invalid value: 1000000000000000000000000000000 is out of range',
+                          'invalid value: int too large to convert to float'], results['error'])
+
+    def test_batch_columnar_loan_period(self):
+        """
+        Test that `/batch/calculate-loan-period` accepts columns of values and flags loans that are never paid off
+        """
+        results = self.client.post('/batch/calculate-loan-period', json={
+            'remaining_principal': [10000, 10000, 0],
+            'annual_rate': [6.5, 6.5, 6.5],
+            'monthly_payment': [195.66, 10, 195.66]
+        }).get_json()
+
+        self.assertEqual([None, 'payment does not cover interest', None], results['error'])
+        self.assertEqual(list(calculate_loan_period(10000, 6.5, 195.66)), [results['years'][0], results['months'][0]])
+        self.assertEqual([0, 0], [results['years'][2], results['months'][2]])
+
+    def test_batch_malformed(self):
+        """
+        Test that batch endpoints reject a batch whose columns do not line up
+        """
+        response = self.client.post('/batch/calculate-loan-period', json={
+            'remaining_principal': [10000, 10000],
+            'annual_rate': [6.5],
+            'monthly_payment': [195.66, 10]
+        })
+        self.assertEqual(400, response.status_code)
+
+    def test_amortization_schedule_csv(self):
+        """
+        Test that `/amortization-schedule` streams one CSV row per month of each loan
+        """
+        response = self.client.post('/amortization-schedule?format=csv', json=[
+            {'remaining_principal': 1000, 'annual_rate': 6, 'monthly_payment': 200, 'payment_period_months': 12},
+            {'remaining_principal': 1000, 'annual_rate': 6, 'monthly_payment': 100, 'payment_period_months': 3},
+        ])
+        lines = response.get_data(as_text=True).splitlines()
+
+        self.assertEqual('text/csv', response.mimetype)
+        self.assertEqual('loan,month,payment,interest,principal,balance', lines[0])
+        self.assertEqual(1 + 6 + 3, len(lines))
+        self.assertEqual(0.0, float(lines[6].split(',')[-1]))
+        self.assertEqual(['1', '3'], lines[-1].split(',')[:2])
+
+    def test_cached_loan_period(self):
+        """
+        Test that repeat `/calculate-loan-period` requests with inputs that only differ below a cent are served from
+        the result cache
+        """
+        result_cache.clear()
+        first = self.client.post('/calculate-loan-period', json={
+            'remaining_principal': 10000, 'annual_rate': 6.5, 'monthly_payment': 195.66}).get_json()
+        second = self.client.post('/calculate-loan-period', json={
+            'remaining_principal': 10000.001, 'annual_rate': 6.5, 'monthly_payment': 195.66}).get_json()
+        stats = self.client.get('/cache-stats').get_json()
+
+        self.assertEqual(first, second)
+        self.assertEqual((1, 1), (stats['hits'], stats['misses']))
+
+    def test_payment_plan(self):
+        """
+        Test that `/calculate-payment-plan` returns the running totals of every payment period
+        """
+        results = self.client.post('/calculate-payment-plan', json={
+            'remaining_principal': 10000,
+            'annual_rate': 6.5,
+            'segments': [{'monthly_payment': 195.66, 'months': 12}, {'monthly_payment': 300, 'months': 100}]
+        }).get_json()['segments']
+
+        self.assertEqual(2, len(results))
+        first = calculate_scheduled_payments(10000, 6.5, 195.66, 0, 0, 12)
+        self.assertEqual(list(first), [results[0][key] for key in
+                                       ('total_payments', 'total_interest', 'remaining_principal')])
+        self.assertEqual(0, results[1]['remaining_principal'])
+
+    def test_payment_plan_checkpoints(self):
+        """
+        Test that updating a payment plan kept on the server only recalculates from the first changed period
+        """
+        plan = {
+            'remaining_principal': 10000,
+            'annual_rate': 6.5,
+            'segments': [{'monthly_payment': 195.66, 'months': 12}, {'monthly_payment': 300, 'months': 12}]
+        }
+        created = self.client.post('/payment-plans', json=plan).get_json()
+
+        plan['segments'][1]['monthly_payment'] = 250
+        updated = self.client.put(f"/payment-plans/{created['plan_id']}",
+                                  json={'segments': plan['segments']}).get_json()
+        stateless = self.client.post('/calculate-payment-plan', json=plan).get_json()
+
+        self.assertEqual(1, updated['recalculated_from'])
+        self.assertEqual(stateless['segments'], updated['segments'])
+        self.assertEqual(404, self.client.get('/payment-plans/unknown').status_code)
+
+    def test_payment_plan_months(self):
+        """
+        Test that `/payment-plans/<plan_id>/months` totals a range of months across payment periods to match the
+        checkpoints, and rejects ranges past the end of a plan that is not paid off
+        """
+        created = self.client.post('/payment-plans', json={
+            'remaining_principal': 10000,
+            'annual_rate': 6.5,
+            'segments': [{'monthly_payment': 195.66, 'months': 12}, {'monthly_payment': 300, 'months': 12}]
+        }).get_json()
+        first, second = created['segments']
+
+        totals = self.client.get(f"/payment-plans/{created['plan_id']}/months?first_month=1&last_month=24").get_json()
+        self.assertAlmostEqual(second['total_payments'], totals['total_payments'])
+        self.assertAlmostEqual(second['total_interest'], totals['total_interest'])
+        self.assertAlmostEqual(second['remaining_principal'], totals['remaining_principal'])
+
+        totals = self.client.get(f"/payment-plans/{created['plan_id']}/months?first_month=13&last_month=24").get_json()
+        self.assertAlmostEqual(second['total_payments'] - first['total_payments'], totals['total_payments'])
+        self.assertAlmostEqual(first['remaining_principal'] - second['remaining_principal'], totals['principal_paid'])
+
+        self.assertEqual(400, self.client.get(f"/payment-plans/{created['plan_id']}/months?last_month=25").status_code)
+        self.assertEqual(404, self.client.get('/payment-plans/unknown/months?last_month=1').status_code)
+
+    def test_solve_implied_rate(self):
+        """
+        Test that `/solve/implied-rate` returns the rate and solver iterations of each loan
+        """
+        payment = calculate_loan_payment(10000, 5, 5)[0]
+        results = self.client.post('/solve/implied-rate', json=[
+            {'remaining_principal': 10000, 'monthly_payment': payment, 'months': 60},
+            {'remaining_principal': 10000, 'monthly_payment': 100, 'months': 60},
+        ]).get_json()
+
+        self.assertAlmostEqual(5, results[0]['annual_rate'])
+        self.assertGreater(results[0]['iterations'], 0)
+        self.assertEqual({'error': 'payments do not add up to the principal'}, results[1])
+
+    def test_batch_scheduled_payments_cents(self):
+        """
+        Test that `/batch/calculate-scheduled-payments` works in whole cents when given a rounding mode
+        """
+        results = self.client.post('/batch/calculate-scheduled-payments?rounding=half_even',
+                                   json=self.scenarios).get_json()
+        self.assertEqual(calculate_scheduled_payments_cents(10000, 6.5, 195.66, 0, 0, 12, 'half_even'),
+                         tuple(results[0][key] for key in ('total_payments', 'total_interest', 'remaining_principal')))
+        self.assertEqual(400, self.client.post('/batch/calculate-scheduled-payments?rounding=up',
+                                               json=self.scenarios).status_code)
+
+    def test_payment_period_cap(self):
+        """
+        Test that payment periods longer than `MAX_PAYMENT_PERIOD_MONTHS` are rejected in whole cents, schedules, and
+        simulations, and only their own rows of a batch fail, while the floating point calculations take any period
+        """
+        scenario = {**self.scenarios[0], 'annual_rate': 0, 'monthly_payment': 0, 'payment_period_months': 10 ** 9}
+        self.assertEqual(400, self.client.post('/calculate-scheduled-payments?rounding=half_up',
+                                               json=scenario).status_code)
+        self.assertEqual(200, self.client.post('/calculate-scheduled-payments', json=scenario).status_code)
+        self.assertEqual(400, self.client.post('/amortization-schedule', json=scenario).status_code)
+        self.assertEqual(400, self.client.post('/simulate/savings', json={
+            'initial': 1000, 'monthly': 100, 'years': 10000, 'compounding_period': 'monthly',
+            'rate_model': {'initial_rate': 5}, 'paths': 10
+        }).status_code)
+
+        plan = self.client.post('/payment-plans', json={
+            'remaining_principal': 10000, 'annual_rate': 5, 'segments': [{'monthly_payment': 100, 'months': 12000}]
+        })
+        self.assertEqual(201, plan.status_code)
+        self.assertEqual(400, self.client.get(f"/payment-plans/{plan.get_json()['plan_id']}/months?last_month=12")
+                         .status_code)
+
+        results = self.client.post('/batch/calculate-scheduled-payments?rounding=half_up',
+                                   json=[self.scenarios[0], scenario]).get_json()
+        self.assertNotIn('error', results[0])
+        self.assertIn('error', results[1])
+
+    def test_adjustable_rate_loan(self):
+        """
+        Test that `/calculate-adjustable-rate-loan` applies the caps, reports the totals of the last segment, and only
+        takes a boolean `reamortize`
+        """
+        result = self.client.post('/calculate-adjustable-rate-loan', json={
+            'remaining_principal': 200000,
+            'term_months': 360,
+            'rate_schedule': [{'month': 0, 'annual_rate': 3}, {'month': 60, 'annual_rate': 9}],
+            'caps': {'periodic_cap': 2}
+        }).get_json()
+
+        self.assertEqual([3, 5], [segment['annual_rate'] for segment in result['segments']])
+        self.assertEqual(result['segments'][-1]['total_interest'], result['total_interest'])
+        self.assertEqual(400, self.client.post('/calculate-adjustable-rate-loan', json={
+            'remaining_principal': 200000, 'term_months': 360, 'rate_schedule': [{'month': 12, 'annual_rate': 3}]
+        }).status_code)
+        self.assertEqual(400, self.client.post('/calculate-adjustable-rate-loan', json={
+            'remaining_principal': 200000, 'term_months': 360, 'rate_schedule': [{'month': 0, 'annual_rate': 3}],
+            'reamortize': 'false'
+        }).status_code)
+
+    def test_portfolio_projection(self):
+        """
+        Test that `/portfolio-projection` totals an uploaded CSV across chunks, and points to the first invalid row
+        """
+        portfolio = 'loan_id,principal,annual_rate,years\n' + '1,10000,5,1\n' * 3 + '2,20000,0,2\n'
+        result = self.client.post('/portfolio-projection', data=portfolio, content_type='text/csv').get_json()
+
+        self.assertEqual(4, result['loans'])
+        self.assertEqual(list(range(1, 25)), result['month'])
+        self.assertAlmostEqual(3 * calculate_loan_payment(10000, 5, 1)[0] + 20000 / 24, result['payments'][0])
+        self.assertAlmostEqual(0, result['balance'][-1])
+        np.testing.assert_allclose(result['interest'], project_portfolio(io.StringIO(portfolio), chunk_rows=1).interest)
+
+        response = self.client.post('/portfolio-projection', data=portfolio + '3,abc,5,1\n', content_type='text/csv')
+        self.assertEqual({'error': 'invalid row 6'}, response.get_json())
+
+    def test_job(self):
+        """
+        Test that a request run as a background job gives the same result as the endpoint, and that a job for a
+        rejected request fails with its error
+        """
+        portfolio = 'principal,annual_rate,years\n10000,5,1\n20000,0,2\n'
+        job = self.client.post('/jobs/portfolio-projection', data=portfolio, content_type='text/csv').get_json()
+        rejected = self.client.post('/jobs/simulate/savings', json={'initial': 1000}).get_json()
+        for submitted in (job, rejected):
+            while submitted['status'] in ('queued', 'running'):
+                time.sleep(0.01)
+                submitted.update(self.client.get(f"/jobs/{submitted['job_id']}").get_json())
+
+        self.assertEqual(self.client.post('/portfolio-projection', data=portfolio, content_type='text/csv').get_json(),
+                         self.client.get(f"/jobs/{job['job_id']}/result").get_json())
+        self.assertEqual(('failed', "missing field 'monthly'"), (rejected['status'], rejected['error']))
+        self.assertEqual(409, self.client.get(f"/jobs/{rejected['job_id']}/result").status_code)
+        self.assertEqual(404, self.client.post('/jobs/loan').status_code)
+
+    def test_loan_sensitivity_binary(self):
+        """
+        Test that `/sensitivity/loan` returns its grids as row-major little-endian float64 when asked for binary, with
+        the same values as the JSON response
+        """
+        request = {'principal': 250000, 'annual_rate': {'start': 2, 'stop': 8, 'num': 4}, 'months': [120, 360]}
+        as_json = self.client.post('/sensitivity/loan', json=request).get_json()
+        response = self.client.post('/sensitivity/loan', json=request,
+                                    headers={'Accept': 'application/octet-stream'})
+        grids = np.frombuffer(response.data, dtype='<f8').reshape(2, 4, 2)
+
+        self.assertEqual([4, 2], as_json['shape'])
+        self.assertEqual([2, 4, 6, 8], as_json['annual_rate'])
+        self.assertEqual(('4,2', 'monthly_payment,total_interest'),
+                         (response.headers['X-Grid-Shape'], response.headers['X-Grid-Outputs']))
+        self.assertEqual(as_json['monthly_payment'], grids[0].ravel().tolist())
+        self.assertAlmostEqual(calculate_loan_payment(250000, 4, 30)[0], grids[0, 1, 1])
+        self.assertEqual(400, self.client.post('/sensitivity/loan', json={**request, 'months': [0]}).status_code)
+        for num in (0, -1, 10 ** 12):
+            self.assertEqual(400, self.client.post('/sensitivity/loan', json={
+                **request, 'annual_rate': {'start': 2, 'stop': 8, 'num': num}
+            }).status_code)
+
+    def test_batch_columnar_binary(self):
+        """
+        Test that batch endpoints take and return the columnar binary format, with the same results as JSON and the
+        error of each failed scenario numbered in the `error` column
+        """
+        columns = {'target': np.array([100000, 5000]), 'initial': np.array([1000, np.inf]), 'rate': np.array([5, 5]),
+                   'years': np.array([30, 10], dtype=np.int32),
+                   'compounding_period': np.array([b'monthly', b'daily'])}
+        response = self.client.post('/solve/savings-contribution', data=encode_columns(columns),
+                                    content_type=COLUMNAR_MIMETYPE)
+        results = decode_columns(response.data)
+        as_json = self.client.post('/solve/savings-contribution', data=encode_columns(columns),
+                                   content_type=COLUMNAR_MIMETYPE, headers={'Accept': 'application/json'}).get_json()
+
+        self.assertEqual(COLUMNAR_MIMETYPE, response.mimetype)
+        self.assertEqual(['invalid value: not a finite number'], json.loads(response.headers['X-Error-Messages']))
+        self.assertEqual([0, 1], results['error'].tolist())
+        self.assertEqual(as_json['monthly'][0], results['monthly'][0])
+        self.assertTrue(np.isnan(results['monthly'][1]))
+
+    def test_payment_schedule_session(self):
+        """
+        Test that `/loan` keeps the loan for `/payment-schedule` in a server-side session with only its ID in the
+        cookie, and that an unknown session ID starts a new session
+        """
+        self.assertEqual(302, self.client.get('/payment-schedule').status_code)
+        self.client.post('/loan', data={'principal': 250000, 'rate': 6.5, 'years': 30})
+        session_id = self.client.get_cookie('session').value
+        self.assertRegex(session_id, r'^[A-Za-z0-9_-]{22}$')
+
+        response = self.client.get('/payment-schedule')
+        self.assertEqual(200, response.status_code)
+        self.assertIn('250000', response.get_data(as_text=True))
+        self.assertIsNone(response.headers.get('Set-Cookie'))
+
+        self.client.set_cookie('session', session_id[::-1])
+        self.assertEqual(302, self.client.get('/payment-schedule').status_code)
+
+    def test_cacheable_get(self):
+        """
+        Test that a GET calculation redirects to its canonical query string, and that the ETag of its response gets
+        304 Not Modified without the calculation being run again
+        """
+        result_cache.clear()
+        response = self.client.get('/calculate-loan-period?annual_rate=6.50&monthly_payment=195.66&'
+                                   'remaining_principal=10000.001')
+        canonical = '/calculate-loan-period?remaining_principal=10000&annual_rate=6.5&monthly_payment=195.66'
+        self.assertEqual((301, canonical), (response.status_code, response.headers['Location']))
+
+        response = self.client.get(canonical)
+        post = self.client.post('/calculate-loan-period', json={
+            'remaining_principal': 10000, 'annual_rate': 6.5, 'monthly_payment': 195.66})
+        self.assertEqual(post.get_json(), response.get_json())
+        self.assertIn('max-age', response.headers['Cache-Control'])
+        self.assertFalse(response.headers['ETag'].startswith('W/'))
+
+        not_modified = self.client.get(canonical, headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual((304, b''), (not_modified.status_code, not_modified.data))
+        self.assertEqual(1, self.client.get('/cache-stats').get_json()['misses'])
+
+    def test_cacheable_get_compounding_period(self):
+        """
+        Test that the canonical URL of a savings calculation names the compounding period the calculation uses
+        """
+        response = self.client.get('/savings?initial=1000&monthly=100&rate=5&years=10&compounding_period=weekly')
+        canonical = '/savings?initial=1000&monthly=100&rate=5&years=10&compounding_period=yearly'
+        self.assertEqual((301, canonical), (response.status_code, response.headers['Location']))
+        self.assertEqual(200, self.client.get(canonical).status_code)
+
+    def test_warm_up(self):
+        """
+        Test that warming up compiles the templates without counting as requests or calculations in the metrics
+        """
+        app.jinja_env.cache.clear()
+        before = metrics.render()
+        warm_up()
+        self.assertEqual(before, metrics.render())
+        self.assertEqual(len(app.jinja_env.list_templates()), len(app.jinja_env.cache))
+
+    def test_metrics(self):
+        """
+        Test that `/metrics` reports request latency by route pattern, calculation latency, and batch sizes
+        """
+        self.client.post('/calculate-adjustable-rate-loan', json={
+            'remaining_principal': 123456, 'term_months': 360, 'rate_schedule': [{'month': 0, 'annual_rate': 3}]})
+        self.client.post('/batch/calculate-loan-period', json=self.scenarios)
+        text = self.client.get('/metrics').get_data(as_text=True)
+
+        self.assertIn('http_request_duration_seconds_count{route="/calculate-adjustable-rate-loan",method="POST"}',
+                      text)
+        self.assertIn('calculation_duration_seconds_bucket{function="calculate_adjustable_rate_loan",le="+Inf"}', text)
+        self.assertIn('batch_rows_sum{route="/batch/calculate-loan-period"}', text)
+        self.assertIn('result_cache_hit_rate', text)
+        self.assertEqual(404, self.client.get('/debug/profile').status_code)
+
+    def test_simulate_savings(self):
+        """
+        Test that `/simulate/savings` returns the requested percentiles of the future value, and rejects a request
+        without a rate model
+        """
+        request = {'initial': 1000, 'monthly': 100, 'years': 30, 'compounding_period': 'yearly', 'paths': 2000,
+                   'percentiles': [10, 90], 'rate_model': {'initial_rate': 4.5, 'volatility': 1}}
+        result = self.client.post('/simulate/savings', json=request).get_json()
+
+        self.assertEqual([10, 90], result['percentiles'])
+        self.assertEqual(2, len(result['future_value']['percentiles']))
+        self.assertEqual(result, self.client.post('/simulate/savings', json=request).get_json())
+        del request['rate_model']
+        self.assertEqual(400, self.client.post('/simulate/savings', json=request).status_code)
 
 
 if __name__ == '__main__':
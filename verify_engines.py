@@ -0,0 +1,501 @@
+from app import batch_calculations, calculations, reference
+from app.cache import canonical_money, canonical_rate
+from app.cents import (RATE_DENOMINATOR, RATE_SCALE, ROUNDING_MODES, calculate_scheduled_payments_cents_batch,
+                       to_cents)
+from app.sensitivity import savings_future_value_grid
+from typing import Callable
+import argparse
+import numpy as np
+import sys
+import time
+
+# largest divergence from the reference each kind of result may have. Amounts are compared relative to the size of
+# the amounts that go into them, since both the loop and the closed forms lose digits to cancellation there. Loan
+# periods are compared in whole months, and amounts in cents exactly
+AMOUNT_TOLERANCE = 1e-9
+PERIOD_TOLERANCE = 0
+CENTS_TOLERANCE = 0
+
+# longest horizon of the generated cases, in years
+MAX_YEARS = 100
+
+COMPOUNDING_PERIODS = ('yearly', 'monthly', 'daily')
+
+
+def _log_uniform(rng: np.random.Generator, low: float, high: float, size: int) -> np.ndarray:
+    """
+    :param np.random.Generator rng: random number generator
+    :param float low: base 10 log of the smallest value
+    :param float high: base 10 log of the largest value
+    :param int size: number of values
+    :return: values spread evenly over every order of magnitude between the bounds
+    """
+    return 10 ** rng.uniform(low, high, size)
+
+
+def _some(rng: np.random.Generator, values: np.ndarray, fraction: float, replacement) -> np.ndarray:
+    """
+    :param np.random.Generator rng: random number generator
+    :param np.ndarray values: values to replace some of
+    :param float fraction: fraction of the values to replace
+    :param replacement: value or array of values replacing them
+    :return: the values with a random fraction of them replaced
+    """
+    return np.where(rng.random(len(values)) < fraction, replacement, values)
+
+
+def _months(rng: np.random.Generator, size: int) -> np.ndarray:
+    """
+    :param np.random.Generator rng: random number generator
+    :param int size: number of values
+    :return: horizons in months, a few of them 0 and nearly a third between 30 and 100 years
+    """
+    bounds = np.array([(0, 1), (1, 13), (13, 361), (361, MAX_YEARS * 12 + 1)])
+    low, high = bounds[rng.choice(len(bounds), size, p=(0.03, 0.27, 0.4, 0.3))].T
+    return rng.integers(low, high)
+
+
+def loan_cases(rng: np.random.Generator, size: int) -> dict[str, np.ndarray]:
+    """
+    Generate loans weighted towards the edges of the calculations: balances from a cent to ten million, rates of 0 and
+    of a ten-thousandth of a percent, horizons of up to 100 years, and payments barely above the interest, exactly
+    amortizing the loan over a whole number of months, paying it off in the first month, or never paying it off.
+
+    :param np.random.Generator rng: random number generator
+    :param int size: number of loans
+    :return: columns of the arguments of `calculations.calculate_scheduled_payments`
+    """
+    principal = _some(rng, _log_uniform(rng, -2, 7, size).round(2), 0.02, 0.0)
+    annual_rate = rng.uniform(0, 30, size).round(4)
+    annual_rate = _some(rng, annual_rate, 0.1, _log_uniform(rng, -4, -2, size).round(4))
+    annual_rate = _some(rng, annual_rate, 0.2, 0.0)
+    monthly_rate = annual_rate / 100 / 12
+    interest = principal * monthly_rate
+
+    terms = rng.integers(1, MAX_YEARS * 12 + 1, size)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        amortizing = np.where(monthly_rate == 0, principal / terms,
+                              principal * monthly_rate / -np.expm1(-terms * np.log1p(monthly_rate)))
+    payments = np.stack([
+        # barely above the interest, or a cent a month at a rate of 0
+        np.where(interest == 0, 0.01, interest * (1 + _log_uniform(rng, -9, -3, size))),
+        amortizing,
+        (principal * (1 + monthly_rate) * rng.uniform(1, 3, size)).round(2),
+        (interest * rng.uniform(0, 1, size)).round(2),
+        (interest + principal * _log_uniform(rng, -4, -1, size)).round(2),
+        _log_uniform(rng, -2, 6, size).round(2)])
+    monthly_payment = payments[rng.integers(0, len(payments), size), np.arange(size)]
+
+    previous_total_payments = _some(rng, rng.uniform(0, 100000, size).round(2), 0.5, 0.0)
+    previous_interest_paid = (previous_total_payments * rng.uniform(0, 1, size)).round(2)
+    return {'remaining_principal': principal, 'annual_rate': annual_rate, 'monthly_payment': monthly_payment,
+            'previous_total_payments': previous_total_payments, 'previous_interest_paid': previous_interest_paid,
+            'payment_period_months': _months(rng, size)}
+
+
+def _savings_rates(rng: np.random.Generator, compounding_period: np.ndarray) -> np.ndarray:
+    """
+    :param np.random.Generator rng: random number generator
+    :param np.ndarray compounding_period: periods of compounding ('daily', 'monthly', or 'yearly')
+    :return: compounding rates of up to 30% a year for each compounding period, as rates per compounding period for
+        daily and monthly compounding, with some of them 0 and some close to it
+    """
+    size = len(compounding_period)
+    rates = _some(rng, rng.uniform(0, 30, size), 0.1, _log_uniform(rng, -6, -2, size))
+    rates = _some(rng, rates, 0.2, 0.0)
+    periods_per_year = np.select([compounding_period == 'monthly', compounding_period == 'daily'], [12, 365], 1)
+    return (rates / periods_per_year).round(6)
+
+
+def savings_cases(rng: np.random.Generator, size: int) -> dict[str, np.ndarray]:
+    """
+    Generate savings weighted towards the edges of the calculation: no deposit or contributions, rates of 0 and
+    close to it, and horizons of up to 100 years, with rates of up to 30% a year for each compounding period.
+
+    :param np.random.Generator rng: random number generator
+    :param int size: number of cases
+    :return: columns of the arguments of `calculations.calculate_savings_future_value`
+    """
+    compounding_period = rng.choice(COMPOUNDING_PERIODS, size)
+    return {'initial': _some(rng, _log_uniform(rng, -2, 7, size).round(2), 0.2, 0.0),
+            'monthly': _some(rng, _log_uniform(rng, -2, 5, size).round(2), 0.2, 0.0),
+            'comp_rate': _savings_rates(rng, compounding_period),
+            'years': _months(rng, size) // 12,
+            'compounding_period': compounding_period}
+
+
+def _rows(columns: dict[str, np.ndarray]) -> list[tuple]:
+    """
+    :param dict columns: columns of arguments
+    :return: tuples of the arguments of each row, as Python numbers and strings
+    """
+    return list(zip(*(column.tolist() for column in columns.values())))
+
+
+def _select(columns: dict[str, np.ndarray], rows: np.ndarray) -> dict[str, np.ndarray]:
+    """
+    :param dict columns: columns of arguments
+    :param np.ndarray rows: mask or indices of the rows to keep
+    :return: the columns of the rows
+    """
+    return {name: column[rows] for name, column in columns.items()}
+
+
+def _timed(func: Callable, *args):
+    """
+    :param func: function to call
+    :param args: arguments of the function
+    :return: tuple containing the function's result and the seconds it took
+    """
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def _call_rows(func: Callable, rows: list[tuple]) -> list:
+    """
+    :param func: scalar function
+    :param list rows: arguments of each call
+    :return: the results of each call, with None for calls that raised because the loan is never paid off
+    """
+    results = []
+    for row in rows:
+        try:
+            results.append(func(*row))
+        except (ValueError, ZeroDivisionError):
+            results.append(None)
+    return results
+
+
+def divergence(result: np.ndarray, expected: np.ndarray, scale: np.ndarray | float = 1.0) -> np.ndarray:
+    """
+    :param np.ndarray result: results of a calculation
+    :param np.ndarray expected: results of the reference
+    :param scale: size of each case the difference is measured against
+    :return: difference of each result from the reference relative to the scale, which is 0 for equal results
+        including infinities and NaN, and infinite if only one of them is infinite or NaN
+    """
+    result = np.asarray(result, dtype=np.float64)
+    expected = np.asarray(expected, dtype=np.float64)
+    same = (result == expected) | (np.isnan(result) & np.isnan(expected))
+    with np.errstate(invalid='ignore', over='ignore'):
+        difference = np.abs(result - expected) / scale
+    return np.where(same, 0.0, np.where(np.isnan(difference), np.inf, difference))
+
+
+def _periods(years_and_months) -> np.ndarray:
+    """
+    :param years_and_months: tuple of arrays of years and months, or list of tuples of years and months or None
+    :return: the periods in months, NaN where the loan is never paid off
+    """
+    if isinstance(years_and_months, list):
+        years_and_months = np.array([period or (np.nan, np.nan) for period in years_and_months], dtype=np.float64).T
+    years, months = years_and_months
+    return np.asarray(years, dtype=np.float64) * 12 + months
+
+
+def _loan_scale(columns: dict[str, np.ndarray], expected: tuple) -> np.ndarray:
+    """
+    :param dict columns: columns of the arguments of `calculations.calculate_scheduled_payments`
+    :param tuple expected: arrays of the reference results
+    :return: the size of the amounts that go into the results of each loan: the balances and totals, and every
+        month's interest and payment grown by the interest charged on them to the end of the period. Rounding in any
+        month is carried forward the same way, so a loan whose payment barely covers its interest is ill-conditioned,
+        and the loop and the closed forms can only agree relative to its growth
+    """
+    monthly_rate = columns['annual_rate'] / 100 / 12
+    balance = np.maximum(np.abs(columns['remaining_principal']), np.abs(expected[2]))
+    growth = batch_calculations._annuity_factor(np.log1p(monthly_rate), columns['payment_period_months'])
+    return np.maximum.reduce([balance, columns['previous_total_payments'], *np.abs(expected),
+                              (balance * monthly_rate + columns['monthly_payment']) * growth,
+                              np.ones(len(monthly_rate))])
+
+
+def _cents(columns: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
+    """
+    :param dict columns: columns of the arguments of `calculations.calculate_scheduled_payments`
+    :return: the columns with amounts in cents and rates in ten-thousandths of a percent
+    """
+    return {name: column if name == 'payment_period_months' else
+            np.rint(column * RATE_SCALE).astype(np.int64) if name == 'annual_rate' else to_cents(column)
+            for name, column in columns.items()}
+
+
+def _covers_interest(cents: dict[str, np.ndarray]) -> np.ndarray:
+    """
+    :param dict cents: columns returned by `_cents`
+    :return: mask of the loans whose payment covers their first month's interest
+    """
+    return cents['monthly_payment'] * RATE_DENOMINATOR >= cents['remaining_principal'] * cents['annual_rate']
+
+
+class Report:
+    """
+    Divergence of each calculation from the reference, and its cost per case.
+    """
+
+    def __init__(self):
+        self.kernels = []
+
+    def add(self, kernel: str, divergences: np.ndarray, tolerance: float, columns: dict[str, np.ndarray],
+            seconds: float, reference_seconds: float) -> None:
+        """
+        :param str kernel: name of the calculation
+        :param np.ndarray divergences: divergence of each case, or cases x results array of them
+        :param float tolerance: largest divergence allowed
+        :param dict columns: columns of the arguments of each case
+        :param float seconds: seconds the calculation took per case
+        :param float reference_seconds: seconds the reference took per case
+        """
+        divergences = np.asarray(divergences)
+        if divergences.ndim > 1:
+            divergences = divergences.max(axis=1, initial=0)
+        worst = int(np.argmax(divergences)) if len(divergences) else None
+        self.kernels.append({
+            'kernel': kernel,
+            'cases': len(divergences),
+            'tolerance': tolerance,
+            'max_divergence': float(divergences[worst]) if worst is not None else 0.0,
+            'failures': int(np.count_nonzero(divergences > tolerance)),
+            'worst_case': {name: column[worst].item() for name, column in columns.items()} if worst is not None else {},
+            'seconds': seconds,
+            'speedup': reference_seconds / seconds if seconds else float('inf')
+        })
+
+    def failed(self) -> list[dict]:
+        """
+        :return: the kernels with a case further from the reference than their tolerance
+        """
+        return [kernel for kernel in self.kernels if kernel['failures']]
+
+    def print(self) -> None:
+        """
+        Print a line per kernel, followed by the arguments of its worst case if it was not exactly the reference.
+        """
+        print(f'{"kernel":>50} {"cases":>10} {"tolerance":>10} {"worst":>10} {"failures":>9} {"per case":>10} '
+              f'{"speedup":>9}')
+        for kernel in self.kernels:
+            print(f'{kernel["kernel"]:>50} {kernel["cases"]:10,} {kernel["tolerance"]:10.0e} '
+                  f'{kernel["max_divergence"]:10.2e} {kernel["failures"]:9,} {kernel["seconds"] * 1e6:8.3f} us '
+                  f'{kernel["speedup"]:8,.1f}x')
+            if kernel['max_divergence']:
+                print(f'{"worst case":>50} {kernel["worst_case"]}')
+
+
+def verify_savings(report: Report, rng: np.random.Generator, cases: int, scalar_cases: int) -> None:
+    """
+    Compare every way of calculating savings against `reference.calculate_savings_future_value`.
+
+    :param Report report: report to add the results to
+    :param np.random.Generator rng: random number generator
+    :param int cases: number of cases for the batch calculations
+    :param int scalar_cases: number of cases for the scalar calculations, each of which runs the reference loop
+    """
+    sample = savings_cases(rng, scalar_cases)
+    rows = _rows(sample)
+    expected, reference_seconds = _timed(lambda: np.array(_call_rows(reference.calculate_savings_future_value, rows),
+                                                          dtype=np.float64))
+    reference_seconds /= scalar_cases
+    scale = np.maximum(np.abs(expected), 1)
+
+    stepped, seconds = _timed(reference.calculate_savings_future_value_stepped, *sample.values())
+    report.add('reference.calculate_savings_future_value_stepped', divergence(stepped, expected, scale),
+               AMOUNT_TOLERANCE, sample, seconds / scalar_cases, reference_seconds)
+    result, seconds = _timed(lambda: np.array(_call_rows(calculations.calculate_savings_future_value, rows)))
+    report.add('calculate_savings_future_value', divergence(result, expected, scale), AMOUNT_TOLERANCE, sample,
+               seconds / scalar_cases, reference_seconds)
+
+    # the batch calculation is checked against the reference loop run across every case at once
+    columns = savings_cases(rng, cases)
+    expected = reference.calculate_savings_future_value_stepped(*columns.values())
+    result, seconds = _timed(batch_calculations.calculate_savings_future_value_batch, *columns.values())
+    report.add('calculate_savings_future_value_batch', divergence(result, expected, np.maximum(np.abs(expected), 1)),
+               AMOUNT_TOLERANCE, columns, seconds / cases, reference_seconds)
+
+    # grids of every rate against a range of contributions, for each compounding period
+    divergences, grid_columns, seconds = [], [], 0.0
+    for period in COMPOUNDING_PERIODS:
+        grid_rates = _savings_rates(rng, np.full(64, period))
+        contributions = _some(rng, _log_uniform(rng, -2, 5, 64).round(2), 0.1, 0.0)
+        initial = float(_log_uniform(rng, -2, 7, 1).round(2)[0])
+        years = int(rng.integers(0, MAX_YEARS + 1))
+        grid, grid_seconds = _timed(savings_future_value_grid, initial, contributions, grid_rates, years, period)
+        seconds += grid_seconds
+        comp_rate, monthly = (axis.ravel() for axis in np.meshgrid(grid_rates, contributions, indexing='ij'))
+        cells = {'initial': np.full(len(comp_rate), initial), 'monthly': monthly, 'comp_rate': comp_rate,
+                 'years': np.full(len(comp_rate), years), 'compounding_period': np.full(len(comp_rate), period)}
+        expected = reference.calculate_savings_future_value_stepped(*cells.values())
+        divergences.append(divergence(grid.ravel(), expected, np.maximum(np.abs(expected), 1)))
+        grid_columns.append(cells)
+    grid_columns = {name: np.concatenate([cells[name] for cells in grid_columns]) for name in grid_columns[0]}
+    divergences = np.concatenate(divergences)
+    report.add('savings_future_value_grid', divergences, AMOUNT_TOLERANCE, grid_columns, seconds / len(divergences),
+               reference_seconds)
+
+
+def verify_loans(report: Report, rng: np.random.Generator, cases: int, scalar_cases: int) -> None:
+    """
+    Compare every way of calculating loan periods and scheduled payments against `reference.calculate_loan_period`,
+    `reference.calculate_scheduled_payments`, and `reference.calculate_scheduled_payments_cents`.
+
+    :param Report report: report to add the results to
+    :param np.random.Generator rng: random number generator
+    :param int cases: number of cases for the batch calculations
+    :param int scalar_cases: number of cases for the scalar calculations, each of which runs the reference loop
+    """
+    sample = loan_cases(rng, scalar_cases)
+    period_columns = {name: sample[name] for name in ('remaining_principal', 'annual_rate', 'monthly_payment')}
+    period_rows = _rows(period_columns)
+    expected, reference_seconds = _timed(_call_rows, reference.calculate_loan_period, period_rows)
+    period_reference_seconds = reference_seconds / scalar_cases
+    expected = _periods(expected)
+    result, seconds = _timed(_call_rows, calculations.calculate_loan_period, period_rows)
+    report.add('calculate_loan_period', divergence(_periods(result), expected), PERIOD_TOLERANCE, period_columns,
+               seconds / scalar_cases, period_reference_seconds)
+
+    rows = _rows(sample)
+    expected, reference_seconds = _timed(lambda: np.array(_call_rows(reference.calculate_scheduled_payments, rows)).T)
+    reference_seconds /= scalar_cases
+    scale = _loan_scale(sample, expected)
+    stepped, seconds = _timed(reference.calculate_scheduled_payments_stepped, *sample.values())
+    report.add('reference.calculate_scheduled_payments_stepped', divergence(stepped, expected, scale).T,
+               AMOUNT_TOLERANCE, sample, seconds / scalar_cases, reference_seconds)
+    result, seconds = _timed(lambda: np.array(_call_rows(calculations.calculate_scheduled_payments, rows)).T)
+    report.add('calculate_scheduled_payments', divergence(result, expected, scale).T, AMOUNT_TOLERANCE, sample,
+               seconds / scalar_cases, reference_seconds)
+
+    # the integer cents calculation only holds balances that cannot grow past what fits in cents, so it is checked
+    # on loans whose payment covers the interest
+    cents = _cents(sample)
+    cents = _select(cents, _covers_interest(cents))
+    cents_rows = _rows(cents)
+    percent_rates = {**cents, 'annual_rate': cents['annual_rate'] / RATE_SCALE}
+    for rounding in ROUNDING_MODES:
+        expected, cents_reference_seconds = _timed(lambda: np.array(
+            [reference.calculate_scheduled_payments_cents(*row, rounding) for row in cents_rows]).reshape(-1, 3).T)
+        result, seconds = _timed(calculate_scheduled_payments_cents_batch, *percent_rates.values(), rounding)
+        report.add(f'calculate_scheduled_payments_cents_batch[{rounding}]', divergence(result, expected).T,
+                   CENTS_TOLERANCE, cents, seconds / max(len(cents_rows), 1),
+                   cents_reference_seconds / max(len(cents_rows), 1))
+
+    # the batch calculations are checked against the reference loop run across every case at once
+    columns = loan_cases(rng, cases)
+    period_columns = {name: columns[name] for name in ('remaining_principal', 'annual_rate', 'monthly_payment')}
+    expected = _periods(_call_rows(reference.calculate_loan_period, _rows(period_columns)))
+    result, seconds = _timed(batch_calculations.calculate_loan_period_batch, *period_columns.values())
+    report.add('calculate_loan_period_batch', divergence(_periods(result), expected), PERIOD_TOLERANCE,
+               period_columns, seconds / cases, period_reference_seconds)
+
+    expected = reference.calculate_scheduled_payments_stepped(*columns.values())
+    result, seconds = _timed(batch_calculations.calculate_scheduled_payments_batch, *columns.values())
+    report.add('calculate_scheduled_payments_batch', divergence(result, expected, _loan_scale(columns, expected)).T,
+               AMOUNT_TOLERANCE, columns, seconds / cases, reference_seconds)
+
+
+def verify_routes(report: Report, rng: np.random.Generator, cases: int) -> None:
+    """
+    Compare the results of the calculation routes against the reference. Each case is requested twice, so the second
+    answer comes from the result cache.
+
+    :param Report report: report to add the results to
+    :param np.random.Generator rng: random number generator
+    :param int cases: number of cases for each route
+    """
+    from app.app import app
+    client = app.test_client()
+
+    # the routes round their inputs before calculating, so the cases are rounded the same way to match the reference
+    columns = loan_cases(rng, cases)
+    columns = {name: column if name == 'payment_period_months' else
+               np.array([canonical_rate(value) if name == 'annual_rate' else canonical_money(value)
+                         for value in column.tolist()]) for name, column in columns.items()}
+
+    def check(kernel: str, path: str, case_columns: dict, fields: tuple, expected: np.ndarray,
+              reference_seconds: float, scale: np.ndarray | float, tolerance: float) -> None:
+        results = []
+        start = time.perf_counter()
+        for row in _rows(case_columns):
+            for _ in range(2):
+                response = client.post(path, json=dict(zip(case_columns, row)))
+                if response.status_code != 200:
+                    raise RuntimeError(f'POST {path} responded {response.status}')
+                results.append([response.json[field] for field in fields])
+        seconds = (time.perf_counter() - start) / max(len(results), 1)
+        results = np.array(results, dtype=np.float64).reshape(-1, 2, len(fields))
+        divergences = [divergence(results[:, i].T, expected, scale) for i in range(2)]
+        report.add(kernel, np.concatenate(divergences).T, tolerance, case_columns, seconds,
+                   reference_seconds / max(len(results), 1))
+
+    # the loan period route fails on loans that are never paid off
+    period_columns = {name: columns[name] for name in ('remaining_principal', 'annual_rate', 'monthly_payment')}
+    expected, reference_seconds = _timed(_call_rows, reference.calculate_loan_period, _rows(period_columns))
+    payable = np.array([period is not None for period in expected], dtype=bool)
+    expected = np.array([period for period in expected if period is not None], dtype=np.float64).reshape(-1, 2).T
+    check('POST /calculate-loan-period', '/calculate-loan-period', _select(period_columns, payable),
+          ('years', 'months'), expected, reference_seconds, 1.0, PERIOD_TOLERANCE)
+
+    expected, reference_seconds = _timed(lambda: np.array(_call_rows(reference.calculate_scheduled_payments,
+                                                                     _rows(columns))).reshape(-1, 3).T)
+    check('POST /calculate-scheduled-payments', '/calculate-scheduled-payments', columns,
+          ('total_payments', 'total_interest', 'remaining_principal'), expected, reference_seconds,
+          _loan_scale(columns, expected), AMOUNT_TOLERANCE)
+
+    cents = _cents(columns)
+    covered = _covers_interest(cents)
+    expected, reference_seconds = _timed(lambda: np.array(
+        [reference.calculate_scheduled_payments_cents(*row, 'half_even')
+         for row in _rows(_select(cents, covered))]).reshape(-1, 3).T)
+    check('POST /calculate-scheduled-payments?rounding=half_even', '/calculate-scheduled-payments?rounding=half_even',
+          _select(columns, covered), ('total_payments', 'total_interest', 'remaining_principal'), expected / 100,
+          reference_seconds, 1 / 100, CENTS_TOLERANCE)
+
+
+def verify(cases: int, scalar_cases: int, route_cases: int, seed: int | None = None) -> Report:
+    """
+    Compare every calculation against the reference on randomly generated cases.
+
+    :param int cases: number of cases for each batch calculation
+    :param int scalar_cases: number of cases for each scalar calculation
+    :param int route_cases: number of cases for each route
+    :param int seed: seed of the random number generator, or None for a random one
+    :return: report of the divergence of each calculation from the reference
+    """
+    rng = np.random.default_rng(seed)
+    report = Report()
+    verify_savings(report, rng, cases, scalar_cases)
+    verify_loans(report, rng, cases, scalar_cases)
+    verify_routes(report, rng, route_cases)
+    return report
+
+
+def main(argv: list[str] | None = None) -> int:
+    """
+    Compare every calculation against the reference, printing how far each one strays from it and how much faster it
+    is.
+
+    :param list argv: command line arguments
+    :return: exit status, 1 if a calculation strayed further from the reference than its tolerance
+    """
+    parser = argparse.ArgumentParser(description='Compare every calculation against the month-by-month reference '
+                                                 'implementations on randomly generated edge cases')
+    parser.add_argument('--cases', type=int, default=1_000_000, help='number of cases for each batch calculation')
+    parser.add_argument('--scalar-cases', type=int, default=10_000,
+                        help='number of cases for each scalar calculation, each of which runs the reference loop')
+    parser.add_argument('--route-cases', type=int, default=200, help='number of cases for each route')
+    parser.add_argument('--seed', type=int, help='seed of the random cases, to repeat a run')
+    args = parser.parse_args(argv)
+
+    seed = np.random.SeedSequence(args.seed).entropy
+    print(f'seed {seed}')
+    report = verify(args.cases, args.scalar_cases, args.route_cases, seed)
+    report.print()
+
+    failed = report.failed()
+    for kernel in failed:
+        print(f'DIVERGED {kernel["kernel"]}: {kernel["failures"]:,} cases beyond {kernel["tolerance"]:.0e}, worst '
+              f'{kernel["max_divergence"]:.2e} at {kernel["worst_case"]}')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())